@@ -0,0 +1,56 @@
+# 批量写入工具
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import Table
+
+
+def build_upsert(table: Table, dialect_name: str, index_elements: list, update_columns: list, update_values: Optional[Callable] = None):
+    """构建按唯一键插入或更新的语句
+
+    MySQL 使用 ON DUPLICATE KEY UPDATE，SQLite/PostgreSQL 使用 ON CONFLICT DO UPDATE，语句可直接用于 executemany。
+    两者都依赖目标表上 index_elements 的唯一键，已有数据库需先执行 database/migrations 中的迁移脚本。
+    其他方言抛出 ValueError，不退化为普通 INSERT（重复写入会产生重复行）。
+
+    Args:
+        table: 目标表
+        dialect_name: 数据库方言名称（engine.dialect.name）
+        index_elements: 唯一键列名
+        update_columns: 冲突时要更新的列名
+        update_values: 可选，接收新行引用（inserted/excluded）返回 {列名: 表达式} 的函数，
+            用于累加等非覆盖式更新
+
+    Returns:
+        可执行的 INSERT 语句
+    """
+    if dialect_name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table)
+        values = update_values(stmt.inserted) if update_values else {c: stmt.inserted[c] for c in update_columns}
+        return stmt.on_duplicate_key_update(values)
+    if dialect_name in ('sqlite', 'postgresql'):
+        if dialect_name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        values = update_values(stmt.excluded) if update_values else {c: stmt.excluded[c] for c in update_columns}
+        return stmt.on_conflict_do_update(index_elements=index_elements, set_=values)
+    raise ValueError(f"Upsert is not supported for dialect {dialect_name}")
+
+
+def execute_batches(connection, stmt, rows: Iterable[dict], batch_size: int = 5000) -> int:
+    """分批 executemany 执行语句
+
+    Args:
+        connection: 数据库连接
+        stmt: INSERT/UPSERT 语句
+        rows: 记录列表
+        batch_size: 每批记录数
+
+    Returns:
+        写入的记录数
+    """
+    rows = list(rows)
+    for start in range(0, len(rows), batch_size):
+        connection.execute(stmt, rows[start:start + batch_size])
+    return len(rows)
@@ -0,0 +1,119 @@
+# 列式缓存文件格式
+import json
+import os
+import shutil
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_FILE = 'schema.json'
+
+
+def write_columnar(df: pd.DataFrame, directory: str, metadata: Optional[dict] = None) -> int:
+    """把数据写为列式目录：每列一个 .npy 文件，外加 schema.json
+
+    数值列和时间列按原始字节保存，打开时可以内存映射；字符串列保存为定宽Unicode数组加空值掩码。
+
+    Args:
+        df: 要保存的数据
+        directory: 目标目录，已存在时整体替换
+        metadata: 附加元数据，写入 schema.json
+
+    Returns:
+        写入的字节数
+    """
+    tmp_dir = directory.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, column in enumerate(df.columns):
+        series = df[column]
+        entry = {'name': str(column), 'file': f'{i}.npy'}
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            entry.update(kind='datetime', tz=str(series.dt.tz))
+            values = series.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy(dtype='datetime64[ns]')
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            entry.update(kind='datetime', tz=None)
+            values = series.to_numpy(dtype='datetime64[ns]')
+        elif pd.api.types.is_bool_dtype(series.dtype) or (pd.api.types.is_numeric_dtype(series.dtype) and not isinstance(series.dtype, pd.api.extensions.ExtensionDtype)):
+            entry.update(kind='numeric', dtype=str(series.dtype))
+            values = series.to_numpy()
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            # 可空整数等扩展类型：保存为浮点数，空值为NaN
+            entry.update(kind='nullable', dtype=str(series.dtype))
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            entry.update(kind='string', mask=f'{i}.mask.npy')
+            mask = series.isna().to_numpy()
+            np.save(os.path.join(tmp_dir, entry['mask']), mask)
+            values = np.where(mask, '', series.astype(str).to_numpy()).astype(str)
+        np.save(os.path.join(tmp_dir, entry['file']), np.ascontiguousarray(values))
+        columns.append(entry)
+
+    with open(os.path.join(tmp_dir, SCHEMA_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'columns': columns, 'rows': len(df), 'metadata': metadata or {}}, f, ensure_ascii=False)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return directory_size(directory)
+
+
+def read_columnar(directory: str, mmap: bool = True, columns: Optional[list] = None) -> pd.DataFrame:
+    """读取列式目录
+
+    Args:
+        directory: 列式目录
+        mmap: 是否以写时复制方式内存映射数值列，修改数据不会写回文件
+        columns: 只读取部分列
+
+    Returns:
+        数据
+    """
+    schema = read_schema(directory)
+    data = {}
+    for entry in schema['columns']:
+        if columns is not None and entry['name'] not in columns:
+            continue
+        path = os.path.join(directory, entry['file'])
+        if entry['kind'] == 'string':
+            values = np.load(path).astype(object)
+            values[np.load(os.path.join(directory, entry['mask']))] = None
+            data[entry['name']] = values
+            continue
+
+        values = np.load(path, mmap_mode='c' if mmap else None)
+        if entry['kind'] == 'datetime':
+            series = pd.Series(values, copy=False)
+            data[entry['name']] = series.dt.tz_localize('UTC').dt.tz_convert(entry['tz']) if entry['tz'] else series
+        elif entry['kind'] == 'nullable':
+            data[entry['name']] = pd.Series(values).astype(entry['dtype'])
+        else:
+            data[entry['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def read_schema(directory: str) -> dict:
+    """读取列式目录的 schema.json"""
+    with open(os.path.join(directory, SCHEMA_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def update_metadata(directory: str, metadata: dict) -> None:
+    """更新列式目录的附加元数据"""
+    schema = read_schema(directory)
+    schema['metadata'].update(metadata)
+    tmp_path = os.path.join(directory, SCHEMA_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(directory, SCHEMA_FILE))
+
+
+def directory_size(directory: str) -> int:
+    """目录下所有文件的总字节数"""
+    total = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
@@ -8,6 +8,17 @@ class Settings(BaseSettings):
     # 数据库配置
     DATABASE_URL: str
     MONGODB_URL: str
+    # 异步连接地址，为空时由 DATABASE_URL 换用异步驱动得到（mysql+aiomysql、sqlite+aiosqlite）
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # 同步 MongoDB 客户端（模型日志）的服务器选择和连接超时（毫秒），MongoDB 不可用时尽快失败
+    MONGODB_TIMEOUT_MS: int = 2000
+    
+    # 数据库连接池配置（同步和异步引擎各自一个连接池）
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 3600
+    DB_POOL_TIMEOUT: float = 30
     
     # FastAPI配置
     API_V1_STR: str = "/api/v1"
@@ -19,6 +30,44 @@ class Settings(BaseSettings):
     DEFAULT_LSTM_HIDDEN_LAYERS: int = 3
     DEFAULT_CONFIDENCE_LEVEL: float = 0.95
     
+    # 模型注册表配置
+    MODEL_REGISTRY_DIR: str = "model_registry"
+    MODEL_REGISTRY_MAX_BYTES: int = 2 * 1024 ** 3
+    MODEL_REGISTRY_MAX_AGE_DAYS: float = 30
+    
+    # 批量预测配置
+    FLEET_MAX_WORKERS: int = 4
+    FLEET_TF_THREADS: int = 1
+    FLEET_CHECKPOINT_DIR: str = "checkpoints"
+    PREDICT_RESULT_COMPACT: bool = False
+    PREDICT_RESULT_BATCH_SIZE: int = 5000
+    
+    # 后台任务队列配置
+    JOB_QUEUE_MAX_WORKERS: int = 2
+    JOB_QUEUE_MAX_PENDING: int = 100
+    
+    # 预测结果缓存配置
+    FORECAST_CACHE_TTL_SECONDS: float = 900
+    FORECAST_CACHE_MAX_ENTRIES: int = 1024
+    
+    # 汇总表配置
+    ROLLUP_BATCH_DAYS: int = 7
+    ROLLUP_REFRESH_DELAY_SECONDS: float = 5
+    
+    # 数据预处理配置
+    IMPUTER_STORE_DIR: str = "model_registry/imputers"
+    IMPUTER_MAX_AGE_HOURS: float = 24
+    IMPUTER_REFIT_ROWS: int = 1000000
+    SCALER_STORE_DIR: str = "model_registry/scalers"
+    FEATURE_SELECTION_STORE_DIR: str = "model_registry/feature_selection"
+    STAGE_CACHE_DIR: str = "stage_cache"
+    STAGE_CACHE_MAX_BYTES: int = 1024 ** 3
+    FEATURE_MATRIX_CACHE_MAX_ENTRIES: int = 256
+    FEATURE_MATRIX_CACHE_TTL_SECONDS: float = 900
+    MEMORY_BUDGET_MB: int = 2048
+    CALENDAR_START_DATE: str = "2020-01-01"
+    CALENDAR_END_DATE: str = "2030-12-31"
+    
     # JWT配置
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
@@ -1,20 +1,116 @@
 # 数据库连接配置
+import threading
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
 
+# 同步驱动到异步驱动的映射
+ASYNC_DRIVERS = {
+    'mysql': 'aiomysql',
+    'sqlite': 'aiosqlite',
+    'postgresql': 'asyncpg'
+}
+
+
+def pool_options(url: str) -> dict:
+    """根据配置生成连接池参数
+
+    SQLite 内存数据库使用单连接池，不支持连接池大小等参数，只保留连接检测。
+
+    Args:
+        url: 数据库连接地址
+
+    Returns:
+        create_engine 的连接池参数
+    """
+    options = {'pool_pre_ping': settings.DB_POOL_PRE_PING}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        return options
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_timeout=settings.DB_POOL_TIMEOUT
+    )
+    return options
+
+
+def async_database_url(url: str) -> str:
+    """把同步连接地址转换为异步驱动的连接地址，如 mysql+pymysql 转为 mysql+aiomysql"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}")
+    return parsed.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}').render_as_string(hide_password=False)
+
+
 # MySQL数据库连接
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(settings.DATABASE_URL, **pool_options(settings.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# MySQL异步连接，首次使用时创建，未安装异步驱动的进程（如批量预测工作进程）不受影响
+_async_engine = None
+_async_session_factory = None
+_async_lock = threading.Lock()
+
 # MongoDB数据库连接
 mongo_client = AsyncIOMotorClient(settings.MONGODB_URL)
 mongo_db = mongo_client.get_database()
 
 
+def get_async_engine():
+    """获取异步数据库引擎，连接池参数与同步引擎相同"""
+    global _async_engine, _async_session_factory
+    with _async_lock:
+        if _async_engine is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+            url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+            _async_engine = create_async_engine(url, **pool_options(url))
+            _async_session_factory = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+        return _async_engine
+
+
+def get_async_session_factory():
+    """获取异步会话工厂"""
+    get_async_engine()
+    return _async_session_factory
+
+
+async def dispose_async_engine() -> None:
+    """关闭异步引擎的连接池，应用关闭时调用"""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_session_factory = None
+
+
+def get_pool_status() -> dict:
+    """同步和异步连接池的使用情况，用于监控
+
+    Returns:
+        {'sync': {...}, 'async': {...}}，未创建异步引擎时不含 'async'
+    """
+    status = {'sync': _pool_stats(engine.pool)}
+    if _async_engine is not None:
+        status['async'] = _pool_stats(_async_engine.sync_engine.pool)
+    return status
+
+
+def _pool_stats(pool) -> dict:
+    stats = {'pool_class': type(pool).__name__, 'status': pool.status()}
+    # 只有 QueuePool 一类的连接池提供以下计数
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
+
+
 # 依赖项：获取MySQL数据库会话
 def get_db():
     """获取数据库会话"""
@@ -25,6 +121,13 @@ def get_db():
         db.close()
 
 
+# 依赖项：获取MySQL异步数据库会话
+async def get_async_db():
+    """获取异步数据库会话，在 async def 路由中使用，不阻塞事件循环"""
+    async with get_async_session_factory()() as session:
+        yield session
+
+
 # 依赖项：获取MongoDB数据库
 def get_mongo_db():
     """获取MongoDB数据库"""
@@ -0,0 +1,27 @@
+# 数据指纹工具
+import hashlib
+import json
+from typing import Optional
+
+import pandas as pd
+
+
+def compute_data_fingerprint(df: pd.DataFrame, params: Optional[dict] = None) -> str:
+    """计算数据指纹
+
+    对列名、列类型和逐行哈希值做SHA-256摘要，数据或参数任何变化都会得到不同的指纹。
+
+    Args:
+        df: 输入数据
+        params: 参与指纹计算的附加参数（如训练超参数）
+
+    Returns:
+        十六进制指纹字符串
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in df.columns]).encode('utf-8'))
+    digest.update(json.dumps([str(t) for t in df.dtypes]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    if params:
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
@@ -0,0 +1,81 @@
+# 内存统计工具
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+MB = 1024 ** 2
+
+
+def process_memory_mb() -> tuple:
+    """当前进程的常驻内存和峰值常驻内存（MB）
+
+    Linux 上读取 /proc/self/status，其他平台退化为 getrusage 的峰值，都不可用时返回 NaN。
+
+    Returns:
+        (当前常驻内存, 峰值常驻内存)
+    """
+    try:
+        values = {}
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    name, amount = line.split(':', 1)
+                    values[name] = int(amount.split()[0]) / 1024
+        return values['VmRSS'], values['VmHWM']
+    except (OSError, KeyError):
+        try:
+            import resource
+        except ImportError:
+            return float('nan'), float('nan')
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return peak, peak
+
+
+def frame_memory_mb(df: pd.DataFrame) -> float:
+    """数据占用的内存（MB），包括字符串等对象列的实际内容"""
+    return float(df.memory_usage(index=True, deep=True).sum()) / MB
+
+
+class MemoryReport:
+    """按阶段记录内存占用，用于估算工作容器所需的内存"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, stage: str, df: Optional[pd.DataFrame] = None, arrays: Optional[list] = None) -> dict:
+        """记录一个阶段结束时的内存占用
+
+        Args:
+            stage: 阶段名
+            df: 阶段输出的数据
+            arrays: 阶段输出的数组（窗口视图按底层数据计算）
+
+        Returns:
+            该阶段的内存记录
+        """
+        rss, peak = process_memory_mb()
+        entry = {'rss_mb': rss, 'peak_rss_mb': peak}
+        if df is not None:
+            entry['frame_mb'] = frame_memory_mb(df)
+        if arrays is not None:
+            entry['arrays_mb'] = sum(self._array_nbytes(a) for a in arrays) / MB
+        self.stages[stage] = entry
+        return entry
+
+    def summary(self) -> str:
+        """单行摘要，便于写入日志"""
+        parts = []
+        for stage, entry in self.stages.items():
+            data_mb = entry.get('frame_mb', entry.get('arrays_mb'))
+            data = f"data={data_mb:.1f}MB " if data_mb is not None else ''
+            parts.append(f"{stage}: {data}rss={entry['rss_mb']:.0f}MB peak={entry['peak_rss_mb']:.0f}MB")
+        return '; '.join(parts)
+
+    @staticmethod
+    def _array_nbytes(array: np.ndarray) -> int:
+        # 步长视图只占用底层数组的内存
+        base = array
+        while isinstance(base, np.ndarray) and base.base is not None and isinstance(base.base, np.ndarray):
+            base = base.base
+        return base.nbytes if isinstance(base, np.ndarray) else np.asarray(array).nbytes
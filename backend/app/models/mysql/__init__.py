@@ -1,19 +1,27 @@
 # MySQL模型导出
 from .stations import Station
-from .historical_data import HistoricalData
+from .historical_data import HistoricalData, HistoricalOutlier
 from .variable_data import VariableData
 from .model_config import ModelConfig
-from .predict_result import PredictResult
+from .predict_result import PredictResult, PredictRun
 from .actual_data import ActualData
 from .pricing import PricingStrategy, TimeSlotPricing
+from .elasticity_stats import ElasticityStats
+from .rollups import StationHourlyRollup, StationDailyRollup, NetworkDailyRollup
 
 __all__ = [
     "Station",
     "HistoricalData",
+    "HistoricalOutlier",
     "VariableData",
     "ModelConfig",
     "PredictResult",
+    "PredictRun",
     "ActualData",
     "PricingStrategy",
-    "TimeSlotPricing"
+    "TimeSlotPricing",
+    "ElasticityStats",
+    "StationHourlyRollup",
+    "StationDailyRollup",
+    "NetworkDailyRollup"
 ]
@@ -0,0 +1,25 @@
+# 价格弹性统计量模型
+from sqlalchemy import Column, Integer, Double, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class ElasticityStats(Base):
+    """价格弹性回归充分统计量模型：按 (充电站, 小时) 累积 ln(需求) ~ ln(价格) 的求和项
+
+    求和项经多次增量累加（覆盖旧行时为负增量），且回归斜率的 n·Σxy − Σx·Σy 容易相消，必须用双精度保存。
+    """
+    __tablename__ = "elasticity_stats"
+    __table_args__ = (
+        UniqueConstraint("station_id", "hour", name="uq_elasticity_stats_station_hour"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    station_id = Column(Integer, ForeignKey("stations.id", ondelete="CASCADE"), nullable=False, index=True)
+    hour = Column(Integer, nullable=False, comment="时段(小时)")
+    n = Column(Double, nullable=False, default=0, comment="有效样本数")
+    sum_x = Column(Double, nullable=False, default=0, comment="Σln(价格)")
+    sum_y = Column(Double, nullable=False, default=0, comment="Σln(需求)")
+    sum_xy = Column(Double, nullable=False, default=0, comment="Σln(价格)·ln(需求)")
+    sum_xx = Column(Double, nullable=False, default=0, comment="Σln(价格)²")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,5 +1,5 @@
 # 历史充电数据模型
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, Boolean, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -8,6 +8,9 @@ from app.core.database import Base
 class HistoricalData(Base):
     """历史充电数据模型"""
     __tablename__ = "historical_data"
+    __table_args__ = (
+        UniqueConstraint("station_id", "time_slot", name="uq_historical_data_station_time"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     station_id = Column(Integer, ForeignKey("stations.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -19,3 +22,21 @@ class HistoricalData(Base):
     
     # 关系
     station = relationship("Station", backref="historical_data")
+
+
+class HistoricalOutlier(Base):
+    """历史数据异常值标记模型：数据导入时在线检测出的异常值及检测时的上下界"""
+    __tablename__ = "historical_outlier"
+    __table_args__ = (
+        UniqueConstraint("station_id", "time_slot", "column_name", name="uq_historical_outlier_station_time_column"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    station_id = Column(Integer, ForeignKey("stations.id", ondelete="CASCADE"), nullable=False, index=True)
+    time_slot = Column(DateTime(timezone=True), nullable=False, index=True)
+    column_name = Column(String(50), nullable=False, comment="异常列名")
+    value = Column(Float, nullable=False, comment="异常值")
+    lower_bound = Column(Float, comment="检测下界")
+    upper_bound = Column(Float, comment="检测上界")
+    dropped = Column(Boolean, nullable=False, default=False, comment="是否未写入historical_data")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
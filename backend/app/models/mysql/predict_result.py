@@ -1,5 +1,5 @@
 # 预测结果模型
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, LargeBinary, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -8,6 +8,9 @@ from app.core.database import Base
 class PredictResult(Base):
     """预测结果模型"""
     __tablename__ = "predict_result"
+    __table_args__ = (
+        UniqueConstraint("station_id", "time_slot", "model_config_id", name="uq_predict_result_station_time_config"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     station_id = Column(Integer, ForeignKey("stations.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -25,3 +28,30 @@ class PredictResult(Base):
     # 关系
     station = relationship("Station", backref="predict_results")
     model_config = relationship("ModelConfig", backref="predict_results")
+
+
+class PredictRun(Base):
+    """预测批次模型：一次预测的全部时段存为一行，各指标为按时段顺序打包的 float32 小端数组"""
+    __tablename__ = "predict_run"
+    __table_args__ = (
+        UniqueConstraint("station_id", "model_config_id", "start_slot", name="uq_predict_run_station_config_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    station_id = Column(Integer, ForeignKey("stations.id", ondelete="CASCADE"), nullable=False, index=True)
+    model_config_id = Column(Integer, ForeignKey("model_config.id", ondelete="CASCADE"), nullable=False)
+    start_slot = Column(DateTime(timezone=True), nullable=False, index=True, comment="第一个预测时段")
+    step_seconds = Column(Integer, nullable=False, default=3600, comment="时段间隔(秒)")
+    slot_count = Column(Integer, nullable=False, comment="预测时段数")
+    predicted_amount_mean = Column(LargeBinary, nullable=False, comment="预测充电量均值(kWh)")
+    predicted_amount_lower = Column(LargeBinary, nullable=False, comment="预测充电量下限(kWh)")
+    predicted_amount_upper = Column(LargeBinary, nullable=False, comment="预测充电量上限(kWh)")
+    suggested_price_mean = Column(LargeBinary, nullable=False, comment="建议价格均值(元/kWh)")
+    suggested_price_lower = Column(LargeBinary, nullable=False, comment="建议价格下限(元/kWh)")
+    suggested_price_upper = Column(LargeBinary, nullable=False, comment="建议价格上限(元/kWh)")
+    revenue_prediction = Column(LargeBinary, nullable=False, comment="收益预测(元)")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # 关系
+    station = relationship("Station", backref="predict_runs")
+    model_config = relationship("ModelConfig", backref="predict_runs")
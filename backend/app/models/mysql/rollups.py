@@ -0,0 +1,71 @@
+# 汇总表模型
+from sqlalchemy import Column, Integer, Float, Double, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class RollupMetrics:
+    """汇总指标列：计数和求和可以直接相加，最小/最大值可以再取最小/最大，粗粒度汇总由细粒度汇总合并得到
+
+    求和列用双精度：单精度只有约7位有效数字，全网按天的收入合计超过约10万元后就会丢失分。
+    """
+
+    # historical_data
+    charging_count = Column(Integer, nullable=False, default=0, comment="充电记录数")
+    charging_amount_sum = Column(Double, nullable=False, default=0, comment="充电量合计(kWh)")
+    charging_amount_min = Column(Float, comment="最小充电量(kWh)")
+    charging_amount_max = Column(Float, comment="最大充电量(kWh)")
+    charging_duration_sum = Column(Double, nullable=False, default=0, comment="充电时长合计(h)")
+    revenue_sum = Column(Double, nullable=False, default=0, comment="收入合计(元)")
+    # actual_data
+    actual_count = Column(Integer, nullable=False, default=0, comment="实际回流记录数")
+    actual_amount_sum = Column(Double, nullable=False, default=0, comment="实际充电量合计(kWh)")
+    actual_amount_min = Column(Float, comment="最小实际充电量(kWh)")
+    actual_amount_max = Column(Float, comment="最大实际充电量(kWh)")
+    actual_revenue_sum = Column(Double, nullable=False, default=0, comment="实际收入合计(元)")
+    # predict_result
+    predicted_count = Column(Integer, nullable=False, default=0, comment="预测时段数")
+    predicted_amount_sum = Column(Double, nullable=False, default=0, comment="预测充电量合计(kWh)")
+    predicted_revenue_sum = Column(Double, nullable=False, default=0, comment="预测收益合计(元)")
+    # 预测与实际均存在的时段
+    matched_count = Column(Integer, nullable=False, default=0, comment="可评估预测准确度的时段数")
+    abs_error_sum = Column(Double, nullable=False, default=0, comment="绝对误差合计(kWh)")
+    squared_error_sum = Column(Double, nullable=False, default=0, comment="误差平方合计")
+    ape_sum = Column(Double, nullable=False, default=0, comment="绝对百分比误差合计")
+    ape_count = Column(Integer, nullable=False, default=0, comment="实际充电量大于0的时段数")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class StationHourlyRollup(RollupMetrics, Base):
+    """充电站×小时汇总模型"""
+    __tablename__ = "rollup_station_hourly"
+    __table_args__ = (
+        UniqueConstraint("station_id", "bucket", name="uq_rollup_station_hourly_station_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    station_id = Column(Integer, ForeignKey("stations.id", ondelete="CASCADE"), nullable=False, index=True)
+    bucket = Column(DateTime(timezone=True), nullable=False, index=True, comment="小时起点")
+
+
+class StationDailyRollup(RollupMetrics, Base):
+    """充电站×天汇总模型"""
+    __tablename__ = "rollup_station_daily"
+    __table_args__ = (
+        UniqueConstraint("station_id", "bucket", name="uq_rollup_station_daily_station_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    station_id = Column(Integer, ForeignKey("stations.id", ondelete="CASCADE"), nullable=False, index=True)
+    bucket = Column(DateTime(timezone=True), nullable=False, index=True, comment="日期零点")
+
+
+class NetworkDailyRollup(RollupMetrics, Base):
+    """全网×天汇总模型"""
+    __tablename__ = "rollup_network_daily"
+    __table_args__ = (
+        UniqueConstraint("bucket", name="uq_rollup_network_daily_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    bucket = Column(DateTime(timezone=True), nullable=False, comment="日期零点")
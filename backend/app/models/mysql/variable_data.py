@@ -1,5 +1,5 @@
 # 变量数据模型
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -8,6 +8,9 @@ from app.core.database import Base
 class VariableData(Base):
     """变量数据模型"""
     __tablename__ = "variable_data"
+    __table_args__ = (
+        UniqueConstraint("station_id", "time_slot", name="uq_variable_data_station_time"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     station_id = Column(Integer, ForeignKey("stations.id", ondelete="CASCADE"), nullable=False, index=True)
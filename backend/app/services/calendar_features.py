@@ -0,0 +1,140 @@
+# 日历特征服务
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 日历特征列及其紧凑数据类型
+CALENDAR_FEATURES = {
+    'hour': np.int8,
+    'day_of_week': np.int8,
+    'day_of_month': np.int8,
+    'month': np.int8,
+    'quarter': np.int8,
+    'is_weekend': np.int8,
+    'sin_hour': np.float32,
+    'cos_hour': np.float32,
+    'sin_month': np.float32,
+    'cos_month': np.float32
+}
+HOLIDAY_FEATURE = 'is_holiday'
+
+NS_PER_HOUR = 3600 * 10 ** 9
+
+
+class CalendarFeatureTable:
+    """按小时预先计算的日历特征查找表
+
+    日历特征只取决于时间戳所在的小时，每个小时只计算一次，之后按整数偏移量直接取值广播回各行，
+    多充电站数据中大量重复的时间戳不会重复计算。查询范围超出表的范围时自动扩展。
+    """
+
+    def __init__(self, start: Optional[str] = None, end: Optional[str] = None, holidays: Optional[list] = None):
+        self.holidays = pd.DatetimeIndex(pd.to_datetime(sorted(set(holidays)))).normalize() if holidays else None
+        self.start_hour = self._to_hours(pd.Timestamp(start or settings.CALENDAR_START_DATE))
+        self.end_hour = self._to_hours(pd.Timestamp(end or settings.CALENDAR_END_DATE))
+        self.features = {}
+        self._lock = threading.Lock()
+
+    @property
+    def feature_names(self) -> list:
+        return list(CALENDAR_FEATURES) + ([HOLIDAY_FEATURE] if self.holidays is not None else [])
+
+    def lookup(self, timestamps) -> dict:
+        """查询一组时间戳的日历特征
+
+        带时区的时间戳按其本地时间计算特征。
+
+        Args:
+            timestamps: 时间戳序列（datetime 类型或可被 pd.to_datetime 解析）
+
+        Returns:
+            {特征名: 与输入等长的数组}，时间戳缺失的行特征为 NaN
+        """
+        timestamps = pd.Series(pd.to_datetime(timestamps))
+        if isinstance(timestamps.dtype, pd.DatetimeTZDtype):
+            timestamps = timestamps.dt.tz_localize(None)
+        values = timestamps.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        missing = np.isnat(timestamps.to_numpy(dtype='datetime64[ns]'))
+        hours = values // NS_PER_HOUR
+
+        if missing.all():
+            return {name: np.full(len(hours), np.nan, dtype=np.float32) for name in self.feature_names}
+        valid_hours = hours[~missing]
+        features, start_hour = self._ensure_range(int(valid_hours.min()), int(valid_hours.max()))
+
+        offsets = hours - start_hour
+        offsets[missing] = 0
+        result = {}
+        for name, column in features.items():
+            values = column[offsets]
+            if missing.any():
+                values = values.astype(np.float32)
+                values[missing] = np.nan
+            result[name] = values
+        return result
+
+    def _ensure_range(self, low: int, high: int) -> tuple:
+        """确保表覆盖 [low, high] 小时范围，返回特征数组和起始小时"""
+        with self._lock:
+            if not self.features or low < self.start_hour or high > self.end_hour:
+                self.start_hour = min(self.start_hour, low)
+                self.end_hour = max(self.end_hour, high)
+                self.features = self._build(self.start_hour, self.end_hour)
+            return self.features, self.start_hour
+
+    def _build(self, start_hour: int, end_hour: int) -> dict:
+        """计算 [start_hour, end_hour] 范围内每个小时的日历特征"""
+        index = pd.DatetimeIndex((np.arange(start_hour, end_hour + 1, dtype=np.int64) * NS_PER_HOUR).astype('datetime64[ns]'))
+        hour = index.hour.to_numpy()
+        month = index.month.to_numpy()
+        day_of_week = index.dayofweek.to_numpy()
+        features = {
+            'hour': hour,
+            'day_of_week': day_of_week,
+            'day_of_month': index.day.to_numpy(),
+            'month': month,
+            'quarter': index.quarter.to_numpy(),
+            'is_weekend': np.isin(day_of_week, [5, 6]),
+            'sin_hour': np.sin(2 * np.pi * hour / 24),
+            'cos_hour': np.cos(2 * np.pi * hour / 24),
+            'sin_month': np.sin(2 * np.pi * month / 12),
+            'cos_month': np.cos(2 * np.pi * month / 12)
+        }
+        features = {name: features[name].astype(dtype) for name, dtype in CALENDAR_FEATURES.items()}
+        if self.holidays is not None:
+            features[HOLIDAY_FEATURE] = index.normalize().isin(self.holidays).astype(np.int8)
+        logger.info(f"Built calendar feature table with {len(index)} hourly rows")
+        return features
+
+    @staticmethod
+    def _to_hours(timestamp: pd.Timestamp) -> int:
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_localize(None)
+        return int(timestamp.value // NS_PER_HOUR)
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def get_calendar_table(holidays: Optional[list] = None) -> CalendarFeatureTable:
+    """获取共享的日历特征表，相同节假日配置的调用复用同一张表
+
+    Args:
+        holidays: 节假日日期列表，为空时不生成 is_holiday 特征
+
+    Returns:
+        日历特征表
+    """
+    key = tuple(sorted(str(pd.Timestamp(day).date()) for day in holidays)) if holidays else None
+    with _tables_lock:
+        if key not in _tables:
+            _tables[key] = CalendarFeatureTable(holidays=list(key) if key else None)
+        return _tables[key]
@@ -0,0 +1,110 @@
+# 历史数据流式加载服务
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Engine, select
+
+from app.core.database import engine as default_engine
+from app.models.mysql import HistoricalData
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 默认加载的测量列
+HISTORICAL_VALUE_COLUMNS = ['charging_amount', 'electricity_price', 'charging_duration']
+
+
+class HistoricalDataLoader:
+    """按 (充电站, 时间范围) 流式加载 historical_data
+
+    通过 Core 查询只取需要的列，不为每行构建 ORM 对象；按 time_slot 做键集分页，
+    每页都是 idx_historical_data_station_time 索引上的范围扫描（station_id = ? AND time_slot > 上一页末尾），
+    与 OFFSET 分页不同，翻页代价不随已读行数增长。每页以服务端游标（stream_results）读取，
+    按 chunk_rows 行一块直接转换为列式数组，客户端不会缓存整页结果，也不会长时间占用一个游标。
+    bind 可以是引擎，也可以是调用方的连接（复用其事务，迭代期间不要在该连接上执行其他查询）；
+    compact 为 True 时测量值以 float32 保存。
+    """
+
+    def __init__(self, bind=None, chunk_rows: int = 50000, page_rows: int = 500000, compact: bool = False):
+        self.bind = bind if bind is not None else default_engine
+        self.chunk_rows = chunk_rows
+        self.page_rows = max(page_rows, chunk_rows)
+        self.compact = compact
+
+    def iter_chunks(self, station_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None, columns: Optional[list] = None):
+        """按时间顺序逐块读取充电站的历史数据
+
+        Args:
+            station_id: 充电站ID
+            start: 起始时间（包含），为空时从最早的数据开始
+            end: 结束时间（不包含），为空时读到最新的数据
+            columns: 测量列，默认 HISTORICAL_VALUE_COLUMNS
+
+        Yields:
+            包含 time_slot 和测量列的数据块，按 time_slot 升序
+        """
+        columns = list(columns or HISTORICAL_VALUE_COLUMNS)
+        selected = [HistoricalData.time_slot] + [getattr(HistoricalData, c) for c in columns]
+        last_time = None
+        total = 0
+        while True:
+            query = select(*selected).where(HistoricalData.station_id == station_id)
+            if start is not None:
+                query = query.where(HistoricalData.time_slot >= start)
+            if end is not None:
+                query = query.where(HistoricalData.time_slot < end)
+            if last_time is not None:
+                query = query.where(HistoricalData.time_slot > last_time)
+            query = query.order_by(HistoricalData.time_slot).limit(self.page_rows)
+
+            page_count = 0
+            with self._connect() as connection:
+                result = connection.execute(query, execution_options={'stream_results': True, 'max_row_buffer': self.chunk_rows})
+                for rows in result.partitions(self.chunk_rows):
+                    chunk = self._to_frame(rows, columns)
+                    page_count += len(chunk)
+                    last_time = rows[-1][0]
+                    yield chunk
+            total += page_count
+            if page_count < self.page_rows:
+                break
+        logger.info(f"Streamed {total} historical rows for station {station_id}")
+
+    def load_frame(self, station_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None, columns: Optional[list] = None) -> pd.DataFrame:
+        """读取充电站的历史数据为一个数据帧
+
+        Args:
+            station_id: 充电站ID
+            start: 起始时间（包含）
+            end: 结束时间（不包含）
+            columns: 测量列，默认 HISTORICAL_VALUE_COLUMNS
+
+        Returns:
+            包含 time_slot 和测量列的数据，按 time_slot 升序
+        """
+        chunks = list(self.iter_chunks(station_id, start, end, columns))
+        if not chunks:
+            return self._to_frame([], list(columns or HISTORICAL_VALUE_COLUMNS))
+        if len(chunks) == 1:
+            return chunks[0]
+        return pd.concat(chunks, ignore_index=True)
+
+    def _connect(self):
+        # 传入连接时复用该连接（及其事务），不关闭
+        if isinstance(self.bind, Engine):
+            return self.bind.connect()
+        return nullcontext(self.bind)
+
+    def _to_frame(self, rows: list, columns: list) -> pd.DataFrame:
+        """把一块结果行按列转换为数组"""
+        dtype = np.float32 if self.compact else np.float64
+        fields = list(zip(*rows)) if rows else [()] * (len(columns) + 1)
+        data = {'time_slot': pd.DatetimeIndex(fields[0]) if rows else pd.DatetimeIndex([], dtype='datetime64[ns]')}
+        for column, values in zip(columns, fields[1:]):
+            # None（空值）转换为 NaN
+            data[column] = np.array(values, dtype=dtype)
+        return pd.DataFrame(data)
+
@@ -1,32 +1,89 @@
 # 数据处理服务
+import hashlib
+import json
+import os
+import time
+from typing import Optional
 import pandas as pd
 import numpy as np
+from joblib import Parallel, delayed
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.feature_selection import mutual_info_regression
 from sklearn.preprocessing import MinMaxScaler
+from app.core.columnar import read_columnar, read_schema, update_metadata, write_columnar
+from app.core.config import settings
+from app.core.fingerprint import compute_data_fingerprint
+from app.core.memory import MB, MemoryReport, frame_memory_mb
+from app.services.calendar_features import get_calendar_table
+from app.services.imputation import MultiColumnImputer
+from app.services.scaler_store import ScalerStore
+from app.services.stage_cache import StageCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 紧凑数据类型：测量值 float32，充电站ID int32，时间列解析为datetime
+COMPACT_SCHEMA = {
+    'station_id': 'int32',
+    'time_slot': 'datetime',
+    'charging_amount': 'float32',
+    'electricity_price': 'float32',
+    'charging_duration': 'float32',
+    'temperature': 'float32',
+    'humidity': 'float32',
+    'traffic_flow': 'float32',
+    'competitor_price': 'float32',
+    'user_behavior_score': 'float32',
+    'actual_amount': 'float32',
+    'actual_price': 'float32'
+}
+
 
 class DataProcessor:
     """数据处理服务类"""
     
-    def __init__(self):
+    def __init__(self, memory_budget_mb: Optional[int] = None):
+        self.memory_budget_mb = memory_budget_mb if memory_budget_mb is not None else settings.MEMORY_BUDGET_MB
         self.scaler = MinMaxScaler()
+        self.scaler_store = ScalerStore()
+        self.imputer = MultiColumnImputer()
+        self.selection_cache = {}
+        self.stage_cache = StageCache()
+        self.stage_timings = {}
+        self.memory_report = MemoryReport()
     
-    def load_data(self, file_path: str) -> pd.DataFrame:
+    def load_data(self, file_path: str, use_cache: bool = False, chunksize: Optional[int] = None, schema: Optional[dict] = None) -> pd.DataFrame:
         """加载数据文件
         
         Args:
             file_path: 文件路径
+            use_cache: 是否使用源文件旁的列式缓存；缓存保存的是按紧凑类型转换后的数据，
+                源文件的修改时间、大小或内容哈希变化时自动重建
+            chunksize: 指定时按块读取并转换为紧凑类型，降低解析时的内存峰值；
+                文件大小超过内存预算的一半时自动按块读取
+            schema: 列名到类型的映射，默认使用 COMPACT_SCHEMA
             
         Returns:
             加载后的数据
         """
         logger.info(f"Loading data from {file_path}")
+        if not chunksize and self.memory_budget_mb and os.path.getsize(file_path) * 2 > self.memory_budget_mb * MB:
+            chunksize = 100000
+            logger.info(f"File exceeds half of the {self.memory_budget_mb} MB memory budget, reading in compact chunks")
+        
+        if use_cache:
+            cache_dir = self.cache_path(file_path)
+            if self.is_cache_valid(file_path):
+                df = read_columnar(cache_dir, mmap=True)
+                logger.info(f"Loaded {len(df)} rows from columnar cache {cache_dir}")
+                return df
+            df = pd.concat(list(self.read_data_chunks(file_path, chunksize or 100000, schema)), ignore_index=True)
+            write_columnar(df, cache_dir, metadata={'source': self._source_signature(file_path, with_hash=True)})
+            logger.info(f"Wrote columnar cache {cache_dir}")
+        elif chunksize:
+            df = pd.concat(list(self.read_data_chunks(file_path, chunksize, schema)), ignore_index=True)
         # 根据文件扩展名选择加载方式
-        if file_path.endswith('.csv'):
+        elif file_path.endswith('.csv'):
             df = pd.read_csv(file_path)
         elif file_path.endswith('.xlsx') or file_path.endswith('.xls'):
             df = pd.read_excel(file_path)
@@ -36,109 +93,288 @@ class DataProcessor:
         logger.info(f"Loaded {len(df)} rows of data")
         return df
     
-    def detect_outliers(self, df: pd.DataFrame, column: str, method: str = 'zscore') -> pd.DataFrame:
+    def read_data_chunks(self, file_path: str, chunksize: int = 100000, schema: Optional[dict] = None):
+        """按块读取数据文件并转换为紧凑类型
+        
+        Args:
+            file_path: 文件路径
+            chunksize: 每块行数
+            schema: 列名到类型的映射，默认使用 COMPACT_SCHEMA
+            
+        Yields:
+            转换类型后的数据块
+        """
+        schema = COMPACT_SCHEMA if schema is None else schema
+        if file_path.endswith('.csv'):
+            for chunk in pd.read_csv(file_path, chunksize=chunksize):
+                yield self.apply_schema(chunk, schema)
+        elif file_path.endswith('.xlsx') or file_path.endswith('.xls'):
+            # Excel无法流式解析，读入后按块转换
+            df = pd.read_excel(file_path)
+            for start in range(0, len(df), chunksize):
+                yield self.apply_schema(df.iloc[start:start + chunksize], schema)
+        else:
+            raise ValueError("Unsupported file format. Please use CSV or Excel files.")
+    
+    def load_station_data(self, station_id: int, start=None, end=None, columns: Optional[list] = None, loader=None) -> pd.DataFrame:
+        """从 historical_data 流式加载充电站一段时间的数据
+        
+        Args:
+            station_id: 充电站ID
+            start: 起始时间（包含）
+            end: 结束时间（不包含）
+            columns: 测量列，默认充电量、电价和充电时长
+            loader: 历史数据加载器，默认按内存预算决定是否以 float32 加载
+            
+        Returns:
+            包含 station_id、time_slot 和测量列的数据，按 time_slot 升序
+        """
+        from app.services.data_loader import HistoricalDataLoader
+        
+        loader = loader if loader is not None else HistoricalDataLoader(compact=bool(self.memory_budget_mb))
+        df = loader.load_frame(station_id, start, end, columns)
+        df.insert(0, 'station_id', np.full(len(df), station_id, dtype=np.int32))
+        logger.info(f"Loaded {len(df)} rows for station {station_id} from historical_data")
+        return df
+    
+    def apply_schema(self, df: pd.DataFrame, schema: Optional[dict] = None) -> pd.DataFrame:
+        """按列类型映射转换数据
+        
+        Args:
+            df: 输入数据
+            schema: 列名到类型的映射，'datetime' 表示解析为时间；默认使用 COMPACT_SCHEMA
+            
+        Returns:
+            转换后的数据，不在映射中的列保持不变
+        """
+        schema = COMPACT_SCHEMA if schema is None else schema
+        converted = {}
+        for column, dtype in schema.items():
+            if column not in df.columns:
+                continue
+            if dtype == 'datetime':
+                converted[column] = pd.to_datetime(df[column], errors='coerce')
+                continue
+            values = pd.to_numeric(df[column], errors='coerce')
+            if np.dtype(dtype).kind in 'iu' and values.isna().any():
+                # 含空值的整数列使用可空整数类型
+                converted[column] = values.astype(dtype.capitalize())
+            else:
+                converted[column] = values.astype(dtype)
+        return df.assign(**converted)
+    
+    def compact_dtypes(self, df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+        """把数据转换为紧凑类型
+        
+        COMPACT_SCHEMA 中的列按映射转换，其余浮点列转为 float32，整数列缩小到能容纳取值的最小整数类型。
+        
+        Args:
+            df: 输入数据
+            inplace: 是否直接修改输入数据，不复制
+            
+        Returns:
+            转换后的数据
+        """
+        before = frame_memory_mb(df)
+        if not inplace:
+            df = df.copy()
+        schema = {c: t for c, t in COMPACT_SCHEMA.items() if t != 'datetime'}
+        for column in df.columns:
+            dtype = df[column].dtype
+            if column in schema:
+                if dtype != np.dtype(schema[column]) and not (np.dtype(schema[column]).kind in 'iu' and df[column].isna().any()):
+                    df[column] = df[column].astype(schema[column])
+            elif dtype == np.float64:
+                df[column] = df[column].astype(np.float32)
+            elif dtype.kind in 'iu' and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+                df[column] = pd.to_numeric(df[column], downcast='integer' if dtype.kind == 'i' else 'unsigned')
+        logger.info(f"Compacted dtypes: {before:.1f} MB -> {frame_memory_mb(df):.1f} MB")
+        return df
+    
+    def cache_path(self, file_path: str) -> str:
+        """源文件对应的列式缓存目录"""
+        return file_path + '.cache'
+    
+    def is_cache_valid(self, file_path: str) -> bool:
+        """检查列式缓存是否与源文件一致
+        
+        修改时间和大小都一致时直接命中；只有修改时间变化时再比较内容哈希。
+        """
+        cache_dir = self.cache_path(file_path)
+        if not os.path.exists(os.path.join(cache_dir, 'schema.json')):
+            return False
+        cached = read_schema(cache_dir)['metadata'].get('source', {})
+        current = self._source_signature(file_path)
+        if cached.get('size') != current['size']:
+            return False
+        if cached.get('mtime') == current['mtime']:
+            return True
+        if cached.get('sha256') != self._file_hash(file_path):
+            return False
+        # 内容未变（如文件被 touch），记录新的修改时间避免下次重复计算哈希
+        update_metadata(cache_dir, {'source': {**cached, 'mtime': current['mtime']}})
+        return True
+    
+    def _source_signature(self, file_path: str, with_hash: bool = False) -> dict:
+        stat = os.stat(file_path)
+        signature = {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+        if with_hash:
+            signature['sha256'] = self._file_hash(file_path)
+        return signature
+    
+    @staticmethod
+    def _file_hash(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def detect_outliers(self, df: pd.DataFrame, column: str, method: str = 'zscore', inplace: bool = False, group_by: Optional[list] = None, time_column: Optional[str] = None) -> pd.DataFrame:
         """异常值检测
         
         Args:
             df: 输入数据
             column: 要检测的列名
             method: 检测方法，支持 'zscore' 或 'iqr'
+            inplace: 是否直接修改输入数据，不复制
+            group_by: 分组列（如 'station_id'），为空时基于全部数据计算界限
+            time_column: 时间列，指定时在分组内再按小时分别计算界限
             
         Returns:
             标记了异常值的数据
         """
         logger.info(f"Detecting outliers in column {column} using {method} method")
-        df = df.copy()
+        if not inplace:
+            df = df.copy()
         
-        if method == 'zscore':
-            # 基于3σ原则检测异常值
-            z_scores = np.abs((df[column] - df[column].mean()) / df[column].std())
-            df[f'{column}_is_outlier'] = z_scores > 3
-        elif method == 'iqr':
-            # 基于IQR方法检测异常值
-            Q1 = df[column].quantile(0.25)
-            Q3 = df[column].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            df[f'{column}_is_outlier'] = (df[column] < lower_bound) | (df[column] > upper_bound)
-        else:
-            raise ValueError(f"Unsupported outlier detection method: {method}")
+        df[f'{column}_is_outlier'] = self.outlier_mask(df, [column], method, group_by, time_column)[:, 0]
         
         outlier_count = df[f'{column}_is_outlier'].sum()
         logger.info(f"Detected {outlier_count} outliers in column {column}")
         return df
     
-    def handle_outliers(self, df: pd.DataFrame, column: str, method: str = 'remove') -> pd.DataFrame:
+    def handle_outliers(self, df: pd.DataFrame, column: str, method: str = 'remove', inplace: bool = False, group_by: Optional[list] = None, time_column: Optional[str] = None) -> pd.DataFrame:
         """处理异常值
         
         Args:
             df: 输入数据
             column: 要处理的列名
             method: 处理方法，支持 'remove' 或 'replace'
+            inplace: 是否直接修改输入数据，不复制
+            group_by: 分组列，'replace' 时用各组中位数替换
+            time_column: 时间列，指定时在分组内再按小时计算中位数
             
         Returns:
             处理后的数据
         """
         logger.info(f"Handling outliers in column {column} using {method} method")
-        df = df.copy()
+        if not inplace:
+            df = df.copy()
         
         if method == 'remove':
             # 删除异常值
             df = df[~df[f'{column}_is_outlier']].drop(columns=[f'{column}_is_outlier'])
         elif method == 'replace':
             # 用中位数替换异常值
-            median = df[~df[f'{column}_is_outlier']][column].median()
-            df.loc[df[f'{column}_is_outlier'], column] = median
-            df = df.drop(columns=[f'{column}_is_outlier'])
+            outliers = df[f'{column}_is_outlier'].to_numpy()
+            keys = self._outlier_group_keys(df, group_by, time_column)
+            if keys:
+                median = df[column].where(~outliers).groupby(keys, sort=False).transform('median').to_numpy()[outliers]
+            else:
+                median = df[~df[f'{column}_is_outlier']][column].median()
+            df.loc[outliers, column] = median
+            if inplace:
+                df.drop(columns=[f'{column}_is_outlier'], inplace=True)
+            else:
+                df = df.drop(columns=[f'{column}_is_outlier'])
         else:
             raise ValueError(f"Unsupported outlier handling method: {method}")
         
         logger.info(f"Handled outliers in column {column}")
         return df
     
-    def fill_missing_values(self, df: pd.DataFrame, column: str, method: str = 'bayesian') -> pd.DataFrame:
+    def outlier_mask(self, df: pd.DataFrame, columns: list, method: str = 'zscore', group_by: Optional[list] = None, time_column: Optional[str] = None) -> np.ndarray:
+        """计算多列的异常值掩码
+        
+        不分组时基于全部数据计算界限；分组时在一次 groupby 中为每个充电站（及小时）分别计算
+        均值/标准差或四分位数，多充电站数据不会互相影响。
+        
+        Args:
+            df: 输入数据
+            columns: 要检测的列名列表
+            method: 检测方法，支持 'zscore' 或 'iqr'
+            group_by: 分组列，字符串或列表
+            time_column: 时间列，指定时在分组内再按小时分组
+            
+        Returns:
+            形状为 (行数, 列数) 的布尔数组
+        """
+        keys = self._outlier_group_keys(df, group_by, time_column)
+        if keys:
+            values = df[columns].astype(np.float64)
+            grouped = values.groupby(keys, sort=False)
+            if method == 'zscore':
+                z_scores = (values - grouped.transform('mean')) / grouped.transform('std')
+                return (z_scores.abs() > 3).to_numpy()
+            if method == 'iqr':
+                q1 = grouped.transform('quantile', 0.25)
+                q3 = grouped.transform('quantile', 0.75)
+                iqr = q3 - q1
+                return ((values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)).to_numpy()
+            raise ValueError(f"Unsupported outlier detection method: {method}")
+        
+        values = df[columns].to_numpy(dtype=np.float64)
+        if method == 'zscore':
+            # 基于3σ原则检测异常值，与 pandas 一致：忽略缺失值，标准差使用 ddof=1
+            mean = np.nanmean(values, axis=0)
+            std = np.nanstd(values, axis=0, ddof=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.abs((values - mean) / std) > 3
+        if method == 'iqr':
+            # 基于IQR方法检测异常值
+            q1, q3 = np.nanquantile(values, [0.25, 0.75], axis=0)
+            iqr = q3 - q1
+            return (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+        raise ValueError(f"Unsupported outlier detection method: {method}")
+    
+    @staticmethod
+    def _outlier_group_keys(df: pd.DataFrame, group_by: Optional[list], time_column: Optional[str]) -> list:
+        """异常值检测的分组键：分组列加可选的小时"""
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        keys = [df[column] for column in group_by or []]
+        if time_column:
+            keys.append(pd.to_datetime(df[time_column]).dt.hour.rename('hour'))
+        return keys
+    
+    def fill_missing_values(self, df: pd.DataFrame, column: str, method: str = 'bayesian', inplace: bool = False, station_id: Optional[int] = None) -> pd.DataFrame:
         """填补缺失值
         
         Args:
             df: 输入数据
             column: 要填补的列名
             method: 填补方法，支持 'bayesian'、'mean'、'median' 或 'mode'
+            inplace: 是否直接修改输入数据，不复制
+            station_id: 充电站ID，'bayesian' 方法按充电站复用已拟合的插补器
             
         Returns:
             填补后的数据
         """
         logger.info(f"Filling missing values in column {column} using {method} method")
-        df = df.copy()
+        if not inplace:
+            df = df.copy()
         
         missing_count = df[column].isnull().sum()
         logger.info(f"Found {missing_count} missing values in column {column}")
         
         if method == 'bayesian':
             # 贝叶斯插值填补缺失值
-            # 这里使用随机森林作为贝叶斯方法的近似
-            df_without_missing = df.dropna(subset=[column])
-            df_with_missing = df[df[column].isnull()]
-            
-            if len(df_with_missing) == 0:
-                return df
-            
-            # 选择数值型特征作为输入
-            numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
-            if column in numeric_columns:
-                numeric_columns.remove(column)
-            
-            # 如果没有其他数值型特征，使用均值填补
-            if not numeric_columns:
-                df[column] = df[column].fillna(df[column].mean())
-                return df
-            
-            # 训练随机森林模型
-            model = RandomForestRegressor(n_estimators=100, random_state=42)
-            model.fit(df_without_missing[numeric_columns], df_without_missing[column])
-            
-            # 预测缺失值
-            df.loc[df[column].isnull(), column] = model.predict(df_with_missing[numeric_columns])
+            # 这里使用共享的多列随机森林插补器作为贝叶斯方法的近似
+            if pd.api.types.is_numeric_dtype(df[column]):
+                df = self.imputer.impute(df, [column], station_id=station_id, inplace=True)
+            else:
+                df[column] = df[column].fillna(df[column].mode()[0])
         elif method == 'mean':
             df[column] = df[column].fillna(df[column].mean())
         elif method == 'median':
@@ -151,46 +387,47 @@ class DataProcessor:
         logger.info(f"Filled missing values in column {column}")
         return df
     
-    def feature_engineering(self, df: pd.DataFrame, time_column: str) -> pd.DataFrame:
+    def feature_engineering(self, df: pd.DataFrame, time_column: str, inplace: bool = False, holidays: Optional[list] = None) -> pd.DataFrame:
         """特征工程
         
+        时间特征从共享的日历特征表中按小时查表得到（int8/float32），每个唯一小时只计算一次。
+        
         Args:
             df: 输入数据
             time_column: 时间列名
+            inplace: 是否直接修改输入数据，不复制
+            holidays: 节假日日期列表，指定时额外生成 is_holiday 特征
             
         Returns:
             处理后的数据
         """
         logger.info(f"Performing feature engineering on time column {time_column}")
-        df = df.copy()
+        if not inplace:
+            df = df.copy()
         
         # 将时间列转换为datetime类型
         df[time_column] = pd.to_datetime(df[time_column])
         
-        # 提取时间特征
-        df['hour'] = df[time_column].dt.hour
-        df['day_of_week'] = df[time_column].dt.dayofweek
-        df['day_of_month'] = df[time_column].dt.day
-        df['month'] = df[time_column].dt.month
-        df['quarter'] = df[time_column].dt.quarter
-        df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-        
-        # 提取季节性特征
-        df['sin_hour'] = np.sin(2 * np.pi * df['hour'] / 24)
-        df['cos_hour'] = np.cos(2 * np.pi * df['hour'] / 24)
-        df['sin_month'] = np.sin(2 * np.pi * df['month'] / 12)
-        df['cos_month'] = np.cos(2 * np.pi * df['month'] / 12)
-        
-        logger.info(f"Generated {len(df.columns) - len(df.columns.drop(['hour', 'day_of_week', 'day_of_month', 'month', 'quarter', 'is_weekend', 'sin_hour', 'cos_hour', 'sin_month', 'cos_month']))} new features")
+        # 从日历特征表提取时间特征和季节性特征
+        features = get_calendar_table(holidays).lookup(df[time_column])
+        for name, values in features.items():
+            df[name] = values
+        
+        logger.info(f"Generated {len(features)} new features")
         return df
     
-    def feature_selection(self, df: pd.DataFrame, target_column: str, method: str = 'mutual_info') -> pd.DataFrame:
+    def feature_selection(self, df: pd.DataFrame, target_column: str, method: str = 'mutual_info', sample_rows: Optional[int] = None, time_column: Optional[str] = None, n_jobs: Optional[int] = None, station_id: Optional[int] = None, cache: Optional[str] = None) -> pd.DataFrame:
         """特征选择
         
         Args:
             df: 输入数据
             target_column: 目标列名
             method: 选择方法，支持 'mutual_info' 或 'random_forest'
+            sample_rows: 估计特征重要性使用的行数上限，超出时按时间分层抽样
+            time_column: 分层抽样使用的时间列，为空时按行顺序分层
+            n_jobs: 并行使用的CPU核心数，-1 表示全部
+            station_id: 充电站ID，用于缓存选择结果
+            cache: 缓存策略，'columns' 在列集合不变时复用，'fingerprint' 还要求数据指纹不变，为空时不缓存
             
         Returns:
             选择后的特征
@@ -202,16 +439,40 @@ class DataProcessor:
         if target_column in numeric_columns:
             numeric_columns.remove(target_column)
         
-        X = df[numeric_columns]
-        y = df[target_column]
+        cache_entry = None
+        if cache is not None:
+            if cache not in ('columns', 'fingerprint'):
+                raise ValueError(f"Unsupported feature selection cache: {cache}")
+            cache_entry = {
+                'columns': numeric_columns,
+                'fingerprint': compute_data_fingerprint(df[numeric_columns + [target_column]]) if cache == 'fingerprint' else None
+            }
+            cached = self._load_selection(station_id, target_column, method)
+            if cached is not None and cached['columns'] == cache_entry['columns'] and cached['fingerprint'] == cache_entry['fingerprint']:
+                logger.info(f"Reusing cached feature selection for station {station_id} target {target_column}")
+                return df[cached['selected'] + [target_column]]
+        
+        sample = df
+        if sample_rows is not None and len(df) > sample_rows:
+            sample = df.iloc[self._stratified_sample_positions(df, sample_rows, time_column)]
+            logger.info(f"Estimating feature importance on {len(sample)} of {len(df)} rows")
+        X = sample[numeric_columns]
+        y = sample[target_column]
         
         if method == 'mutual_info':
-            # 使用互信息熵进行特征选择
-            mutual_info = mutual_info_regression(X, y)
+            # 使用互信息熵进行特征选择，各特征的互信息相互独立，可以按列并行计算
+            if n_jobs is not None and n_jobs != 1 and len(numeric_columns) > 1:
+                values = X.to_numpy(dtype=np.float64)
+                mutual_info = Parallel(n_jobs=n_jobs)(
+                    delayed(mutual_info_regression)(values[:, [j]], y, random_state=42) for j in range(values.shape[1])
+                )
+                mutual_info = np.concatenate(mutual_info)
+            else:
+                mutual_info = mutual_info_regression(X, y, random_state=42)
             feature_importance = pd.Series(mutual_info, index=X.columns)
         elif method == 'random_forest':
             # 使用随机森林进行特征选择
-            model = RandomForestRegressor(n_estimators=100, random_state=42)
+            model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
             model.fit(X, y)
             feature_importance = pd.Series(model.feature_importances_, index=X.columns)
         else:
@@ -220,62 +481,356 @@ class DataProcessor:
         # 选择重要性大于0的特征
         selected_features = feature_importance[feature_importance > 0].index.tolist()
         logger.info(f"Selected {len(selected_features)} features: {selected_features}")
+        if cache_entry is not None:
+            self._save_selection(station_id, target_column, method, {**cache_entry, 'selected': selected_features})
         
         # 返回选择后的特征和目标列
         return df[selected_features + [target_column]]
     
-    def normalize_data(self, df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    @staticmethod
+    def _stratified_sample_positions(df: pd.DataFrame, sample_rows: int, time_column: Optional[str] = None, seed: int = 42) -> np.ndarray:
+        """按时间分层抽样：把按时间排序的行等分为 sample_rows 层，每层随机取一行"""
+        n = len(df)
+        if time_column and time_column in df.columns:
+            order = np.argsort(pd.to_datetime(df[time_column]).to_numpy(), kind='stable')
+        else:
+            order = np.arange(n)
+        edges = np.linspace(0, n, sample_rows + 1).astype(np.int64)
+        rng = np.random.default_rng(seed)
+        picks = edges[:-1] + (rng.random(sample_rows) * (edges[1:] - edges[:-1])).astype(np.int64)
+        return np.sort(order[picks])
+    
+    def _selection_path(self, station_id: int) -> str:
+        return os.path.join(settings.FEATURE_SELECTION_STORE_DIR, f'station_{station_id}.json')
+    
+    def _load_selection(self, station_id: Optional[int], target_column: str, method: str) -> Optional[dict]:
+        """读取缓存的特征选择结果，充电站ID为空时只在内存中缓存"""
+        key = f'{target_column}|{method}'
+        entries = self.selection_cache.get(station_id)
+        if entries is None and station_id is not None and os.path.exists(self._selection_path(station_id)):
+            with open(self._selection_path(station_id), 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            self.selection_cache[station_id] = entries
+        return (entries or {}).get(key)
+    
+    def _save_selection(self, station_id: Optional[int], target_column: str, method: str, entry: dict) -> None:
+        entries = self.selection_cache.setdefault(station_id, {})
+        entries[f'{target_column}|{method}'] = entry
+        if station_id is None:
+            return
+        path = self._selection_path(station_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+    
+    def normalize_data(self, df: pd.DataFrame, columns: list, inplace: bool = False, station_id: Optional[int] = None, mode: str = 'fit', chunk_rows: Optional[int] = None) -> pd.DataFrame:
         """数据标准化
         
+        标准化器按 (充电站, 列集合) 保存在 self.scaler_store 中，可供之后反标准化LSTM输出。
+        
         Args:
             df: 输入数据
             columns: 要标准化的列名列表
+            inplace: 是否直接修改输入数据，不复制
+            station_id: 充电站ID，为空时标准化器只保存在内存中
+            mode: 'fit' 重新拟合，'partial_fit' 用本批数据增量更新，'transform' 只用已有标准化器转换
+            chunk_rows: 指定时按块拟合和转换，避免生成整列的 float64 临时数组
             
         Returns:
             标准化后的数据
         """
-        logger.info(f"Normalizing columns: {columns}")
-        df = df.copy()
+        logger.info(f"Normalizing columns: {columns} (mode={mode})")
+        if not inplace:
+            df = df.copy()
+        
+        if mode not in ('fit', 'partial_fit', 'transform'):
+            raise ValueError(f"Unsupported normalize mode: {mode}")
+        # 转换结果保持输入的浮点精度，float32 列不会被放大为 float64
+        dtype = np.result_type(np.float32, *df[columns].dtypes)
+        # 转换使用本次拟合返回的标准化器对象，而不是按键重新查找：
+        # 同一键上的并发请求可能在拟合和转换之间替换已发布的标准化器
+        if mode == 'fit':
+            scaler = self.scaler_store.fit(station_id, columns, df, chunk_rows=chunk_rows)
+        elif mode == 'partial_fit':
+            scaler = self.scaler_store.partial_fit(station_id, columns, df, chunk_rows=chunk_rows)
+        else:
+            scaler = self.scaler_store.require(station_id, columns)
         
-        # 训练标准化器并转换数据
-        df[columns] = self.scaler.fit_transform(df[columns])
+        if chunk_rows is None or len(df) <= chunk_rows:
+            df[columns] = scaler.transform(df[columns]).astype(dtype, copy=False)
+        else:
+            # 分块转换写回
+            df[columns] = df[columns].astype(dtype)
+            positions = [df.columns.get_loc(c) for c in columns]
+            for start in range(0, len(df), chunk_rows):
+                chunk = df.iloc[start:start + chunk_rows][columns]
+                df.iloc[start:start + chunk_rows, positions] = scaler.transform(chunk).astype(dtype, copy=False)
         logger.info(f"Normalized {len(columns)} columns")
         return df
     
-    def preprocess_data(self, df: pd.DataFrame, config: dict) -> pd.DataFrame:
-        """完整的数据预处理流程
+    def inverse_normalize(self, values: np.ndarray, columns: list, station_id: Optional[int] = None, column: Optional[str] = None) -> np.ndarray:
+        """用已保存的标准化器反标准化
+        
+        Args:
+            values: 标准化后的值
+            columns: 标准化时的列名列表
+            station_id: 充电站ID
+            column: 指定时 values 只包含这一列，例如LSTM预测的目标列
+            
+        Returns:
+            原始尺度的值
+        """
+        return self.scaler_store.inverse_transform(station_id, columns, values, column=column)
+    
+    def detect_and_handle_outliers(self, df: pd.DataFrame, columns: list, detection_method: str = 'zscore', handling_method: str = 'remove', inplace: bool = False, group_by: Optional[list] = None, time_column: Optional[str] = None) -> pd.DataFrame:
+        """一次向量化计算多列的异常值并统一处理
+        
+        所有列的异常值界限都基于输入数据同时计算，而不是像逐列处理那样在前一列删除行之后再计算；
+        删除时按所有列异常标记的并集一次完成，替换时直接写回原列，不生成 *_is_outlier 临时列。
         
         Args:
             df: 输入数据
+            columns: 要检测的列名列表
+            detection_method: 检测方法，支持 'zscore' 或 'iqr'
+            handling_method: 处理方法，支持 'remove' 或 'replace'
+            inplace: 是否直接修改输入数据（'remove' 总会生成删除行后的新数据）
+            group_by: 分组列，按组分别计算界限，'replace' 时用各组中位数替换
+            time_column: 时间列，指定时在分组内再按小时分组
+            
+        Returns:
+            处理后的数据
+        """
+        logger.info(f"Detecting and handling outliers in columns {columns} using {detection_method}/{handling_method}")
+        if not columns:
+            return df
+        
+        outliers = self.outlier_mask(df, columns, detection_method, group_by, time_column)
+        
+        logger.info(f"Detected outliers per column: {dict(zip(columns, outliers.sum(axis=0).tolist()))}")
+        
+        if handling_method == 'remove':
+            df = df[~outliers.any(axis=1)]
+        elif handling_method == 'replace':
+            if not inplace:
+                df = df.copy()
+            keys = self._outlier_group_keys(df, group_by, time_column)
+            if keys:
+                medians = df[columns].where(~outliers).groupby(keys, sort=False).transform('median').to_numpy()
+            else:
+                values = df[columns].to_numpy(dtype=np.float64)
+                medians = np.broadcast_to(np.nanmedian(np.where(outliers, np.nan, values), axis=0), outliers.shape)
+            for j, column in enumerate(columns):
+                if outliers[:, j].any():
+                    df.loc[outliers[:, j], column] = medians[outliers[:, j], j]
+        else:
+            raise ValueError(f"Unsupported outlier handling method: {handling_method}")
+        
+        return df
+    
+    def plan_preprocessing(self, config: dict) -> list:
+        """根据预处理配置规划要执行的阶段
+        
+        Args:
             config: 预处理配置
             
         Returns:
-            预处理后的数据
+            (阶段名, 阶段参数) 列表
         """
-        logger.info("Starting data preprocessing pipeline")
+        stages = []
+        if config.get('handle_outliers', False) and config.get('outlier_columns'):
+            stages.append(('outliers', {
+                'columns': list(config.get('outlier_columns')),
+                'detection_method': config.get('outlier_detection_method', 'zscore'),
+                'handling_method': config.get('outlier_handling_method', 'remove'),
+                'group_by': config.get('outlier_group_by'),
+                'time_column': config.get('time_column') if config.get('outlier_by_hour', False) else None
+            }))
+        stages.append(('missing_values', {
+            'method': config.get('missing_value_method', 'bayesian'),
+            'station_id': config.get('station_id')
+        }))
+        if config.get('feature_engineering', False) and config.get('time_column'):
+            stages.append(('feature_engineering', {
+                'time_column': config.get('time_column'),
+                'holidays': config.get('holidays')
+            }))
+        if config.get('feature_selection', False) and config.get('target_column'):
+            stages.append(('feature_selection', {
+                'target_column': config.get('target_column'),
+                'method': config.get('feature_selection_method', 'mutual_info'),
+                'sample_rows': config.get('feature_selection_sample_rows'),
+                'time_column': config.get('time_column'),
+                'n_jobs': config.get('feature_selection_n_jobs'),
+                'station_id': config.get('station_id'),
+                'cache': config.get('feature_selection_cache')
+            }))
+        if config.get('normalize', False) and config.get('normalize_columns'):
+            stages.append(('normalize', {
+                'columns': list(config.get('normalize_columns')),
+                'station_id': config.get('station_id'),
+                'mode': config.get('normalize_mode', 'fit')
+            }))
+        return stages
+    
+    @staticmethod
+    def is_stateful_stage(stage: str, params: dict) -> bool:
+        """阶段的输出或副作用是否依赖处理器状态，这类阶段不能用缓存输出代替执行
         
-        # 1. 异常值检测和处理
-        if config.get('handle_outliers', False):
-            for column in config.get('outlier_columns', []):
-                df = self.detect_outliers(df, column, config.get('outlier_detection_method', 'zscore'))
-                df = self.handle_outliers(df, column, config.get('outlier_handling_method', 'remove'))
+        标准化会拟合、增量更新或读取已保存的标准化器；贝叶斯插补使用共享的插补器；
+        按列集合复用的特征选择读取已保存的选择结果。这些阶段的输出不只由输入数据和参数决定。
         
-        # 2. 缺失值填补
-        for column in df.columns:
-            if df[column].isnull().sum() > 0:
-                df = self.fill_missing_values(df, column, config.get('missing_value_method', 'bayesian'))
+        Args:
+            stage: 阶段名
+            params: 阶段参数
+            
+        Returns:
+            是否为有状态阶段
+        """
+        if stage == 'normalize':
+            return True
+        if stage == 'missing_values':
+            return params.get('method') == 'bayesian'
+        if stage == 'feature_selection':
+            return params.get('cache') == 'columns'
+        return False
+    
+    def run_stage(self, df: pd.DataFrame, stage: str, params: dict, fused: bool = False, chunk_rows: Optional[int] = None) -> pd.DataFrame:
+        """执行单个预处理阶段
         
-        # 3. 特征工程
-        if config.get('feature_engineering', False) and config.get('time_column'):
-            df = self.feature_engineering(df, config.get('time_column'))
+        Args:
+            df: 输入数据
+            stage: 阶段名
+            params: 阶段参数
+            fused: 是否使用融合模式（原地修改、多列一次处理）
+            chunk_rows: 支持分块的阶段每块处理的行数，为空时整体处理
+            
+        Returns:
+            处理后的数据
+        """
+        if stage == 'outliers':
+            if fused:
+                return self.detect_and_handle_outliers(df, params['columns'], params['detection_method'], params['handling_method'], inplace=True, group_by=params.get('group_by'), time_column=params.get('time_column'))
+            for column in params['columns']:
+                df = self.detect_outliers(df, column, params['detection_method'], group_by=params.get('group_by'), time_column=params.get('time_column'))
+                df = self.handle_outliers(df, column, params['handling_method'], group_by=params.get('group_by'), time_column=params.get('time_column'))
+            return df
+        if stage == 'missing_values':
+            missing_columns = df.columns[df.isnull().any()].tolist()
+            if fused and params['method'] in ('mean', 'median', 'mode') and missing_columns:
+                if params['method'] == 'mean':
+                    fill_values = df[missing_columns].mean(numeric_only=True)
+                elif params['method'] == 'median':
+                    fill_values = df[missing_columns].median(numeric_only=True)
+                else:
+                    fill_values = df[missing_columns].mode().iloc[0]
+                df.fillna(fill_values.to_dict(), inplace=True)
+                logger.info(f"Filled missing values in columns {missing_columns} using {params['method']} method")
+                return df
+            if params['method'] == 'bayesian' and missing_columns:
+                # 所有数值缺失列一次插补，共享同一个插补器
+                if not fused:
+                    df = df.copy()
+                numeric_missing = [c for c in missing_columns if pd.api.types.is_numeric_dtype(df[c])]
+                df = self.imputer.impute(df, numeric_missing, station_id=params.get('station_id'), inplace=True)
+                missing_columns = [c for c in missing_columns if c not in numeric_missing]
+            for column in missing_columns:
+                df = self.fill_missing_values(df, column, params['method'], inplace=fused, station_id=params.get('station_id'))
+            return df
+        if stage == 'feature_engineering':
+            return self.feature_engineering(df, params['time_column'], inplace=fused, holidays=params.get('holidays'))
+        if stage == 'feature_selection':
+            return self.feature_selection(
+                df,
+                params['target_column'],
+                params['method'],
+                sample_rows=params.get('sample_rows'),
+                time_column=params.get('time_column'),
+                n_jobs=params.get('n_jobs'),
+                station_id=params.get('station_id'),
+                cache=params.get('cache')
+            )
+        if stage == 'normalize':
+            return self.normalize_data(df, params['columns'], inplace=fused, station_id=params.get('station_id'), mode=params.get('mode', 'fit'), chunk_rows=chunk_rows)
+        raise ValueError(f"Unsupported preprocessing stage: {stage}")
+    
+    def preprocess_data(self, df: pd.DataFrame, config: dict) -> pd.DataFrame:
+        """完整的数据预处理流程
         
-        # 4. 特征选择
-        if config.get('feature_selection', False) and config.get('target_column'):
-            df = self.feature_selection(df, config.get('target_column'), config.get('feature_selection_method', 'mutual_info'))
+        config['fused'] 为 True 时使用融合模式：预先规划各阶段，只在开始时复制一次输入
+        （config['inplace'] 为 True 时连这一次也省去，直接修改输入），之后各阶段原地修改，
+        异常值对所有配置列一次向量化检测并统一删除/替换，峰值内存接近输入的1~2倍。
+        各阶段耗时记录在 self.stage_timings 中。
         
-        # 5. 数据标准化
-        if config.get('normalize', False) and config.get('normalize_columns'):
-            df = self.normalize_data(df, config.get('normalize_columns'))
+        config['stage_cache'] 为 True 时，各阶段输出按 (输入数据指纹, 阶段名, 阶段参数) 缓存到
+        self.stage_cache，重跑时从最后一个参数未变化的阶段的缓存输出继续。只缓存第一个有状态阶段之前的阶段
+        （见 is_stateful_stage），有状态阶段及其后的阶段每次都重新执行，保证标准化器、插补器照常拟合和更新。
         
+        config['compact'] 为 True 时先把数据转换为紧凑类型（测量值 float32、小整数），后续阶段保持该精度；
+        数据超过内存预算（config['memory_budget_mb']，默认 MEMORY_BUDGET_MB）的一半时，标准化按块进行。
+        各阶段结束时的内存占用记录在 self.memory_report 中。
+        
+        Args:
+            df: 输入数据
+            config: 预处理配置
+            
+        Returns:
+            预处理后的数据
+        """
+        fused = config.get('fused', False)
+        compact = config.get('compact', False)
+        stages = self.plan_preprocessing(config)
+        logger.info(f"Starting data preprocessing pipeline (fused={fused}) with stages {[name for name, _ in stages]}")
+        
+        self.stage_timings = {}
+        self.memory_report = MemoryReport()
+        self.memory_report.record('input', df)
+        keys = []
+        start_index = 0
+        if config.get('stage_cache', False):
+            # 链式计算每个阶段的缓存键，从最后一个已缓存的阶段继续
+            start = time.perf_counter()
+            key = compute_data_fingerprint(df, {'compact': compact})
+            for stage, params in stages:
+                if self.is_stateful_stage(stage, params):
+                    break
+                key = self.stage_cache.stage_key(key, stage, {**params, 'fused': fused})
+                keys.append(key)
+            for i in range(len(keys) - 1, -1, -1):
+                if self.stage_cache.contains(keys[i]):
+                    cached = self.stage_cache.get(keys[i])
+                    if cached is not None:
+                        df = cached
+                        start_index = i + 1
+                        break
+            else:
+                self.stage_cache.record_miss()
+            self.stage_timings['stage_cache'] = time.perf_counter() - start
+            logger.info(f"Stage cache: resuming after {start_index} cached stages (stats={self.stage_cache.stats})")
+        
+        if fused and start_index == 0 and not config.get('inplace', False):
+            df = df.copy()
+        if compact and start_index == 0:
+            df = self.compact_dtypes(df, inplace=fused)
+            self.memory_report.record('compact', df)
+        
+        chunk_rows = None
+        budget_mb = config.get('memory_budget_mb', self.memory_budget_mb)
+        frame_mb = frame_memory_mb(df)
+        if budget_mb and frame_mb * 2 > budget_mb:
+            # 每块约占预算的1/8
+            chunk_rows = max(1000, int(len(df) * budget_mb / 8 / frame_mb))
+            logger.info(f"Frame of {frame_mb:.1f} MB exceeds half of the {budget_mb} MB memory budget, processing in chunks of {chunk_rows} rows")
+        
+        for i, (stage, params) in enumerate(stages[start_index:], start=start_index):
+            start = time.perf_counter()
+            df = self.run_stage(df, stage, params, fused=fused, chunk_rows=chunk_rows)
+            self.stage_timings[stage] = time.perf_counter() - start
+            self.memory_report.record(stage, df)
+            if i < len(keys):
+                self.stage_cache.put(keys[i], df, stage=stage)
+        
+        logger.info(f"Stage timings: {', '.join(f'{name}={seconds:.3f}s' for name, seconds in self.stage_timings.items())}")
+        logger.info(f"Stage memory: {self.memory_report.summary()}")
         logger.info(f"Data preprocessing completed. Final shape: {df.shape}")
         return df
@@ -0,0 +1,141 @@
+# 价格弹性统计量存储服务
+from contextlib import nullcontext
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Engine, delete, select
+
+from app.core.bulk_ops import build_upsert, execute_batches
+from app.core.database import engine as default_engine
+from app.models.mysql import ElasticityStats, HistoricalData
+from app.services.data_loader import HistoricalDataLoader
+from app.services.pricing import PricingService
+import logging
+
+logger = logging.getLogger(__name__)
+
+STAT_COLUMNS = ['n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx']
+# 统计量对应的 historical_data 列
+PRICE_COLUMN = 'electricity_price'
+DEMAND_COLUMN = 'charging_amount'
+
+
+class ElasticityStatsStore:
+    """按 (充电站, 小时) 持久化的价格弹性充分统计量
+
+    数据导入时只把新插入行的统计量累加到 elasticity_stats，被覆盖的已有行先减去旧值再加上新值，
+    重复导入相同的数据不会重复计数。定价时直接由统计量计算弹性系数，不再扫描全部历史数据。
+    首次建表或数据被其他途径修改后用 rebuild 从 historical_data 重算。
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine if engine is not None else default_engine
+
+    def add(self, stats: pd.DataFrame, bind=None) -> int:
+        """把统计量增量累加到已保存的统计量上
+
+        Args:
+            stats: 以 (station_id, hour) 为索引、包含 STAT_COLUMNS 的统计量，可以为负（撤销旧行）
+            bind: 数据库连接，传入时在调用方的事务中写入
+
+        Returns:
+            更新的分组数
+        """
+        stats = stats[(stats[STAT_COLUMNS] != 0).any(axis=1)]
+        if stats.empty:
+            return 0
+        rows = [
+            {'station_id': int(station_id), 'hour': int(hour), **{c: float(getattr(row, c)) for c in STAT_COLUMNS}}
+            for (station_id, hour), row in zip(stats.index, stats.itertuples(index=False))
+        ]
+        table = ElasticityStats.__table__
+        context = self.engine.begin() if bind is None else nullcontext(bind)
+        with context as connection:
+            stmt = build_upsert(table, connection.dialect.name, ['station_id', 'hour'], STAT_COLUMNS,
+                                update_values=lambda new: {c: table.c[c] + new[c] for c in STAT_COLUMNS})
+            execute_batches(connection, stmt, rows)
+        return len(rows)
+
+    def apply_changes(self, new_rows: pd.DataFrame, old_rows: Optional[pd.DataFrame] = None, bind=None) -> int:
+        """按写入前后的 historical_data 行更新统计量
+
+        Args:
+            new_rows: 写入的行，包含 station_id、time_slot、charging_amount、electricity_price
+            old_rows: 被覆盖的已有行（写入前的值），为空时视为全部是新插入的行
+            bind: 数据库连接
+
+        Returns:
+            更新的分组数
+        """
+        stats = _grouped_stats(new_rows)
+        if old_rows is not None and not old_rows.empty:
+            stats = stats.sub(_grouped_stats(old_rows), fill_value=0)
+        return self.add(stats, bind)
+
+    def load(self, station_id: Optional[int] = None, bind=None) -> pd.DataFrame:
+        """读取已保存的统计量
+
+        Args:
+            station_id: 充电站ID，为空时读取全部充电站
+            bind: 数据库引擎或连接
+
+        Returns:
+            以 (station_id, hour) 为索引的统计量
+        """
+        query = select(ElasticityStats.station_id, ElasticityStats.hour, *[getattr(ElasticityStats, c) for c in STAT_COLUMNS])
+        if station_id is not None:
+            query = query.where(ElasticityStats.station_id == station_id)
+        bind = bind if bind is not None else self.engine
+        with (bind.connect() if isinstance(bind, Engine) else nullcontext(bind)) as connection:
+            stats = pd.DataFrame(connection.execute(query).all(), columns=['station_id', 'hour'] + STAT_COLUMNS)
+        return stats.set_index(['station_id', 'hour'])
+
+    def get_elasticity(self, station_id: int, hour: Optional[int] = None) -> Optional[float]:
+        """由已保存的统计量计算弹性系数
+
+        Args:
+            station_id: 充电站ID
+            hour: 时段（小时），为空时合并全部时段
+
+        Returns:
+            价格弹性系数，没有统计量或样本不足以回归时返回None
+        """
+        stats = self.load(station_id)
+        if hour is not None:
+            stats = stats[stats.index.get_level_values('hour') == hour]
+        if stats.empty:
+            return None
+        elasticity = float(PricingService._elasticity_from_stats(stats.sum().to_frame().T, np.nan).iloc[0])
+        return None if np.isnan(elasticity) else elasticity
+
+    def rebuild(self, station_ids: Optional[list] = None) -> int:
+        """从 historical_data 重算统计量
+
+        Args:
+            station_ids: 充电站ID列表，默认为有历史数据的全部充电站
+
+        Returns:
+            重算的充电站数
+        """
+        if station_ids is None:
+            with self.engine.connect() as connection:
+                station_ids = connection.execute(select(HistoricalData.station_id).distinct()).scalars().all()
+        loader = HistoricalDataLoader(self.engine)
+        for station_id in station_ids:
+            stats = None
+            for chunk in loader.iter_chunks(station_id, columns=[DEMAND_COLUMN, PRICE_COLUMN]):
+                chunk_stats = _grouped_stats(chunk.assign(station_id=station_id))
+                stats = chunk_stats if stats is None else stats.add(chunk_stats, fill_value=0)
+            with self.engine.begin() as connection:
+                connection.execute(delete(ElasticityStats).where(ElasticityStats.station_id == station_id))
+                if stats is not None:
+                    self.add(stats, bind=connection)
+        logger.info(f"Rebuilt elasticity statistics for {len(station_ids)} stations")
+        return len(station_ids)
+
+
+def _grouped_stats(rows: pd.DataFrame) -> pd.DataFrame:
+    """historical_data 行按 (station_id, hour) 分组的充分统计量"""
+    return PricingService()._grouped_elasticity_stats(rows, PRICE_COLUMN, DEMAND_COLUMN, 'time_slot', 'station_id')
+
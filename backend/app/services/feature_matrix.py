@@ -0,0 +1,242 @@
+# 特征矩阵构建服务
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Engine, and_, func, select
+
+from app.core.config import settings
+from app.core.database import engine as default_engine
+from app.models.mysql import HistoricalData, VariableData
+from app.services.calendar_features import NS_PER_HOUR
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 特征矩阵的列：历史数据在前，变量数据在后
+HISTORICAL_COLUMNS = ['charging_amount', 'electricity_price', 'charging_duration']
+VARIABLE_COLUMNS = ['temperature', 'humidity', 'traffic_flow', 'competitor_price', 'user_behavior_score']
+FEATURE_COLUMNS = HISTORICAL_COLUMNS + VARIABLE_COLUMNS
+
+
+class FeatureMatrixBuilder:
+    """构建按小时对齐的充电站特征矩阵
+
+    historical_data 与 variable_data 在数据库中按 (station_id, time_slot) 左连接，结果以流式游标逐块读取，
+    按小时偏移量直接写入预先分配的数组（每列一段连续内存），不在 pandas 中合并两张表。
+    网格上缺失的小时：历史数据列按相邻小时线性插值，变量数据列沿用上一个小时的值。
+
+    每个充电站缓存一段未填充的原始数组，请求范围被缓存覆盖时直接切片；范围向前或向后延长时只查询新增的小时。
+    数据写入后需调用 invalidate，可用 forecast_cache.register_invalidation 在写入时自动失效；
+    其他进程（如命令行导入）的写入无法触发失效，缓存条目在首次查询 ttl_seconds 秒后过期并整体重新查询，
+    范围延长不会推迟过期时间，补录到已缓存小时的数据最多延迟一个 TTL 被读到。
+    """
+
+    def __init__(self, bind=None, chunk_rows: int = 50000, compact: bool = False, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None, clock: Callable = time.monotonic):
+        self.bind = bind if bind is not None else default_engine
+        self.chunk_rows = chunk_rows
+        self.dtype = np.float32 if compact else np.float64
+        self.max_entries = max_entries if max_entries is not None else settings.FEATURE_MATRIX_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.FEATURE_MATRIX_CACHE_TTL_SECONDS
+        self.clock = clock
+        self.stats = {'hits': 0, 'extensions': 0, 'misses': 0, 'expired': 0, 'hours_fetched': 0}
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def build(self, station_id: int, start=None, end=None, bind=None) -> pd.DataFrame:
+        """构建充电站在 [start, end) 范围内的逐小时特征矩阵
+
+        Args:
+            station_id: 充电站ID
+            start: 起始时间，为空时从该充电站最早的历史数据开始
+            end: 结束时间（不包含），为空时到最新的历史数据为止
+            bind: 本次查询使用的数据库连接，默认使用构建器的引擎
+
+        Returns:
+            包含 time_slot 和 FEATURE_COLUMNS 的数据，每小时一行
+        """
+        bind = bind if bind is not None else self.bind
+        if start is None or end is None:
+            first, last = self._time_bounds(bind, station_id)
+            if first is None:
+                return self._to_frame(0, np.empty((len(FEATURE_COLUMNS), 0), dtype=self.dtype))
+            start = first if start is None else start
+            end = last + pd.Timedelta(hours=1) if end is None else end
+        start_hour = self._to_nanoseconds(start) // NS_PER_HOUR
+        end_hour = -(-self._to_nanoseconds(end) // NS_PER_HOUR)
+        if end_hour <= start_hour:
+            raise ValueError(f"Empty feature matrix range: {start} - {end}")
+
+        raw = self._raw_values(bind, station_id, start_hour, end_hour)
+        return self._to_frame(start_hour, self._fill(raw))
+
+    def invalidate(self, station_id: Optional[int] = None) -> None:
+        """删除充电站的缓存，station_id 为空时清空全部缓存"""
+        with self._lock:
+            if station_id is None:
+                self._entries.clear()
+                self._generations[None] = self._generations.get(None, 0) + 1
+            else:
+                self._entries.pop(station_id, None)
+                self._generations[station_id] = self._generations.get(station_id, 0) + 1
+
+    def _raw_values(self, bind, station_id: int, start_hour: int, end_hour: int) -> np.ndarray:
+        """读取未填充的原始数组，优先使用缓存，只查询缓存未覆盖的小时"""
+        with self._lock:
+            entry = self._entries.get(station_id)
+            if entry is not None and entry[0] <= self.clock():
+                # 已过期：丢弃整段缓存，重新查询可能被其他进程补录或修改的小时
+                del self._entries[station_id]
+                self.stats['expired'] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(station_id)
+            generation = self._generation(station_id)
+        if entry is not None:
+            expires_at, cached_start, cached = entry
+            cached_end = cached_start + cached.shape[1]
+            if cached_start <= start_hour and end_hour <= cached_end:
+                self.stats['hits'] += 1
+                return cached[:, start_hour - cached_start:end_hour - cached_start]
+            if start_hour <= cached_end and cached_start <= end_hour:
+                # 与缓存相交或相邻：只查询两端新增的小时
+                self.stats['extensions'] += 1
+                parts = []
+                if start_hour < cached_start:
+                    parts.append(self._fetch(bind, station_id, start_hour, cached_start))
+                parts.append(cached)
+                if end_hour > cached_end:
+                    parts.append(self._fetch(bind, station_id, cached_end, end_hour))
+                merged_start = min(start_hour, cached_start)
+                merged = np.concatenate(parts, axis=1) if len(parts) > 1 else cached
+                self._store(station_id, merged_start, merged, generation, expires_at)
+                return merged[:, start_hour - merged_start:end_hour - merged_start]
+
+        self.stats['misses'] += 1
+        values = self._fetch(bind, station_id, start_hour, end_hour)
+        self._store(station_id, start_hour, values, generation)
+        return values
+
+    def _store(self, station_id: int, start_hour: int, values: np.ndarray, generation: tuple, expires_at: Optional[float] = None) -> None:
+        # 缓存的数组不再修改，切片和填充都基于副本
+        values.setflags(write=False)
+        if expires_at is None:
+            expires_at = self.clock() + self.ttl_seconds
+        with self._lock:
+            if self._generation(station_id) != generation:
+                # 查询期间有新数据写入，结果只用于本次请求
+                return
+            self._entries[station_id] = (expires_at, start_hour, values)
+            self._entries.move_to_end(station_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _generation(self, station_id: int) -> tuple:
+        return self._generations.get(None, 0), self._generations.get(station_id, 0)
+
+    def _fetch(self, bind, station_id: int, start_hour: int, end_hour: int) -> np.ndarray:
+        """在数据库中连接两张表，把 [start_hour, end_hour) 的结果写入按小时分配的数组"""
+        query = (
+            select(
+                HistoricalData.time_slot,
+                *[getattr(HistoricalData, c) for c in HISTORICAL_COLUMNS],
+                *[getattr(VariableData, c) for c in VARIABLE_COLUMNS]
+            )
+            .select_from(HistoricalData)
+            .outerjoin(VariableData, and_(
+                VariableData.station_id == HistoricalData.station_id,
+                VariableData.time_slot == HistoricalData.time_slot
+            ))
+            .where(
+                HistoricalData.station_id == station_id,
+                HistoricalData.time_slot >= self._to_datetime(start_hour),
+                HistoricalData.time_slot < self._to_datetime(end_hour)
+            )
+            .order_by(HistoricalData.time_slot)
+        )
+        values = np.full((len(FEATURE_COLUMNS), end_hour - start_hour), np.nan, dtype=self.dtype)
+        rows_read = 0
+        with self._connect(bind) as connection:
+            result = connection.execute(query, execution_options={'stream_results': True, 'max_row_buffer': self.chunk_rows})
+            for rows in result.partitions(self.chunk_rows):
+                fields = list(zip(*rows))
+                time_slot = pd.DatetimeIndex(fields[0])
+                if time_slot.tz is not None:
+                    time_slot = time_slot.tz_localize(None)
+                offsets = time_slot.as_unit('ns').asi8 // NS_PER_HOUR - start_hour
+                for j, column_values in enumerate(fields[1:]):
+                    # None（空值）转换为 NaN
+                    values[j, offsets] = np.array(column_values, dtype=self.dtype)
+                rows_read += len(rows)
+        self.stats['hours_fetched'] += end_hour - start_hour
+        logger.info(f"Fetched {rows_read} rows for {end_hour - start_hour} hours of station {station_id}")
+        return values
+
+    def _time_bounds(self, bind, station_id: int) -> tuple:
+        """充电站历史数据的最早和最晚时间"""
+        query = select(func.min(HistoricalData.time_slot), func.max(HistoricalData.time_slot)).where(HistoricalData.station_id == station_id)
+        with self._connect(bind) as connection:
+            return tuple(connection.execute(query).one())
+
+    def _fill(self, raw: np.ndarray) -> np.ndarray:
+        """填充网格上缺失的小时"""
+        values = np.array(raw, dtype=self.dtype)
+        positions = np.arange(values.shape[1])
+        for j, column in enumerate(FEATURE_COLUMNS):
+            row = values[j]
+            valid = ~np.isnan(row)
+            if valid.all():
+                continue
+            if not valid.any():
+                row[:] = 0
+            elif column in HISTORICAL_COLUMNS:
+                # 两端之外沿用最近的观测值
+                row[:] = np.interp(positions, positions[valid], row[valid])
+            else:
+                last = np.maximum.accumulate(np.where(valid, positions, -1))
+                first = positions[valid][0]
+                row[:] = row[np.maximum(last, first)]
+        return values
+
+    def _to_frame(self, start_hour: int, values: np.ndarray) -> pd.DataFrame:
+        df = pd.DataFrame(values.T, columns=FEATURE_COLUMNS, copy=False)
+        time_slot = (np.arange(start_hour, start_hour + values.shape[1], dtype=np.int64) * NS_PER_HOUR).astype('datetime64[ns]')
+        df.insert(0, 'time_slot', time_slot)
+        return df
+
+    def _connect(self, bind):
+        # 传入连接时复用该连接（及其事务），不关闭
+        if isinstance(bind, Engine):
+            return bind.connect()
+        return nullcontext(bind)
+
+    @staticmethod
+    def _to_nanoseconds(value) -> int:
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_localize(None)
+        return int(timestamp.as_unit('ns').value)
+
+    @staticmethod
+    def _to_datetime(hour: int):
+        return pd.Timestamp(hour * NS_PER_HOUR).to_pydatetime()
+
+
+_shared_builder = None
+_shared_builder_lock = threading.Lock()
+
+
+def get_feature_matrix_builder() -> FeatureMatrixBuilder:
+    """获取进程内共享的特征矩阵构建器，首次调用时在应用的数据库引擎上注册写入失效"""
+    global _shared_builder
+    with _shared_builder_lock:
+        if _shared_builder is None:
+            from app.services.forecast_cache import register_invalidation
+            _shared_builder = FeatureMatrixBuilder()
+            register_invalidation(_shared_builder)
+        return _shared_builder
@@ -0,0 +1,287 @@
+# 批量预测服务
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.mysql import ModelConfig, Station
+from app.services.feature_matrix import get_feature_matrix_builder
+from app.services.predict_store import PredictResultWriter
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def configure_worker_threads(tf_threads: int) -> None:
+    """限制工作进程内的TensorFlow/BLAS线程数并预加载预测后端
+
+    必须在工作进程首次导入 TensorFlow 之前调用，否则线程池已创建，设置不再生效。
+
+    Args:
+        tf_threads: 每个工作进程的线程数
+    """
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS'):
+        os.environ[name] = str(tf_threads)
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(tf_threads)
+
+    # 预测工作进程显式预加载TensorFlow和Prophet
+    from app.services.prediction import preload_backends
+    preload_backends()
+
+
+def build_station_frame(session, station_id: int) -> pd.DataFrame:
+    """从 historical_data 和 variable_data 构建充电站的预测数据
+
+    两张表在数据库中对齐，结果按小时网格填充，并缓存在进程内共享的特征矩阵构建器中，
+    同一充电站的后续预测只查询新增的小时。
+
+    Args:
+        session: 数据库会话
+        station_id: 充电站ID
+
+    Returns:
+        按 time_slot 排序、逐小时对齐后的数据
+    """
+    return get_feature_matrix_builder().build(station_id, bind=session.connection())
+
+
+def get_station_model_config(session, station_id: int) -> ModelConfig:
+    """获取充电站的模型配置，优先使用默认配置
+
+    Args:
+        session: 数据库会话
+        station_id: 充电站ID
+
+    Returns:
+        模型配置
+    """
+    model_config = session.execute(
+        select(ModelConfig)
+        .where(ModelConfig.station_id == station_id)
+        .order_by(ModelConfig.is_default.desc(), ModelConfig.id)
+    ).scalars().first()
+    if model_config is None:
+        raise ValueError(f"No model config for station {station_id}")
+    return model_config
+
+
+def forecast_station(station_id: int, config: dict, callbacks: Optional[list] = None, with_metrics: bool = False):
+    """在工作进程中完成单个充电站的训练、预测和定价
+
+    Args:
+        station_id: 充电站ID
+        config: 批量预测配置
+        callbacks: 训练LSTM时的Keras回调
+        with_metrics: 是否同时返回预测指标
+
+    Returns:
+        待写入 predict_result 的记录列表；with_metrics 为 True 时返回 (记录列表, 预测指标)
+    """
+    from app.services.elasticity_store import ElasticityStatsStore
+    from app.services.prediction import PredictionService
+    from app.services.pricing import PricingService
+
+    session = SessionLocal()
+    try:
+        station = session.get(Station, station_id)
+        if station is None:
+            raise ValueError(f"Station {station_id} not found")
+
+        model_config = get_station_model_config(session, station_id)
+        df = build_station_frame(session, station_id)
+    finally:
+        session.close()
+
+    if df.empty:
+        raise ValueError(f"No historical data for station {station_id}")
+
+    horizon = config.get('future_periods', 24)
+    prediction_config = {
+        'station_id': station_id,
+        'model_config_id': model_config.id,
+        'lstm_hidden_layers': model_config.lstm_hidden_layers,
+        'monte_carlo_times': model_config.monte_carlo_times,
+        'confidence_level': model_config.confidence_level,
+        'future_periods': horizon,
+        **config.get('prediction', {})
+    }
+    result = PredictionService(callbacks=callbacks).predict_charging_amount(df, prediction_config)
+
+    pricing_service = PricingService(elasticity_store=ElasticityStatsStore())
+    pricing = pricing_service.calculate_optimal_pricing(df, {
+        'station_id': station_id,
+        'cost_per_kwh': station.cost_per_kwh,
+        'predicted_volume': float(result['predictions'].mean()),
+        **config.get('pricing', {})
+    })
+
+    last_time = df['time_slot'].max()
+    rows = []
+    for step in range(horizon):
+        amount = float(result['predictions'][step])
+        rows.append({
+            'station_id': station_id,
+            'time_slot': (last_time + timedelta(hours=step + 1)).to_pydatetime(),
+            'predicted_amount_mean': amount,
+            'predicted_amount_lower': float(result['lower_bound'][step]),
+            'predicted_amount_upper': float(result['upper_bound'][step]),
+            'suggested_price_mean': float(pricing['optimal_price']),
+            'suggested_price_lower': float(pricing['price_range']['lower']),
+            'suggested_price_upper': float(pricing['price_range']['upper']),
+            'revenue_prediction': float(pricing_service.predict_revenue(
+                pricing['optimal_price'],
+                pricing['cost_baseline'],
+                pricing['elasticity'],
+                pricing['current_price'],
+                amount
+            )),
+            'model_config_id': model_config.id
+        })
+    if with_metrics:
+        return rows, {name: float(value) for name, value in result['metrics'].items()}
+    return rows
+
+
+def write_predict_results(rows: list, session_factory=SessionLocal, writer=None) -> int:
+    """批量写入预测结果，按 (station_id, time_slot, model_config_id) upsert，重新预测时覆盖旧值
+
+    Args:
+        rows: predict_result 记录列表
+        session_factory: 数据库会话工厂
+        writer: 预测结果写入器，默认按配置决定是否紧凑存储
+
+    Returns:
+        写入的行数
+    """
+    if not rows:
+        return 0
+    writer = writer if writer is not None else PredictResultWriter()
+    session = session_factory()
+    try:
+        written = writer.write(rows, bind=session.connection())
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return written
+
+
+class FleetForecastService:
+    """多充电站批量预测服务
+
+    在进程池中并行完成各充电站的训练和预测，每个工作进程限制TensorFlow线程数；
+    每完成一个充电站就把结果批量写入 predict_result 并记录检查点，中断后可从断点继续。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, tf_threads: Optional[int] = None, checkpoint_dir: Optional[str] = None, session_factory=SessionLocal):
+        self.max_workers = max_workers or settings.FLEET_MAX_WORKERS
+        self.tf_threads = tf_threads or settings.FLEET_TF_THREADS
+        self.checkpoint_dir = checkpoint_dir or settings.FLEET_CHECKPOINT_DIR
+        self.session_factory = session_factory
+
+    def forecast_stations(self, station_ids: Optional[list] = None, config: Optional[dict] = None, run_id: str = 'default', resume: bool = True) -> dict:
+        """批量预测
+
+        Args:
+            station_ids: 充电站ID列表，默认预测 stations 表中的全部充电站
+            config: 预测配置，支持 future_periods、prediction、pricing 等键
+            run_id: 运行标识，用于区分检查点
+            resume: 是否跳过检查点中已完成的充电站
+
+        Returns:
+            包含已完成、失败和写入行数的汇总
+        """
+        config = config or {}
+        if station_ids is None:
+            session = self.session_factory()
+            try:
+                station_ids = session.execute(select(Station.id).order_by(Station.id)).scalars().all()
+            finally:
+                session.close()
+
+        checkpoint = self._load_checkpoint(run_id) if resume else {'completed': [], 'failed': {}}
+        completed = set(checkpoint['completed'])
+        pending = [station_id for station_id in station_ids if station_id not in completed]
+        logger.info(f"Fleet forecast run {run_id}: {len(pending)} pending, {len(completed)} already completed")
+
+        written = 0
+        # spawn 启动方式避免继承父进程的数据库连接和TensorFlow运行时
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context, initializer=configure_worker_threads, initargs=(self.tf_threads,)) as executor:
+            futures = {executor.submit(forecast_station, station_id, config): station_id for station_id in pending}
+            for future in as_completed(futures):
+                station_id = futures[future]
+                try:
+                    rows = future.result()
+                    written += self._write_results(rows)
+                    checkpoint['completed'].append(station_id)
+                    checkpoint['failed'].pop(str(station_id), None)
+                    logger.info(f"Station {station_id} forecast written ({len(rows)} rows)")
+                except Exception as e:
+                    checkpoint['failed'][str(station_id)] = str(e)
+                    logger.error(f"Station {station_id} forecast failed: {e}")
+                self._save_checkpoint(run_id, checkpoint)
+
+        logger.info(f"Fleet forecast run {run_id} finished: {len(checkpoint['completed'])} completed, {len(checkpoint['failed'])} failed")
+        return {
+            'run_id': run_id,
+            'completed': checkpoint['completed'],
+            'failed': checkpoint['failed'],
+            'rows_written': written
+        }
+
+    def _write_results(self, rows: list) -> int:
+        """批量写入预测结果"""
+        return write_predict_results(rows, self.session_factory)
+
+    def _checkpoint_path(self, run_id: str) -> str:
+        return os.path.join(self.checkpoint_dir, f'fleet_forecast_{run_id}.json')
+
+    def _load_checkpoint(self, run_id: str) -> dict:
+        path = self._checkpoint_path(run_id)
+        if not os.path.exists(path):
+            return {'completed': [], 'failed': {}}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_checkpoint(self, run_id: str, checkpoint: dict) -> None:
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self._checkpoint_path(run_id)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Forecast charging amount for a fleet of stations")
+    parser.add_argument('--stations', type=int, nargs='*', help="Station ids, defaults to all stations")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--tf-threads', type=int, default=None)
+    parser.add_argument('--horizon', type=int, default=24)
+    parser.add_argument('--run-id', default='default')
+    parser.add_argument('--no-resume', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL.upper())
+    summary = FleetForecastService(max_workers=args.workers, tf_threads=args.tf_threads).forecast_stations(
+        args.stations or None,
+        {'future_periods': args.horizon},
+        run_id=args.run_id,
+        resume=not args.no_resume
+    )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
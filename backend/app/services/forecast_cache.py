@@ -0,0 +1,291 @@
+# 预测结果缓存服务
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from sqlalchemy import Delete, Insert, Update, event
+
+from app.core.config import settings
+from app.core.database import SessionLocal, engine as default_engine
+from app.services.fleet_forecast import forecast_station, get_station_model_config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 写入后会使对应充电站的缓存失效的表（variable_data 也是预测的输入特征）
+INVALIDATING_TABLES = ('historical_data', 'actual_data', 'variable_data')
+# 连接上已写入、尚未提交的充电站ID集合（每个注册的缓存一份），None 表示无法确定充电站
+PENDING_KEY = 'forecast_cache_pending'
+
+
+class ForecastCache:
+    """充电站预测结果缓存
+
+    以 (充电站, 模型配置, 预测步数, 置信度) 为键缓存预测结果，按过期时间和条目数上限（最久未使用优先）淘汰。
+    同一个键的并发请求只计算一次，其余请求等待同一个结果。充电站有新的历史或实际数据写入时，
+    该充电站的缓存失效；失效前已开始的计算仍会返回给等待者，但结果不会写入缓存。
+    缓存的值在请求之间共享，调用方不应修改。
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None, clock: Callable = time.monotonic):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.FORECAST_CACHE_TTL_SECONDS
+        self.max_entries = max_entries if max_entries is not None else settings.FORECAST_CACHE_MAX_ENTRIES
+        self.clock = clock
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'invalidations': 0}
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._generations = {}
+        self._global_generation = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(station_id: int, model_config_id: int, horizon: int, confidence_level: float, options: Optional[dict] = None) -> tuple:
+        """构建缓存键
+
+        Args:
+            station_id: 充电站ID
+            model_config_id: 模型配置ID
+            horizon: 预测步数
+            confidence_level: 置信度
+            options: 其他会影响结果的预测/定价参数
+
+        Returns:
+            缓存键，第一个元素为充电站ID
+        """
+        digest = ''
+        if options:
+            digest = hashlib.sha1(json.dumps(options, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+        return station_id, model_config_id, int(horizon), round(float(confidence_level), 6), digest
+
+    def get(self, key: tuple):
+        """读取未过期的缓存结果，未命中时返回None"""
+        with self._lock:
+            return self._lookup(key)
+
+    def put(self, key: tuple, value) -> None:
+        """写入缓存结果"""
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_compute(self, key: tuple, compute: Callable):
+        """读取缓存结果，未命中时计算并写入缓存
+
+        同一个键已有计算在进行时等待其结果，不重复计算；计算失败时所有等待者都收到该异常，且不写入缓存。
+
+        Args:
+            key: 缓存键（make_key 的返回值）
+            compute: 无参数的计算函数
+
+        Returns:
+            预测结果
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+                generation = self._generation(key[0])
+            else:
+                self.stats['coalesced'] += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._release(key, future)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._release(key, future)
+            # 计算期间充电站有新数据写入时，结果只返回给本次的请求者
+            if self._generation(key[0]) == generation:
+                self._store(key, value)
+        future.set_result(value)
+        return value
+
+    async def get_or_compute_async(self, key: tuple, compute: Callable):
+        """在事件循环中读取或计算预测结果，计算在线程池中执行，不阻塞事件循环"""
+        value = self.get(key)
+        if value is not None:
+            return value
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_or_compute, key, compute)
+
+    def invalidate(self, station_id: Optional[int] = None) -> int:
+        """使充电站的缓存失效
+
+        Args:
+            station_id: 充电站ID，为None时清空全部缓存
+
+        Returns:
+            删除的条目数
+        """
+        with self._lock:
+            if station_id is None:
+                self._global_generation += 1
+                keys = list(self._entries)
+                self._in_flight.clear()
+            else:
+                self._generations[station_id] = self._generations.get(station_id, 0) + 1
+                keys = [key for key in self._entries if key[0] == station_id]
+                for key in [key for key in self._in_flight if key[0] == station_id]:
+                    # 之后的请求重新计算，不再等待失效前开始的计算
+                    del self._in_flight[key]
+            for key in keys:
+                del self._entries[key]
+            self.stats['invalidations'] += 1
+        if keys:
+            logger.info(f"Invalidated {len(keys)} cached forecasts for station {station_id if station_id is not None else 'all'}")
+        return len(keys)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self.invalidate(None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: tuple):
+        """读取缓存条目并刷新最近使用顺序，调用方需持有锁"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return value
+
+    def _store(self, key: tuple, value) -> None:
+        """写入缓存条目并按条目数上限淘汰，调用方需持有锁"""
+        self._entries[key] = (self.clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _release(self, key: tuple, future: Future) -> None:
+        """移除进行中的计算，调用方需持有锁"""
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    def _generation(self, station_id: int) -> tuple:
+        return self._global_generation, self._generations.get(station_id, 0)
+
+
+def _written_station_ids(statement, multiparams, params) -> Optional[set]:
+    """从写入语句的参数中提取充电站ID，无法确定时返回None"""
+    if isinstance(multiparams, dict):
+        multiparams = [multiparams]
+    rows = list(multiparams or []) + ([params] if params else [])
+    if not rows and isinstance(statement, Insert):
+        compiled = statement.compile()
+        rows = [compiled.params]
+    station_ids = set()
+    for row in rows:
+        if not isinstance(row, dict) or row.get('station_id') is None:
+            return None
+        station_ids.add(int(row['station_id']))
+    return station_ids or None
+
+
+def register_invalidation(cache, engine=None, tables: tuple = INVALIDATING_TABLES) -> None:
+    """在数据库引擎上注册写入监听，写入相关表时使对应充电站的缓存失效
+
+    ORM 会话和 Core 批量写入（如数据导入服务）都会经过引擎，写入时立即失效一次，提交时再失效一次，
+    避免写入与提交之间开始的预测读到旧数据后写入缓存。无法确定充电站的写入（如按条件更新）清空全部缓存。
+    其他进程的写入无法监听，由过期时间兜底。
+
+    Args:
+        cache: 预测结果缓存，或其他提供 invalidate(station_id) 方法的缓存（如特征矩阵构建器）
+        engine: 数据库引擎，默认使用应用的引擎
+        tables: 监听的表名
+    """
+    engine = engine if engine is not None else default_engine
+    pending_key = (PENDING_KEY, id(cache))
+
+    def invalidate(station_ids: Optional[set]) -> None:
+        if station_ids is None:
+            cache.invalidate(None)
+        else:
+            for station_id in station_ids:
+                cache.invalidate(station_id)
+
+    @event.listens_for(engine, 'after_execute')
+    def after_execute(conn, clauseelement, multiparams, params, execution_options, result):
+        if not isinstance(clauseelement, (Insert, Update, Delete)) or clauseelement.table.name not in tables:
+            return
+        station_ids = _written_station_ids(clauseelement, multiparams, params)
+        invalidate(station_ids)
+        pending = conn.info.get(pending_key, set())
+        conn.info[pending_key] = None if station_ids is None or pending is None else pending | station_ids
+
+    @event.listens_for(engine, 'commit')
+    def on_commit(conn):
+        if pending_key in conn.info:
+            invalidate(conn.info.pop(pending_key))
+
+    @event.listens_for(engine, 'rollback')
+    def on_rollback(conn):
+        conn.info.pop(pending_key, None)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_forecast_cache() -> ForecastCache:
+    """获取进程内共享的预测结果缓存，首次调用时在应用的数据库引擎上注册失效监听"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ForecastCache()
+            register_invalidation(_shared_cache)
+        return _shared_cache
+
+
+def cached_forecast_station(station_id: int, config: Optional[dict] = None, cache: Optional[ForecastCache] = None, session_factory=SessionLocal) -> list:
+    """带缓存的单个充电站预测，供看板和定价流程重复查询
+
+    Args:
+        station_id: 充电站ID
+        config: 预测配置，支持 future_periods、prediction、pricing 等键
+        cache: 预测结果缓存，默认使用进程内共享的缓存
+        session_factory: 数据库会话工厂
+
+    Returns:
+        predict_result 格式的记录列表（共享对象，不应修改）
+    """
+    config = config or {}
+    cache = cache if cache is not None else get_forecast_cache()
+    session = session_factory()
+    try:
+        model_config = get_station_model_config(session, station_id)
+    finally:
+        session.close()
+
+    prediction_options = dict(config.get('prediction', {}))
+    confidence_level = prediction_options.pop('confidence_level', model_config.confidence_level)
+    options = {'prediction': prediction_options, 'pricing': config.get('pricing', {})}
+    key = cache.make_key(
+        station_id,
+        model_config.id,
+        config.get('future_periods', 24),
+        confidence_level,
+        options if prediction_options or options['pricing'] else None
+    )
+    return cache.get_or_compute(key, lambda: forecast_station(station_id, config))
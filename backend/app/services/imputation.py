@@ -0,0 +1,159 @@
+# 多列缺失值插补服务
+import hashlib
+import os
+import threading
+import time
+from typing import Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.experimental import enable_iterative_imputer  # noqa: F401
+from sklearn.impute import IterativeImputer
+
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MultiColumnImputer:
+    """共享、可缓存的多列随机森林插补器
+
+    用一个 IterativeImputer 同时插补所有缺失列（迭代次数有上限），随机森林使用全部CPU核心，
+    训练时可按行数预算抽样。拟合结果按 (充电站, 数值列集合) 缓存在内存中并持久化到磁盘，
+    同一充电站后续批次的数据直接复用，不再重新训练。
+
+    IterativeImputer 只为拟合时含缺失值的列训练模型，其余列在变换时按均值填充，因此本次需要插补的列
+    不全在拟合时的缺失列中时重新拟合；缓存超过 max_age_hours 或已处理 refit_rows 行后也重新拟合。
+    """
+
+    def __init__(self, n_estimators: int = 50, max_iter: int = 5, max_train_rows: Optional[int] = 50000, n_jobs: int = -1, random_state: int = 42, store_dir: Optional[str] = None, max_age_hours: Optional[float] = None, refit_rows: Optional[int] = None):
+        self.n_estimators = n_estimators
+        self.max_iter = max_iter
+        self.max_train_rows = max_train_rows
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.store_dir = store_dir or settings.IMPUTER_STORE_DIR
+        self.max_age_hours = max_age_hours if max_age_hours is not None else settings.IMPUTER_MAX_AGE_HOURS
+        self.refit_rows = refit_rows if refit_rows is not None else settings.IMPUTER_REFIT_ROWS
+        self._imputers = {}
+        self._lock = threading.Lock()
+
+    def impute(self, df: pd.DataFrame, columns: Optional[list] = None, station_id: Optional[int] = None, inplace: bool = False, refit: bool = False) -> pd.DataFrame:
+        """插补缺失值
+
+        Args:
+            df: 输入数据
+            columns: 要插补的列，默认所有含缺失值的数值列
+            station_id: 充电站ID；为空时不缓存，每次重新拟合
+            inplace: 是否直接修改输入数据
+            refit: 是否忽略已缓存的插补器重新拟合
+
+        Returns:
+            插补后的数据
+        """
+        feature_columns = df.select_dtypes(include=[np.number]).columns.tolist()
+        if columns is None:
+            columns = [c for c in feature_columns if df[c].isnull().any()]
+        columns = [c for c in columns if c in feature_columns and df[c].isnull().any()]
+        if not columns:
+            return df
+
+        logger.info(f"Imputing columns {columns} with shared random forest imputer (station_id={station_id})")
+        entry = None if refit else self._get_entry(station_id, feature_columns, columns, len(df))
+        if entry is None:
+            entry = self._fit(df[feature_columns])
+            if station_id is not None:
+                self._put_entry(station_id, feature_columns, entry, len(df))
+        imputer = entry['imputer']
+
+        if not inplace:
+            df = df.copy()
+        # 只对含缺失值的行做变换，其余行保持不变
+        missing_rows = df[columns].isnull().any(axis=1).to_numpy()
+        imputed = imputer.transform(np.array(df.loc[missing_rows, feature_columns], dtype=np.float64))
+        for column in columns:
+            j = feature_columns.index(column)
+            column_missing = df[column].isnull().to_numpy()
+            df.loc[column_missing, column] = imputed[column_missing[missing_rows], j]
+
+        logger.info(f"Imputed {int(missing_rows.sum())} rows across {len(columns)} columns")
+        return df
+
+    def _fit(self, features: pd.DataFrame) -> dict:
+        """在（抽样后的）数据上拟合插补器，返回插补器和拟合时含缺失值的列"""
+        features = self._sample_rows(features)
+        estimator = RandomForestRegressor(n_estimators=self.n_estimators, n_jobs=self.n_jobs, random_state=self.random_state)
+        imputer = IterativeImputer(estimator=estimator, max_iter=self.max_iter, random_state=self.random_state, keep_empty_features=True)
+        imputer.fit(np.array(features, dtype=np.float64))
+        logger.info(f"Fitted imputer on {len(features)} rows x {features.shape[1]} columns")
+        return {
+            'imputer': imputer,
+            'missing_columns': [c for c in features.columns if features[c].isnull().any()],
+            'fitted_at': time.time()
+        }
+
+    def _sample_rows(self, features: pd.DataFrame) -> pd.DataFrame:
+        """按行数预算抽样，一半预算优先保留含缺失值的行，保证每个缺失列都参与建模"""
+        if self.max_train_rows is None or len(features) <= self.max_train_rows:
+            return features
+        rng = np.random.default_rng(self.random_state)
+        has_missing = features.isnull().any(axis=1).to_numpy()
+        missing_idx = np.flatnonzero(has_missing)
+        complete_idx = np.flatnonzero(~has_missing)
+        n_missing = min(len(missing_idx), self.max_train_rows // 2)
+        n_complete = min(len(complete_idx), self.max_train_rows - n_missing)
+        rows = np.concatenate([
+            rng.choice(missing_idx, n_missing, replace=False),
+            rng.choice(complete_idx, n_complete, replace=False)
+        ])
+        return features.iloc[np.sort(rows)]
+
+    def _key(self, station_id: int, feature_columns: list) -> tuple:
+        return station_id, tuple(feature_columns)
+
+    def _path(self, station_id: int, feature_columns: list) -> str:
+        digest = hashlib.sha1('\x1f'.join(feature_columns).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.store_dir, f'station_{station_id}', f'{digest}.joblib')
+
+    def _get_entry(self, station_id: Optional[int], feature_columns: list, columns: list, rows: int) -> Optional[dict]:
+        """从内存或磁盘获取同一充电站、同一列集合且仍可复用的插补器"""
+        if station_id is None:
+            return None
+        key = self._key(station_id, feature_columns)
+        with self._lock:
+            entry = self._imputers.get(key)
+            if entry is None:
+                path = self._path(station_id, feature_columns)
+                if not os.path.exists(path):
+                    return None
+                stored = joblib.load(path)
+                if stored['columns'] != list(feature_columns):
+                    return None
+                entry = {**stored, 'rows_processed': 0}
+                self._imputers[key] = entry
+                logger.info(f"Loaded persisted imputer for station {station_id}")
+
+            unfitted = [c for c in columns if c not in entry['missing_columns']]
+            if unfitted:
+                logger.info(f"Refitting imputer for station {station_id}: columns {unfitted} had no gaps at fit time")
+                return None
+            if self.max_age_hours and time.time() - entry['fitted_at'] > self.max_age_hours * 3600:
+                logger.info(f"Refitting imputer for station {station_id}: older than {self.max_age_hours}h")
+                return None
+            if self.refit_rows and entry['rows_processed'] + rows > self.refit_rows:
+                logger.info(f"Refitting imputer for station {station_id}: {entry['rows_processed']} rows processed since fit")
+                return None
+            entry['rows_processed'] += rows
+            return entry
+
+    def _put_entry(self, station_id: int, feature_columns: list, entry: dict, rows: int) -> None:
+        with self._lock:
+            self._imputers[self._key(station_id, feature_columns)] = {**entry, 'columns': list(feature_columns), 'rows_processed': rows}
+            path = self._path(station_id, feature_columns)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.tmp'
+            joblib.dump({**entry, 'columns': list(feature_columns)}, tmp_path)
+            os.replace(tmp_path, path)
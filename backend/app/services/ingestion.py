@@ -0,0 +1,287 @@
+# 数据批量导入服务
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from app.core.bulk_ops import build_upsert, execute_batches
+from app.core.database import engine as default_engine
+from app.models.mysql import HistoricalData, HistoricalOutlier, VariableData
+from app.services.elasticity_store import ElasticityStatsStore
+from app.services.streaming_stats import StreamingOutlierDetector
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 各目标表的列定义：必填列缺失的行会被拒绝，可选列允许为空
+TABLE_SPECS = {
+    'historical_data': {
+        'model': HistoricalData,
+        'required': ['charging_amount', 'electricity_price', 'charging_duration'],
+        'optional': []
+    },
+    'variable_data': {
+        'model': VariableData,
+        'required': [],
+        'optional': ['temperature', 'humidity', 'traffic_flow', 'competitor_price', 'user_behavior_score']
+    }
+}
+KEY_COLUMNS = ['station_id', 'time_slot']
+INTEGER_COLUMNS = {'traffic_flow'}
+
+
+class DataIngestionService:
+    """数据批量导入服务
+
+    分块读取CSV/Excel文件，校验并转换数据类型后，按 (station_id, time_slot) 批量 upsert 到
+    historical_data 或 variable_data。重复导入有重叠的文件时只会更新已有行，不会产生重复数据。
+    配置了在线异常值检测器时，historical_data 的行按充电站的在线统计量检测异常，异常值及其上下界写入
+    historical_outlier；outlier_action 为 'drop' 时异常行不写入 historical_data，为 'mark' 时照常写入。
+    统计量只用新插入行中未被标记的值更新，重复导入已有的行不会重复计数。
+    配置了汇总表服务时，historical_data 的每个数据块写入后把涉及的充电站和时间范围标记为待更新。
+    historical_data 写入时在同一事务中更新价格弹性统计量：新插入的行累加，被覆盖的行先减去旧值。
+    """
+
+    def __init__(self, engine=None, batch_size: int = 5000, chunksize: int = 100000, outlier_detector: Optional[StreamingOutlierDetector] = None, rollup_service=None, elasticity_store: Optional[ElasticityStatsStore] = None, outlier_action: str = 'mark'):
+        self.engine = engine if engine is not None else default_engine
+        self.batch_size = batch_size
+        self.chunksize = chunksize
+        if outlier_action not in ('mark', 'drop'):
+            raise ValueError(f"Unsupported outlier action: {outlier_action}")
+        self.outlier_detector = outlier_detector
+        self.outlier_action = outlier_action
+        self.rollup_service = rollup_service
+        self.elasticity_store = elasticity_store if elasticity_store is not None else ElasticityStatsStore(self.engine)
+        self.rows_flagged = 0
+
+    def ingest_file(self, file_path: str, table: str = 'historical_data', station_id: Optional[int] = None) -> dict:
+        """导入数据文件
+
+        Args:
+            file_path: CSV或Excel文件路径
+            table: 目标表，'historical_data' 或 'variable_data'
+            station_id: 文件中没有 station_id 列时使用的充电站ID
+
+        Returns:
+            读取行数、写入行数、拒绝行数、异常行数、耗时和每秒行数
+        """
+        logger.info(f"Ingesting {file_path} into {table}")
+        if table not in TABLE_SPECS:
+            raise ValueError(f"Unsupported ingestion table: {table}")
+
+        start = time.perf_counter()
+        rows_read = rows_written = 0
+        self.rows_flagged = 0
+        for chunk in self.iter_chunks(file_path):
+            rows_read += len(chunk)
+            rows_written += self.ingest_frame(chunk, table, station_id)
+
+        elapsed = time.perf_counter() - start
+        summary = {
+            'table': table,
+            'rows_read': rows_read,
+            'rows_written': rows_written,
+            'rows_rejected': rows_read - rows_written,
+            'rows_flagged': self.rows_flagged,
+            'elapsed_seconds': elapsed,
+            'rows_per_second': rows_written / elapsed if elapsed > 0 else 0.0
+        }
+        logger.info(f"Ingested {rows_written}/{rows_read} rows into {table} in {elapsed:.2f}s ({summary['rows_per_second']:.0f} rows/s)")
+        return summary
+
+    def ingest_frame(self, df: pd.DataFrame, table: str = 'historical_data', station_id: Optional[int] = None) -> int:
+        """校验并批量写入一个数据块
+
+        Args:
+            df: 数据块
+            table: 目标表
+            station_id: 数据块中没有 station_id 列时使用的充电站ID
+
+        Returns:
+            写入的行数
+        """
+        spec = TABLE_SPECS[table]
+        records = self.coerce_frame(df, table, station_id)
+        if records.empty:
+            return 0
+
+        # 只写入和更新文件中存在的列，部分列的文件不会把其他列覆盖为空
+        value_columns = [c for c in spec['required'] + spec['optional'] if c in records.columns]
+        table_obj = spec['model'].__table__
+        stmt = build_upsert(table_obj, self.engine.dialect.name, KEY_COLUMNS, value_columns)
+        is_historical = table == 'historical_data'
+        flags = None
+        with self.engine.begin() as connection:
+            existing = self._existing_rows(connection, table_obj, records, value_columns) if is_historical else None
+            to_write = records
+            if self.outlier_detector is not None and is_historical:
+                flags = self.outlier_detector.flag(records, update=False)
+                outliers = flags.any(axis=1)
+                flagged = int(outliers.sum())
+                self.rows_flagged += flagged
+                if flagged:
+                    dropped = self.outlier_action == 'drop'
+                    self._write_outliers(connection, records, flags, dropped)
+                    logger.warning(f"Flagged {flagged} outlier rows in {table} chunk{', dropped them' if dropped else ''}")
+                    if dropped:
+                        to_write = records[~outliers]
+            written = execute_batches(connection, stmt, self._to_records(to_write), self.batch_size)
+            if existing is not None:
+                self.elasticity_store.apply_changes(to_write, existing.merge(to_write[KEY_COLUMNS], on=KEY_COLUMNS), bind=connection)
+
+        if flags is not None:
+            # 重复导入的已有行此前已合并进统计量，只用新插入的行更新
+            new_rows = ~records.set_index(KEY_COLUMNS).index.isin(existing.set_index(KEY_COLUMNS).index)
+            self.outlier_detector.partial_fit_unflagged(records[new_rows], flags[new_rows])
+        if self.rollup_service is not None and is_historical and not to_write.empty:
+            for station_id, time_slots in to_write.groupby('station_id')['time_slot']:
+                self.rollup_service.mark_dirty(int(station_id), time_slots.min(), time_slots.max().floor('h') + pd.Timedelta(hours=1))
+        return written
+
+    def _write_outliers(self, connection, records: pd.DataFrame, flags: pd.DataFrame, dropped: bool) -> None:
+        """把异常值及检测时的上下界写入 historical_outlier"""
+        detector = self.outlier_detector
+        rows = []
+        for column in detector.columns:
+            column_flags = flags[f'{column}_is_outlier'].to_numpy()
+            for record in records[column_flags].itertuples(index=False):
+                hour = record.time_slot.hour if detector.by_hour else None
+                bounds = detector.bounds(int(record.station_id), column, hour) or (None, None)
+                rows.append({
+                    'station_id': int(record.station_id),
+                    'time_slot': record.time_slot.to_pydatetime(),
+                    'column_name': column,
+                    'value': float(getattr(record, column)),
+                    'lower_bound': bounds[0],
+                    'upper_bound': bounds[1],
+                    'dropped': dropped
+                })
+        stmt = build_upsert(HistoricalOutlier.__table__, connection.dialect.name, ['station_id', 'time_slot', 'column_name'], ['value', 'lower_bound', 'upper_bound', 'dropped'])
+        execute_batches(connection, stmt, rows, self.batch_size)
+
+    def coerce_frame(self, df: pd.DataFrame, table: str, station_id: Optional[int] = None) -> pd.DataFrame:
+        """校验并转换数据类型
+
+        Args:
+            df: 原始数据块
+            table: 目标表
+            station_id: 数据块中没有 station_id 列时使用的充电站ID
+
+        Returns:
+            只包含目标表列、类型正确且 (station_id, time_slot) 唯一的数据；文件中没有的可选列不包含在内
+        """
+        spec = TABLE_SPECS[table]
+        value_columns = spec['required'] + [c for c in spec['optional'] if c in df.columns]
+
+        if 'station_id' not in df.columns:
+            if station_id is None:
+                raise ValueError("station_id column is missing and no station_id was given")
+            df = df.assign(station_id=station_id)
+        missing = [c for c in ['time_slot'] + spec['required'] if c not in df.columns]
+        if missing:
+            raise ValueError(f"Missing required columns for {table}: {missing}")
+        if not value_columns:
+            raise ValueError(f"No value columns for {table}, expected some of {spec['optional']}")
+
+        records = pd.DataFrame({
+            'station_id': pd.to_numeric(df['station_id'], errors='coerce'),
+            'time_slot': pd.to_datetime(df['time_slot'], errors='coerce')
+        }, index=df.index)
+        for column in value_columns:
+            records[column] = pd.to_numeric(df[column], errors='coerce')
+
+        valid = records[KEY_COLUMNS + spec['required']].notna().all(axis=1)
+        rejected = int((~valid).sum())
+        if rejected:
+            logger.warning(f"Rejected {rejected} rows with invalid keys or required values for {table}")
+
+        records = records[valid].astype({'station_id': np.int64})
+        # 同一数据块内的重复键只保留最后一条
+        return records.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+
+    @staticmethod
+    def _existing_rows(connection, table_obj, records: pd.DataFrame, columns: list) -> pd.DataFrame:
+        """读取数据块中已存在于目标表的行（写入前的值）"""
+        query = select(*[table_obj.c[c] for c in KEY_COLUMNS + columns]).where(
+            table_obj.c.station_id.in_([int(v) for v in records['station_id'].unique()]),
+            table_obj.c.time_slot >= records['time_slot'].min().to_pydatetime(),
+            table_obj.c.time_slot <= records['time_slot'].max().to_pydatetime()
+        )
+        existing = pd.DataFrame(connection.execute(query).all(), columns=KEY_COLUMNS + columns)
+        if existing.empty:
+            return existing
+        existing['time_slot'] = pd.to_datetime(existing['time_slot'])
+        return existing.merge(records[KEY_COLUMNS], on=KEY_COLUMNS)
+
+    def iter_chunks(self, file_path: str):
+        """分块读取数据文件
+
+        Args:
+            file_path: 文件路径
+
+        Yields:
+            数据块
+        """
+        if file_path.endswith('.csv'):
+            yield from pd.read_csv(file_path, chunksize=self.chunksize)
+        elif file_path.endswith('.xlsx') or file_path.endswith('.xls'):
+            # Excel无法流式解析，读入后分块写入
+            df = pd.read_excel(file_path)
+            for start in range(0, len(df), self.chunksize):
+                yield df.iloc[start:start + self.chunksize]
+        else:
+            raise ValueError("Unsupported file format. Please use CSV or Excel files.")
+
+    @staticmethod
+    def _to_records(records: pd.DataFrame) -> list:
+        """转换为 executemany 参数，NaN 转为 None"""
+        columns = records.columns.tolist()
+        values = {}
+        for column in columns:
+            series = records[column]
+            if column == 'time_slot':
+                values[column] = series.dt.to_pydatetime()
+            elif column in INTEGER_COLUMNS or column == 'station_id':
+                values[column] = [None if pd.isna(v) else int(v) for v in series]
+            else:
+                values[column] = [None if pd.isna(v) else float(v) for v in series]
+        return [dict(zip(columns, row)) for row in zip(*(values[c] for c in columns))]
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import os
+
+    from app.core.config import settings
+
+    parser = argparse.ArgumentParser(description="Bulk ingest a CSV/Excel file into historical_data or variable_data")
+    parser.add_argument('file_path')
+    parser.add_argument('--table', choices=sorted(TABLE_SPECS), default='historical_data')
+    parser.add_argument('--station-id', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--chunksize', type=int, default=100000)
+    parser.add_argument('--outlier-state', default=None, help="JSON state of the streaming outlier detector, created if missing")
+    parser.add_argument('--outlier-action', choices=['mark', 'drop'], default='mark', help="Keep flagged rows (mark) or leave them out of historical_data (drop)")
+    parser.add_argument('--refresh-rollups', action='store_true', help="Refresh dashboard rollups for the ingested ranges")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL.upper())
+    detector = None
+    if args.outlier_state:
+        if os.path.exists(args.outlier_state):
+            detector = StreamingOutlierDetector.load(args.outlier_state)
+        else:
+            detector = StreamingOutlierDetector(TABLE_SPECS['historical_data']['required'])
+    rollups = None
+    if args.refresh_rollups:
+        from app.services.rollup import RollupService
+        rollups = RollupService()
+    summary = DataIngestionService(batch_size=args.batch_size, chunksize=args.chunksize, outlier_detector=detector, rollup_service=rollups, outlier_action=args.outlier_action).ingest_file(args.file_path, args.table, args.station_id)
+    if detector is not None:
+        detector.save(args.outlier_state)
+    if rollups is not None:
+        summary['rollup_ranges_refreshed'] = rollups.flush()
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
@@ -0,0 +1,293 @@
+# 后台任务队列服务
+import asyncio
+import multiprocessing
+import queue
+import threading
+import uuid
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.models.mongodb.model_logs import ModelLog
+from app.services.fleet_forecast import configure_worker_threads, forecast_station, write_predict_results
+from app.services.model_log_store import InMemoryModelLogStore, MongoModelLogStore, get_model_log_store
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """任务在运行中被取消"""
+
+
+class JobContext:
+    """工作进程内的任务上下文：上报进度、检查取消标记"""
+
+    def __init__(self, job_id: str, progress_queue, cancel_flags):
+        self.job_id = job_id
+        self.progress_queue = progress_queue
+        self.cancel_flags = cancel_flags
+
+    def report(self, **progress) -> None:
+        """上报进度（数值会写入 ModelLog.metrics）"""
+        self.progress_queue.put((self.job_id, 'progress', progress))
+
+    def is_cancelled(self) -> bool:
+        return bool(self.cancel_flags.get(self.job_id, False))
+
+    def check_cancelled(self) -> None:
+        """已被取消时抛出 JobCancelled"""
+        if self.is_cancelled():
+            raise JobCancelled(self.job_id)
+
+    def keras_callback(self):
+        """构建每轮上报进度、收到取消时中止训练的Keras回调"""
+        from app.services.prediction import load_backend
+        keras = load_backend('tensorflow').keras
+        context = self
+
+        class ProgressCallback(keras.callbacks.Callback):
+            def on_epoch_end(self, epoch, logs=None):
+                context.report(epoch=epoch + 1, epochs=self.params.get('epochs'), **{k: float(v) for k, v in (logs or {}).items()})
+                if context.is_cancelled():
+                    self.model.stop_training = True
+                    raise JobCancelled(context.job_id)
+
+        return ProgressCallback()
+
+
+def train_station_job(station_id: int, config: dict, context: JobContext) -> dict:
+    """训练任务：训练（或从模型注册表加载）充电站模型，返回预测指标"""
+    _, metrics = forecast_station(station_id, config, callbacks=[context.keras_callback()], with_metrics=True)
+    return {'metrics': metrics}
+
+
+def forecast_station_job(station_id: int, config: dict, context: JobContext) -> dict:
+    """预测任务：训练并预测充电站，返回待写入 predict_result 的记录和预测指标"""
+    rows, metrics = forecast_station(station_id, config, callbacks=[context.keras_callback()], with_metrics=True)
+    return {'rows': rows, 'metrics': metrics}
+
+
+# 任务类型到处理函数的映射，处理函数需可被工作进程导入
+JOB_HANDLERS = {
+    'train': train_station_job,
+    'forecast': forecast_station_job
+}
+
+
+def run_job(job_id: str, handler: Callable, station_id: int, config: dict, progress_queue, cancel_flags):
+    """工作进程入口"""
+    context = JobContext(job_id, progress_queue, cancel_flags)
+    context.check_cancelled()
+    progress_queue.put((job_id, 'started', {}))
+    return handler(station_id, config, context)
+
+
+class JobQueue:
+    """训练/预测后台任务队列
+
+    任务在进程池中运行，不占用 FastAPI 的工作线程或事件循环。每个任务对应一条 ModelLog：
+    提交时为 training，运行中按轮写入进度，结束时更新为 success（附最终指标）或 failed（附错误信息）。
+    通过 status/result 轮询任务状态和结果；排队中的任务可以直接取消，运行中的任务在下一轮结束时中止。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None, log_store=None, use_processes: bool = True, preload: bool = True, handlers: Optional[dict] = None, result_writer: Optional[Callable] = None):
+        self.max_workers = max_workers or settings.JOB_QUEUE_MAX_WORKERS
+        self.max_pending = max_pending or settings.JOB_QUEUE_MAX_PENDING
+        self.log_store = log_store if log_store is not None else get_model_log_store()
+        self.handlers = handlers if handlers is not None else JOB_HANDLERS
+        self.result_writer = result_writer if result_writer is not None else write_predict_results
+        self.jobs = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+        if use_processes:
+            # spawn 启动方式避免继承父进程的数据库连接和TensorFlow运行时
+            context = multiprocessing.get_context('spawn')
+            self._manager = context.Manager()
+            initializer, initargs = None, ()
+            if preload:
+                initializer, initargs = configure_worker_threads, (settings.FLEET_TF_THREADS,)
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context, initializer=initializer, initargs=initargs)
+            self._progress = self._manager.Queue()
+            self._cancel_flags = self._manager.dict()
+        else:
+            self._manager = None
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            self._progress = queue.Queue()
+            self._cancel_flags = {}
+
+        self._stopped = threading.Event()
+        self._progress_thread = threading.Thread(target=self._consume_progress, name='job-progress', daemon=True)
+        self._progress_thread.start()
+
+    def submit(self, kind: str, station_id: int, config: Optional[dict] = None) -> str:
+        """提交任务
+
+        Args:
+            kind: 任务类型，'train' 或 'forecast'
+            station_id: 充电站ID
+            config: 预测配置
+
+        Returns:
+            任务ID
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unsupported job kind: {kind}")
+        config = config or {}
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            active = sum(1 for job in self.jobs.values() if job['status'] in ('queued', 'running', 'cancelling'))
+            if active >= self.max_pending:
+                raise RuntimeError(f"Job queue is full ({active} active jobs)")
+            # 先登记任务占住队列名额，日志写入在锁外进行
+            self.jobs[job_id] = {
+                'job_id': job_id,
+                'kind': kind,
+                'station_id': station_id,
+                'status': 'queued',
+                'progress': {},
+                'result': None,
+                'error': None,
+                'log_id': None,
+                'submitted_at': datetime.now(),
+                'finished_at': None
+            }
+
+        # 日志写入是同步的网络请求，不能持有锁（否则状态查询和进度线程都要等待）；
+        # 日志存储不可用时任务照常提交，只是没有对应的 ModelLog
+        log_id = None
+        try:
+            log_id = self.log_store.insert(ModelLog(
+                station_id=station_id,
+                model_type=kind,
+                status='training',
+                parameters={'job_id': job_id, **config}
+            ))
+        except Exception as e:
+            logger.warning(f"Failed to create model log for job {job_id}: {e}")
+
+        with self._lock:
+            self.jobs[job_id]['log_id'] = log_id
+            try:
+                future = self._executor.submit(run_job, job_id, self.handlers[kind], station_id, config, self._progress, self._cancel_flags)
+            except Exception:
+                del self.jobs[job_id]
+                raise
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+        logger.info(f"Submitted {kind} job {job_id} for station {station_id}")
+        return job_id
+
+    def status(self, job_id: str) -> dict:
+        """查询任务状态（不含结果数据）"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(f"Unknown job: {job_id}")
+            return {k: v for k, v in job.items() if k != 'result'}
+
+    def result(self, job_id: str, timeout: Optional[float] = None):
+        """等待任务结束并返回结果，任务失败或被取消时抛出异常"""
+        return self._future(job_id).result(timeout=timeout)
+
+    async def result_async(self, job_id: str):
+        """在事件循环中等待任务结果，不阻塞事件循环"""
+        return await asyncio.wrap_future(self._future(job_id))
+
+    def cancel(self, job_id: str) -> bool:
+        """取消任务
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            排队中的任务被直接取消或运行中的任务已标记取消时返回 True，任务已结束时返回 False
+        """
+        future = self._future(job_id)
+        if future.cancel():
+            return True
+        with self._lock:
+            job = self.jobs[job_id]
+            if job['status'] not in ('queued', 'running'):
+                return False
+            job['status'] = 'cancelling'
+        self._cancel_flags[job_id] = True
+        logger.info(f"Cancellation requested for running job {job_id}")
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭任务队列"""
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        self._stopped.set()
+        self._progress_thread.join(timeout=5)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+    def _future(self, job_id: str) -> Future:
+        future = self._futures.get(job_id)
+        if future is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        return future
+
+    def _consume_progress(self) -> None:
+        """把工作进程上报的开始和进度写入任务状态和 ModelLog"""
+        while not self._stopped.is_set():
+            try:
+                job_id, event, payload = self._progress.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job is None or job['status'] not in ('queued', 'running', 'cancelling'):
+                    continue
+                if event == 'started':
+                    if job['status'] == 'queued':
+                        job['status'] = 'running'
+                    continue
+                job['progress'] = payload
+                log_id = job['log_id']
+            metrics = {k: float(v) for k, v in payload.items() if isinstance(v, (int, float))}
+            self._safe_log_update(log_id, metrics=metrics)
+
+    def _on_done(self, job_id: str, future: Future) -> None:
+        """任务结束：更新状态，写入预测结果，并把 ModelLog 更新为 success/failed"""
+        error = None
+        result = None
+        try:
+            result = future.result()
+            if self.result_writer is not None and result and result.get('rows'):
+                result['rows_written'] = self.result_writer(result['rows'])
+            status = 'success'
+        except (CancelledError, JobCancelled):
+            status, error = 'cancelled', 'cancelled'
+        except Exception as e:
+            status, error = 'failed', f"{e.__class__.__name__}: {e}"
+            logger.error(f"Job {job_id} failed: {error}", exc_info=e)
+
+        with self._lock:
+            job = self.jobs[job_id]
+            job.update(status=status, result=result, error=error, finished_at=datetime.now())
+            log_id = job['log_id']
+        self._cancel_flags.pop(job_id, None)
+
+        if status == 'success':
+            metrics = {k: float(v) for k, v in ((result or {}).get('metrics') or {}).items()}
+            if result and 'rows_written' in result:
+                metrics['rows_written'] = float(result['rows_written'])
+            self._safe_log_update(log_id, status='success', metrics=metrics)
+        else:
+            self._safe_log_update(log_id, status='failed', error_message=error)
+        logger.info(f"Job {job_id} finished with status {status}")
+
+    def _safe_log_update(self, log_id: Optional[str], **fields) -> None:
+        # 日志存储不可用不应影响任务本身；提交时日志创建失败的任务没有 log_id
+        if log_id is None:
+            return
+        try:
+            self.log_store.update(log_id, **fields)
+        except Exception as e:
+            logger.warning(f"Failed to update model log {log_id}: {e}")
@@ -0,0 +1,70 @@
+# 模型日志存储服务
+import itertools
+import threading
+from datetime import datetime
+from typing import Optional
+
+from app.core.config import settings
+from app.models.mongodb.model_logs import ModelLog
+
+
+class InMemoryModelLogStore:
+    """进程内的模型日志存储，用于测试和没有MongoDB的本地环境"""
+
+    def __init__(self):
+        self.logs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def insert(self, log: ModelLog) -> str:
+        with self._lock:
+            log_id = str(next(self._ids))
+            self.logs[log_id] = log
+            return log_id
+
+    def update(self, log_id: str, **fields) -> None:
+        with self._lock:
+            self.logs[log_id] = self.logs[log_id].model_copy(update={**fields, 'updated_at': datetime.now()})
+
+    def get(self, log_id: str) -> Optional[ModelLog]:
+        return self.logs.get(log_id)
+
+
+class MongoModelLogStore:
+    """写入 MongoDB model_logs 集合的模型日志存储
+
+    任务队列在线程中更新日志，因此使用同步的 pymongo 客户端，而不是应用里的异步 motor 客户端。
+    日志写入在训练和预测路径上同步进行，客户端使用较短的服务器选择和连接超时（MONGODB_TIMEOUT_MS），
+    MongoDB 不可用时很快失败，而不是等待 pymongo 默认的30秒。
+    """
+
+    def __init__(self, url: Optional[str] = None, collection: str = 'model_logs', timeout_ms: Optional[int] = None):
+        from pymongo import MongoClient
+        timeout_ms = timeout_ms if timeout_ms is not None else settings.MONGODB_TIMEOUT_MS
+        client = MongoClient(url or settings.MONGODB_URL, serverSelectionTimeoutMS=timeout_ms, connectTimeoutMS=timeout_ms)
+        self.collection = client.get_database()[collection]
+
+    def insert(self, log: ModelLog) -> str:
+        return str(self.collection.insert_one(log.model_dump()).inserted_id)
+
+    def update(self, log_id: str, **fields) -> None:
+        from bson import ObjectId
+        self.collection.update_one({'_id': ObjectId(log_id)}, {'$set': {**fields, 'updated_at': datetime.now()}})
+
+    def get(self, log_id: str) -> Optional[ModelLog]:
+        from bson import ObjectId
+        document = self.collection.find_one({'_id': ObjectId(log_id)})
+        return ModelLog(**{k: v for k, v in document.items() if k != '_id'}) if document else None
+
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+
+def get_model_log_store():
+    """获取进程内共享的 MongoDB 模型日志存储，首次使用时创建"""
+    global _shared_store
+    with _shared_store_lock:
+        if _shared_store is None:
+            _shared_store = MongoModelLogStore()
+        return _shared_store
@@ -0,0 +1,253 @@
+# 模型注册表服务
+import json
+import os
+import shutil
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.models.mongodb.model_logs import ModelLog
+from app.services.model_log_store import get_model_log_store
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """磁盘模型注册表
+
+    按 (station_id, model_config_id, 训练数据指纹) 保存LSTM权重和序列化的Prophet模型。
+    数据与配置未变化时直接加载，指纹变化时才重新训练；按总大小和存放时长淘汰旧模型，
+    并把命中、未命中和加载耗时记录为 ModelLog，默认写入 MongoDB 的 model_logs 集合。
+    日志写入失败不影响训练和预测，只记录警告并在 LOG_SINK_BACKOFF_SECONDS 秒内暂停该日志输出，之后再重试。
+    """
+
+    LSTM_FILE = 'lstm.weights.h5'
+    PROPHET_FILE = 'prophet.json'
+    META_FILE = 'meta.json'
+    # 进程内保留的最近日志条数
+    RECENT_LOGS = 100
+    # 日志输出失败后暂停写入的秒数
+    LOG_SINK_BACKOFF_SECONDS = 300
+
+    def __init__(self, root_dir: Optional[str] = None, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None, log_sink: Optional[Callable[[ModelLog], None]] = None):
+        self.root_dir = root_dir or settings.MODEL_REGISTRY_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else settings.MODEL_REGISTRY_MAX_BYTES
+        self.max_age_days = max_age_days if max_age_days is not None else settings.MODEL_REGISTRY_MAX_AGE_DAYS
+        self.log_sink = log_sink if log_sink is not None else self._default_sink
+        self.logs = deque(maxlen=self.RECENT_LOGS)
+        self._sink_paused_until = 0.0
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def entry_dir(self, station_id: int, model_config_id: Optional[int], fingerprint: str) -> str:
+        """获取模型条目目录"""
+        return os.path.join(self.root_dir, f'station_{station_id}', f'config_{model_config_id}', fingerprint)
+
+    def load_lstm(self, station_id: int, model_config_id: Optional[int], fingerprint: str, build_fn: Callable):
+        """加载已保存的LSTM权重
+
+        Args:
+            station_id: 充电站ID
+            model_config_id: 模型配置ID
+            fingerprint: 训练数据指纹
+            build_fn: 构建同结构LSTM模型的函数
+
+        Returns:
+            加载好权重的模型，未命中时返回None
+        """
+        path = os.path.join(self.entry_dir(station_id, model_config_id, fingerprint), self.LSTM_FILE)
+        if not self._is_complete(path):
+            return None
+
+        start = time.perf_counter()
+        model = build_fn()
+        model.load_weights(path)
+        self._touch(os.path.dirname(path))
+        self._record_hit(station_id, model_config_id, fingerprint, 'LSTM', time.perf_counter() - start)
+        return model
+
+    def save_lstm(self, station_id: int, model_config_id: Optional[int], fingerprint: str, model, train_time: float) -> None:
+        """保存LSTM权重"""
+        entry = self._prepare_entry(station_id, model_config_id, fingerprint)
+        model.save_weights(os.path.join(entry, self.LSTM_FILE))
+        self._write_meta(entry, station_id, model_config_id, fingerprint)
+        self._record_miss(station_id, model_config_id, fingerprint, 'LSTM', train_time)
+        self.evict(keep=entry)
+
+    def load_prophet(self, station_id: int, model_config_id: Optional[int], fingerprint: str):
+        """加载已序列化的Prophet模型
+
+        Args:
+            station_id: 充电站ID
+            model_config_id: 模型配置ID
+            fingerprint: 训练数据指纹
+
+        Returns:
+            Prophet模型，未命中时返回None
+        """
+        path = os.path.join(self.entry_dir(station_id, model_config_id, fingerprint), self.PROPHET_FILE)
+        if not self._is_complete(path):
+            return None
+
+        from prophet.serialize import model_from_json
+
+        start = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as f:
+            model = model_from_json(f.read())
+        self._touch(os.path.dirname(path))
+        self._record_hit(station_id, model_config_id, fingerprint, 'Prophet', time.perf_counter() - start)
+        return model
+
+    def save_prophet(self, station_id: int, model_config_id: Optional[int], fingerprint: str, model, train_time: float) -> None:
+        """序列化保存Prophet模型"""
+        from prophet.serialize import model_to_json
+
+        entry = self._prepare_entry(station_id, model_config_id, fingerprint)
+        tmp_path = os.path.join(entry, self.PROPHET_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(model_to_json(model))
+        os.replace(tmp_path, os.path.join(entry, self.PROPHET_FILE))
+        self._write_meta(entry, station_id, model_config_id, fingerprint)
+        self._record_miss(station_id, model_config_id, fingerprint, 'Prophet', train_time)
+        self.evict(keep=entry)
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """按存放时长和总大小淘汰模型条目
+
+        Args:
+            keep: 不参与淘汰的条目目录（通常是刚写入的条目）
+
+        Returns:
+            被淘汰的条目数量
+        """
+        entries = []
+        for station_dir in self._list_dirs(self.root_dir):
+            for config_dir in self._list_dirs(station_dir):
+                for entry in self._list_dirs(config_dir):
+                    if keep is not None and os.path.abspath(entry) == os.path.abspath(keep):
+                        continue
+                    entries.append((self._last_used(entry), self._dir_size(entry), entry))
+
+        evicted = 0
+        now = time.time()
+        max_age_seconds = self.max_age_days * 86400 if self.max_age_days else None
+
+        # 先淘汰超过存放时长的条目，再按最近使用时间淘汰直到总大小满足限制
+        entries.sort()
+        remaining = []
+        for last_used, size, entry in entries:
+            if max_age_seconds is not None and now - last_used > max_age_seconds:
+                shutil.rmtree(entry, ignore_errors=True)
+                evicted += 1
+            else:
+                remaining.append((last_used, size, entry))
+
+        total_size = sum(size for _, size, _ in remaining) + (self._dir_size(keep) if keep else 0)
+        for last_used, size, entry in remaining:
+            if not self.max_bytes or total_size <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+            evicted += 1
+
+        if evicted:
+            logger.info(f"Evicted {evicted} model registry entries, {total_size} bytes remaining")
+        return evicted
+
+    def _prepare_entry(self, station_id: int, model_config_id: Optional[int], fingerprint: str) -> str:
+        """创建条目目录，并清理同一站点和配置下指纹已过期的旧条目"""
+        entry = self.entry_dir(station_id, model_config_id, fingerprint)
+        config_dir = os.path.dirname(entry)
+        for stale in self._list_dirs(config_dir):
+            if os.path.basename(stale) != fingerprint:
+                shutil.rmtree(stale, ignore_errors=True)
+                logger.info(f"Removed stale model entry {stale}")
+        os.makedirs(entry, exist_ok=True)
+        return entry
+
+    def _write_meta(self, entry: str, station_id: int, model_config_id: Optional[int], fingerprint: str) -> None:
+        meta_path = os.path.join(entry, self.META_FILE)
+        meta = {}
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        meta.update({
+            'station_id': station_id,
+            'model_config_id': model_config_id,
+            'fingerprint': fingerprint,
+            'files': sorted(set(meta.get('files', [])) | {f for f in os.listdir(entry) if f != self.META_FILE}),
+            'last_used': time.time()
+        })
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _is_complete(self, path: str) -> bool:
+        """模型文件和元数据都写入完成才视为命中"""
+        meta_path = os.path.join(os.path.dirname(path), self.META_FILE)
+        if not (os.path.exists(path) and os.path.exists(meta_path)):
+            return False
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return os.path.basename(path) in json.load(f).get('files', [])
+
+    def _touch(self, entry: str) -> None:
+        os.utime(os.path.join(entry, self.META_FILE), None)
+
+    def _last_used(self, entry: str) -> float:
+        meta_path = os.path.join(entry, self.META_FILE)
+        return os.path.getmtime(meta_path if os.path.exists(meta_path) else entry)
+
+    def _record_hit(self, station_id: int, model_config_id: Optional[int], fingerprint: str, model_type: str, load_time: float) -> None:
+        self.stats['hits'] += 1
+        logger.info(f"Model registry hit for station {station_id} {model_type}, loaded in {load_time:.3f}s")
+        self._record(station_id, model_config_id, fingerprint, model_type, 'hit', {'load_time': load_time})
+
+    def _record_miss(self, station_id: int, model_config_id: Optional[int], fingerprint: str, model_type: str, train_time: float) -> None:
+        self.stats['misses'] += 1
+        logger.info(f"Model registry miss for station {station_id} {model_type}, trained in {train_time:.3f}s")
+        self._record(station_id, model_config_id, fingerprint, model_type, 'miss', {'train_time': train_time})
+
+    def _record(self, station_id: int, model_config_id: Optional[int], fingerprint: str, model_type: str, cache_status: str, metrics: dict) -> None:
+        log = ModelLog(
+            station_id=station_id,
+            model_type=model_type,
+            status='success',
+            parameters={
+                'model_config_id': model_config_id,
+                'fingerprint': fingerprint,
+                'cache': cache_status
+            },
+            metrics={
+                **metrics,
+                'cache_hits': float(self.stats['hits']),
+                'cache_misses': float(self.stats['misses'])
+            }
+        )
+        self.logs.append(log)
+        if self.log_sink is None or time.monotonic() < self._sink_paused_until:
+            return
+        try:
+            self.log_sink(log)
+        except Exception as e:
+            logger.warning(f"Failed to write model registry log, pausing log sink for {self.LOG_SINK_BACKOFF_SECONDS}s: {e}")
+            self._sink_paused_until = time.monotonic() + self.LOG_SINK_BACKOFF_SECONDS
+
+    @staticmethod
+    def _default_sink(log: ModelLog) -> None:
+        get_model_log_store().insert(log)
+
+    @staticmethod
+    def _list_dirs(path: str) -> list:
+        if not os.path.isdir(path):
+            return []
+        return [os.path.join(path, name) for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))]
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+        return total
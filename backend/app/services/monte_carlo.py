@@ -0,0 +1,117 @@
+# 蒙特卡洛模拟引擎
+from typing import Optional, Union
+
+import numpy as np
+from scipy.stats import norm
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingQuantileSketch:
+    """按列累积的定宽直方图分位数草图
+
+    每列维护 n_bins 个计数，内存为 O(列数 × n_bins)，与样本数量无关；
+    落在 [low, high) 之外的样本计入两端的桶。分位数在桶内线性插值，误差不超过一个桶宽。
+    """
+
+    def __init__(self, n_columns: int, low: Union[float, np.ndarray], high: Union[float, np.ndarray], n_bins: int = 4096):
+        self.n_columns = n_columns
+        self.n_bins = n_bins
+        self.low = np.broadcast_to(np.asarray(low, dtype=np.float64), (n_columns,))
+        self.width = (np.broadcast_to(np.asarray(high, dtype=np.float64), (n_columns,)) - self.low) / n_bins
+        self.counts = np.zeros((n_columns, n_bins), dtype=np.int64)
+        self.count = 0
+        self._offsets = np.arange(n_columns, dtype=np.int64) * n_bins
+
+    def update(self, values: np.ndarray) -> None:
+        """累积一批样本
+
+        Args:
+            values: 形状为 (样本数, 列数) 的样本
+        """
+        bins = np.floor((values - self.low) / self.width).astype(np.int64)
+        np.clip(bins, 0, self.n_bins - 1, out=bins)
+        bins += self._offsets
+        self.counts += np.bincount(bins.ravel(), minlength=self.n_columns * self.n_bins).reshape(self.n_columns, self.n_bins)
+        self.count += values.shape[0]
+
+    def quantile(self, q: float) -> np.ndarray:
+        """估计每列的分位数
+
+        Args:
+            q: 分位数（0~1）
+
+        Returns:
+            每列的分位数估计值
+        """
+        cdf = np.cumsum(self.counts, axis=1)
+        target = q * self.count
+        bins = np.minimum((cdf < target).sum(axis=1), self.n_bins - 1)
+        rows = np.arange(self.n_columns)
+        below = np.where(bins > 0, cdf[rows, np.maximum(bins - 1, 0)], 0)
+        in_bin = np.maximum(self.counts[rows, bins], 1)
+        fraction = np.clip((target - below) / in_bin, 0.0, 1.0)
+        return self.low + (bins + fraction) * self.width
+
+
+class MonteCarloEngine:
+    """向量化、分块的蒙特卡洛模拟引擎
+
+    使用 np.random.Generator 按固定大小分块生成误差，流式累积均值和分位数，
+    内存占用为 O(chunk_size × 预测步长)，与模拟次数无关。误差为高斯分布时可使用闭式解。
+    """
+
+    METHODS = ('simulate', 'closed_form')
+
+    def __init__(self, chunk_size: int = 1000, n_bins: int = 4096, span: float = 8.0, seed: Optional[int] = None):
+        self.chunk_size = chunk_size
+        self.n_bins = n_bins
+        self.span = span
+        self.seed = seed
+
+    def run(self, predictions: np.array, std_dev: float, n_simulations: int = 10000, confidence_level: float = 0.95, method: str = 'simulate', seed: Optional[int] = None) -> tuple:
+        """生成预测均值和置信区间
+
+        Args:
+            predictions: 点预测结果
+            std_dev: 预测标准差
+            n_simulations: 模拟次数
+            confidence_level: 置信水平
+            method: 'simulate' 分块模拟，'closed_form' 高斯闭式解
+            seed: 随机种子，默认使用引擎的种子
+
+        Returns:
+            均值、下限和上限
+        """
+        predictions = np.asarray(predictions, dtype=np.float64).ravel()
+        lower_q = (1 - confidence_level) / 2
+        upper_q = (1 + confidence_level) / 2
+
+        if std_dev <= 0:
+            return predictions.copy(), predictions.copy(), predictions.copy()
+
+        if method == 'closed_form':
+            z = norm.ppf(upper_q)
+            return predictions.copy(), predictions - z * std_dev, predictions + z * std_dev
+        if method != 'simulate':
+            raise ValueError(f"Unsupported Monte Carlo method: {method}")
+
+        rng = np.random.default_rng(self.seed if seed is None else seed)
+        horizon = len(predictions)
+        # 草图只记录误差，各预测点共享同一组桶边界
+        sketch = StreamingQuantileSketch(horizon, -self.span * std_dev, self.span * std_dev, self.n_bins)
+        error_sum = np.zeros(horizon)
+
+        remaining = n_simulations
+        while remaining > 0:
+            size = min(self.chunk_size, remaining)
+            errors = rng.normal(0.0, std_dev, size=(size, horizon))
+            error_sum += errors.sum(axis=0)
+            sketch.update(errors)
+            remaining -= size
+
+        mean_pred = predictions + error_sum / n_simulations
+        lower_bound = predictions + sketch.quantile(lower_q)
+        upper_bound = predictions + sketch.quantile(upper_q)
+        return mean_pred, lower_bound, upper_bound
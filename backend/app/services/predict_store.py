@@ -0,0 +1,166 @@
+# 预测结果存储服务
+from contextlib import nullcontext
+from datetime import timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Engine, select
+
+from app.core.bulk_ops import build_upsert, execute_batches
+from app.core.config import settings
+from app.core.database import engine as default_engine
+from app.models.mysql import PredictResult, PredictRun
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 预测结果的指标列，紧凑存储时按此顺序各打包为一个 float32 数组
+PREDICT_VALUE_COLUMNS = [
+    'predicted_amount_mean', 'predicted_amount_lower', 'predicted_amount_upper',
+    'suggested_price_mean', 'suggested_price_lower', 'suggested_price_upper',
+    'revenue_prediction'
+]
+PREDICT_KEY_COLUMNS = ['station_id', 'time_slot', 'model_config_id']
+RUN_KEY_COLUMNS = ['station_id', 'model_config_id', 'start_slot']
+# 打包格式：float32 小端
+PACKED_DTYPE = np.dtype('<f4')
+
+
+class PredictResultWriter:
+    """预测结果批量写入
+
+    默认按 (station_id, time_slot, model_config_id) 分批 upsert 到 predict_result，重新预测相同时段时覆盖旧值，
+    不产生重复行。紧凑模式下每个 (充电站, 模型配置) 的一次预测只写一行 predict_run，各指标打包为 float32 数组，
+    行数和存储量约为逐时段存储的 1/N；float32 保留约7位有效数字。紧凑存储的结果不在 predict_result 中，
+    需要用 read_predictions 展开读取。
+    """
+
+    def __init__(self, engine=None, batch_size: Optional[int] = None, compact: Optional[bool] = None):
+        self.engine = engine if engine is not None else default_engine
+        self.batch_size = batch_size or settings.PREDICT_RESULT_BATCH_SIZE
+        self.compact = compact if compact is not None else settings.PREDICT_RESULT_COMPACT
+
+    def write(self, rows: list, bind=None) -> int:
+        """写入预测结果
+
+        Args:
+            rows: predict_result 格式的记录列表
+            bind: 数据库连接，默认在引擎上开启新事务；传入时由调用方提交
+
+        Returns:
+            写入的预测时段数
+        """
+        if not rows:
+            return 0
+        context = nullcontext(bind) if bind is not None else self.engine.begin()
+        with context as connection:
+            if self.compact:
+                runs = pack_runs(rows)
+                stmt = build_upsert(PredictRun.__table__, connection.dialect.name, RUN_KEY_COLUMNS, ['step_seconds', 'slot_count'] + PREDICT_VALUE_COLUMNS)
+                execute_batches(connection, stmt, runs, self.batch_size)
+                logger.info(f"Wrote {len(rows)} predicted slots as {len(runs)} packed runs")
+            else:
+                stmt = build_upsert(PredictResult.__table__, connection.dialect.name, PREDICT_KEY_COLUMNS, PREDICT_VALUE_COLUMNS)
+                execute_batches(connection, stmt, _dedupe(rows), self.batch_size)
+        return len(rows)
+
+
+def pack_runs(rows: list) -> list:
+    """把预测结果按 (充电站, 模型配置) 打包为 predict_run 记录
+
+    同一组的时段必须等间隔；同一时段重复出现时保留最后一条。
+
+    Args:
+        rows: predict_result 格式的记录列表
+
+    Returns:
+        predict_run 记录列表
+    """
+    df = pd.DataFrame(rows, columns=PREDICT_KEY_COLUMNS + PREDICT_VALUE_COLUMNS)
+    df['time_slot'] = pd.to_datetime(df['time_slot'])
+    df = df.drop_duplicates(PREDICT_KEY_COLUMNS, keep='last').sort_values('time_slot')
+    runs = []
+    for (station_id, model_config_id), group in df.groupby(['station_id', 'model_config_id'], sort=False):
+        steps = np.unique(np.diff(group['time_slot'].to_numpy()))
+        if len(steps) > 1:
+            raise ValueError(f"Predicted slots for station {station_id} are not evenly spaced")
+        step_seconds = int(steps[0] / np.timedelta64(1, 's')) if len(steps) else 3600
+        run = {
+            'station_id': int(station_id),
+            'model_config_id': int(model_config_id),
+            'start_slot': group['time_slot'].iloc[0].to_pydatetime(),
+            'step_seconds': step_seconds,
+            'slot_count': len(group)
+        }
+        for column in PREDICT_VALUE_COLUMNS:
+            run[column] = group[column].to_numpy(dtype=PACKED_DTYPE).tobytes()
+        runs.append(run)
+    return runs
+
+
+def expand_run(run) -> list:
+    """把 predict_run 行展开为逐时段的 predict_result 格式记录
+
+    Args:
+        run: PredictRun 对象、查询结果行或字典
+
+    Returns:
+        按时段排序的记录列表
+    """
+    get = run.get if isinstance(run, dict) else (run._mapping.get if hasattr(run, '_mapping') else lambda name: getattr(run, name))
+    count = get('slot_count')
+    start = get('start_slot')
+    step = timedelta(seconds=get('step_seconds'))
+    values = {column: np.frombuffer(get(column), dtype=PACKED_DTYPE, count=count).tolist() for column in PREDICT_VALUE_COLUMNS}
+    return [
+        {
+            'station_id': get('station_id'),
+            'time_slot': start + step * i,
+            **{column: values[column][i] for column in PREDICT_VALUE_COLUMNS},
+            'model_config_id': get('model_config_id')
+        }
+        for i in range(count)
+    ]
+
+
+def read_predictions(station_id: int, start=None, end=None, model_config_id: Optional[int] = None, bind=None) -> list:
+    """读取紧凑存储的预测结果并展开为逐时段记录
+
+    多次预测覆盖同一时段时取起始时段最晚（基于最新数据）的一次。
+
+    Args:
+        station_id: 充电站ID
+        start: 起始时段（包含），为空时不限
+        end: 结束时段（不包含），为空时不限
+        model_config_id: 模型配置ID，为空时返回全部配置
+        bind: 数据库引擎或连接，默认使用应用的引擎
+
+    Returns:
+        按 (时段, 模型配置) 排序的记录列表
+    """
+    bind = bind if bind is not None else default_engine
+    query = select(PredictRun).where(PredictRun.station_id == station_id)
+    if model_config_id is not None:
+        query = query.where(PredictRun.model_config_id == model_config_id)
+    if end is not None:
+        query = query.where(PredictRun.start_slot < end)
+    # 批次展开后再按时段过滤，开始于 start 之前的批次也可能覆盖查询范围
+    query = query.order_by(PredictRun.start_slot, PredictRun.id)
+
+    latest = {}
+    # 传入连接时复用该连接（及其事务），不关闭
+    with (bind.connect() if isinstance(bind, Engine) else nullcontext(bind)) as connection:
+        for run in connection.execute(query):
+            for record in expand_run(run):
+                if (start is None or record['time_slot'] >= start) and (end is None or record['time_slot'] < end):
+                    latest[(record['time_slot'], record['model_config_id'])] = record
+    return [latest[key] for key in sorted(latest)]
+
+
+def _dedupe(rows: list) -> list:
+    """同一批中重复的 (station_id, time_slot, model_config_id) 只保留最后一条"""
+    unique = {}
+    for row in rows:
+        unique[(row['station_id'], row['time_slot'], row['model_config_id'])] = {column: row[column] for column in PREDICT_KEY_COLUMNS + PREDICT_VALUE_COLUMNS}
+    return list(unique.values())
@@ -1,33 +1,76 @@
 # 预测模型服务
 import pandas as pd
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense, Dropout
-from prophet import Prophet
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from typing import Optional, TYPE_CHECKING
+import importlib
+import time
+from app.core.config import settings
+from app.core.fingerprint import compute_data_fingerprint
+from app.core.memory import MB, MemoryReport
+from app.services.model_registry import ModelRegistry
+from app.services.monte_carlo import MonteCarloEngine
 import logging
 
 logger = logging.getLogger(__name__)
 
+if TYPE_CHECKING:
+    import tensorflow as tf
+    from tensorflow.keras.models import Sequential
+    from prophet import Prophet
+
+# TensorFlow和Prophet导入耗时数秒、占用数百MB内存，只在首次使用LSTM/Prophet时加载
+HEAVY_BACKENDS = ('tensorflow', 'prophet')
+
+
+def load_backend(name: str):
+    """延迟导入重量级后端
+
+    Args:
+        name: 模块名，'tensorflow' 或 'prophet'
+
+    Returns:
+        已导入的模块
+    """
+    return importlib.import_module(name)
+
+
+def preload_backends() -> None:
+    """预先加载TensorFlow和Prophet
+
+    仅供预测工作进程显式调用，使首个请求不承担导入耗时；定价、数据处理进程不应调用。
+    """
+    for name in HEAVY_BACKENDS:
+        start = time.perf_counter()
+        load_backend(name)
+        logger.info(f"Preloaded {name} in {time.perf_counter() - start:.2f}s")
+
 
 class PredictionService:
     """预测模型服务类"""
     
-    def __init__(self):
+    def __init__(self, model_registry: Optional[ModelRegistry] = None, callbacks: Optional[list] = None):
         self.lstm_model = None
         self.prophet_model = None
+        self.model_registry = model_registry if model_registry is not None else ModelRegistry()
+        self.memory_report = MemoryReport()
+        # 训练LSTM时传给Keras的回调（如任务队列的进度上报）
+        self.callbacks = list(callbacks or [])
     
-    def prepare_lstm_data(self, df: pd.DataFrame, target_column: str, look_back: int = 24) -> tuple:
+    def prepare_lstm_data(self, df: pd.DataFrame, target_column: str, look_back: int = 24, dtype=None) -> tuple:
         """准备LSTM模型的数据
         
+        基于步长视图构建滑动窗口，X 是共享底层数据的只读视图，不复制 look_back 倍的数据。
+        需要连续的批次时使用 iter_lstm_batches 按需生成。
+        
         Args:
             df: 输入数据
             target_column: 目标列名
             look_back: 时间窗口大小
+            dtype: 底层数据类型（如 np.float32），默认保持原类型
             
         Returns:
-            训练数据和标签
+            训练数据窗口视图和标签
         """
         logger.info(f"Preparing LSTM data with look_back={look_back}")
         
@@ -36,20 +79,73 @@ class PredictionService:
         if target_column not in numeric_columns:
             numeric_columns.append(target_column)
         
-        data = df[numeric_columns].values
-        X, y = [], []
+        data = df[numeric_columns].to_numpy(dtype=dtype)
+        n_windows = max(len(data) - look_back, 0)
         
-        for i in range(len(data) - look_back):
-            X.append(data[i:(i + look_back), :])
-            y.append(data[i + look_back, numeric_columns.index(target_column)])
+        if n_windows == 0:
+            X = np.empty((0, look_back, data.shape[1]), dtype=data.dtype)
+        else:
+            # (N - look_back + 1, features, look_back) -> (N - look_back, look_back, features)
+            X = np.lib.stride_tricks.sliding_window_view(data, look_back, axis=0)[:n_windows].transpose(0, 2, 1)
+        y = data[look_back:, numeric_columns.index(target_column)]
         
-        X = np.array(X)
-        y = np.array(y)
-        
-        logger.info(f"Prepared LSTM data with shape X: {X.shape}, y: {y.shape}")
+        materialized_bytes = n_windows * look_back * data.shape[1] * data.itemsize
+        logger.info(f"Prepared LSTM data with shape X: {X.shape}, y: {y.shape}; "
+                    f"window view backed by {data.nbytes / 1024 ** 2:.2f} MB instead of {materialized_bytes / 1024 ** 2:.2f} MB materialized")
         return X, y
     
-    def build_lstm_model(self, input_shape: tuple, hidden_layers: int = 3, units: int = 64, dropout_rate: float = 0.2) -> Sequential:
+    def iter_lstm_batches(self, X: np.array, y: np.array, batch_size: int = 32, dtype=np.float32, start: int = 0, stop: Optional[int] = None, shuffle: bool = False, seed: Optional[int] = None):
+        """按需生成连续的LSTM训练批次
+        
+        Args:
+            X: prepare_lstm_data 返回的窗口视图
+            y: 标签
+            batch_size: 批次大小
+            dtype: 批次数据类型
+            start: 起始样本下标
+            stop: 结束样本下标（不含）
+            shuffle: 是否打乱批次顺序
+            seed: 打乱批次顺序的随机种子
+            
+        Yields:
+            (X_batch, y_batch) 连续数组
+        """
+        stop = len(X) if stop is None else stop
+        batch_starts = np.arange(start, stop, batch_size)
+        if shuffle:
+            np.random.default_rng(seed).shuffle(batch_starts)
+        
+        for batch_start in batch_starts:
+            batch_stop = min(batch_start + batch_size, stop)
+            yield (np.ascontiguousarray(X[batch_start:batch_stop], dtype=dtype),
+                   np.ascontiguousarray(y[batch_start:batch_stop], dtype=dtype))
+    
+    def make_lstm_dataset(self, X: np.array, y: np.array, batch_size: int = 32, start: int = 0, stop: Optional[int] = None, shuffle: bool = False) -> "tf.data.Dataset":
+        """构建按需读取窗口视图的 tf.data 数据集
+        
+        Args:
+            X: prepare_lstm_data 返回的窗口视图
+            y: 标签
+            batch_size: 批次大小
+            start: 起始样本下标
+            stop: 结束样本下标（不含）
+            shuffle: 每轮是否打乱批次顺序
+            
+        Returns:
+            不物化完整三维张量的数据集
+        """
+        tf = load_backend('tensorflow')
+        signature = (
+            tf.TensorSpec(shape=(None,) + X.shape[1:], dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32)
+        )
+        dataset = tf.data.Dataset.from_generator(
+            lambda: self.iter_lstm_batches(X, y, batch_size, start=start, stop=stop, shuffle=shuffle),
+            output_signature=signature
+        )
+        return dataset.prefetch(tf.data.AUTOTUNE)
+    
+    def build_lstm_model(self, input_shape: tuple, hidden_layers: int = 3, units: int = 64, dropout_rate: float = 0.2) -> "Sequential":
         """构建LSTM模型
         
         Args:
@@ -63,6 +159,10 @@ class PredictionService:
         """
         logger.info(f"Building LSTM model with {hidden_layers} hidden layers, {units} units per layer")
         
+        keras = load_backend('tensorflow').keras
+        Sequential = keras.models.Sequential
+        LSTM, Dense, Dropout = keras.layers.LSTM, keras.layers.Dense, keras.layers.Dropout
+        
         model = Sequential()
         
         # 添加第一个LSTM层
@@ -87,7 +187,7 @@ class PredictionService:
         logger.info("LSTM model built successfully")
         return model
     
-    def train_lstm(self, X: np.array, y: np.array, epochs: int = 100, batch_size: int = 32, hidden_layers: int = 3) -> tuple:
+    def train_lstm(self, X: np.array, y: np.array, epochs: int = 100, batch_size: int = 32, hidden_layers: int = 3, streaming: bool = False) -> tuple:
         """训练LSTM模型
         
         Args:
@@ -96,37 +196,56 @@ class PredictionService:
             epochs: 训练轮数
             batch_size: 批次大小
             hidden_layers: 隐藏层数量
+            streaming: 是否通过 tf.data 按批读取窗口视图，避免物化完整训练张量
             
         Returns:
             训练好的模型和训练历史
         """
-        logger.info(f"Training LSTM model for {epochs} epochs with batch_size={batch_size}")
+        logger.info(f"Training LSTM model for {epochs} epochs with batch_size={batch_size}, streaming={streaming}")
         
         # 构建模型
         self.lstm_model = self.build_lstm_model(X.shape[1:], hidden_layers=hidden_layers)
         
         # 训练模型
-        history = self.lstm_model.fit(X, y, epochs=epochs, batch_size=batch_size, validation_split=0.2, verbose=1)
+        if streaming:
+            # 与 validation_split=0.2 一致：最后20%的样本作为验证集
+            split = int(len(X) * 0.8)
+            train_dataset = self.make_lstm_dataset(X, y, batch_size, stop=split, shuffle=True)
+            val_dataset = self.make_lstm_dataset(X, y, batch_size, start=split)
+            history = self.lstm_model.fit(train_dataset, validation_data=val_dataset, epochs=epochs, verbose=1, callbacks=self.callbacks)
+        else:
+            # 直接以 float32 交给Keras，避免先物化 float64 张量再转换
+            X = np.ascontiguousarray(X, dtype=np.float32)
+            y = np.asarray(y, dtype=np.float32)
+            history = self.lstm_model.fit(X, y, epochs=epochs, batch_size=batch_size, validation_split=0.2, verbose=1, callbacks=self.callbacks)
         
         logger.info("LSTM model trained successfully")
         return self.lstm_model, history
     
-    def predict_lstm(self, model: Sequential, X: np.array) -> np.array:
+    def predict_lstm(self, model: "Sequential", X: np.array, batch_size: int = 1024) -> np.array:
         """使用LSTM模型进行预测
         
         Args:
             model: 训练好的LSTM模型
             X: 输入数据
+            batch_size: 每批转换为连续float32数组的样本数
             
         Returns:
             预测结果
         """
         logger.info(f"Making LSTM predictions for {len(X)} samples")
-        predictions = model.predict(X)
+        if len(X) == 0:
+            return np.empty((0, 1), dtype=np.float32)
+        
+        # 按批物化窗口视图，避免一次性复制完整的三维张量
+        predictions = np.concatenate([
+            model.predict_on_batch(np.ascontiguousarray(X[i:i + batch_size], dtype=np.float32))
+            for i in range(0, len(X), batch_size)
+        ])
         logger.info("LSTM predictions completed")
         return predictions
     
-    def train_prophet(self, df: pd.DataFrame, ds_column: str, y_column: str) -> Prophet:
+    def train_prophet(self, df: pd.DataFrame, ds_column: str, y_column: str) -> "Prophet":
         """训练Prophet模型
         
         Args:
@@ -143,13 +262,14 @@ class PredictionService:
         prophet_df = df[[ds_column, y_column]].rename(columns={ds_column: 'ds', y_column: 'y'})
         
         # 初始化并训练Prophet模型
+        Prophet = load_backend('prophet').Prophet
         self.prophet_model = Prophet(daily_seasonality=True, weekly_seasonality=True, yearly_seasonality=True)
         self.prophet_model.fit(prophet_df)
         
         logger.info("Prophet model trained successfully")
         return self.prophet_model
     
-    def predict_prophet(self, model: Prophet, future_periods: int) -> pd.DataFrame:
+    def predict_prophet(self, model: "Prophet", future_periods: int) -> pd.DataFrame:
         """使用Prophet模型进行预测
         
         Args:
@@ -195,7 +315,7 @@ class PredictionService:
         logger.info("Prediction ensemble completed")
         return ensemble_preds
     
-    def monte_carlo_simulation(self, predictions: np.array, std_dev: float, n_simulations: int = 10000, confidence_level: float = 0.95) -> tuple:
+    def monte_carlo_simulation(self, predictions: np.array, std_dev: float, n_simulations: int = 10000, confidence_level: float = 0.95, method: str = 'simulate', seed: Optional[int] = None, chunk_size: int = 1000) -> tuple:
         """蒙特卡洛模拟生成置信区间
         
         Args:
@@ -203,24 +323,17 @@ class PredictionService:
             std_dev: 预测标准差
             n_simulations: 模拟次数
             confidence_level: 置信水平
+            method: 'simulate' 分块模拟，'closed_form' 高斯误差闭式解
+            seed: 随机种子，相同种子结果可复现
+            chunk_size: 每块模拟的次数
             
         Returns:
             模拟结果的均值、下限和上限
         """
-        logger.info(f"Running Monte Carlo simulation with {n_simulations} simulations, confidence_level={confidence_level}")
-        
-        # 生成模拟数据
-        simulations = np.zeros((n_simulations, len(predictions)))
+        logger.info(f"Running Monte Carlo simulation with {n_simulations} simulations, confidence_level={confidence_level}, method={method}")
         
-        for i in range(n_simulations):
-            # 为每个预测点生成随机误差
-            errors = np.random.normal(0, std_dev, len(predictions))
-            simulations[i] = predictions + errors
-        
-        # 计算置信区间
-        lower_bound = np.percentile(simulations, (1 - confidence_level) / 2 * 100, axis=0)
-        upper_bound = np.percentile(simulations, (1 + confidence_level) / 2 * 100, axis=0)
-        mean_pred = np.mean(simulations, axis=0)
+        engine = MonteCarloEngine(chunk_size=chunk_size, seed=seed)
+        mean_pred, lower_bound, upper_bound = engine.run(predictions, std_dev, n_simulations, confidence_level, method=method)
         
         logger.info("Monte Carlo simulation completed")
         return mean_pred, lower_bound, upper_bound
@@ -269,16 +382,60 @@ class PredictionService:
         target_column = config.get('target_column', 'charging_amount')
         time_column = config.get('time_column', 'time_slot')
         look_back = config.get('look_back', 24)
-        
-        # 2. 训练LSTM模型
-        X, y = self.prepare_lstm_data(df, target_column, look_back)
-        lstm_model, _ = self.train_lstm(X, y, hidden_layers=config.get('lstm_hidden_layers', 3))
+        hidden_layers = config.get('lstm_hidden_layers', 3)
+        epochs = config.get('epochs', 100)
+        self.memory_report = MemoryReport()
+        
+        # 2. 加载或训练LSTM模型
+        # 紧凑模式下窗口视图底层直接使用 float32，一直保持到Keras
+        X, y = self.prepare_lstm_data(df, target_column, look_back, dtype=np.float32 if config.get('compact', False) else None)
+        self.memory_report.record('prepare_lstm_data', arrays=[X, y])
+        # 未显式指定时，物化训练张量会超过内存预算则自动按批流式训练
+        budget_mb = config.get('memory_budget_mb', settings.MEMORY_BUDGET_MB)
+        materialized_mb = X.size * 4 / MB
+        streaming = config.get('lstm_streaming', bool(budget_mb) and materialized_mb > budget_mb)
+        station_id = config.get('station_id')
+        model_config_id = config.get('model_config_id')
+        use_registry = self.model_registry is not None and station_id is not None
+        
+        if use_registry:
+            fingerprint = compute_data_fingerprint(df, {
+                'target_column': target_column,
+                'time_column': time_column,
+                'look_back': look_back,
+                'lstm_hidden_layers': hidden_layers,
+                'epochs': epochs
+            })
+            lstm_model = self.model_registry.load_lstm(
+                station_id,
+                model_config_id,
+                fingerprint,
+                lambda: self.build_lstm_model(X.shape[1:], hidden_layers=hidden_layers)
+            )
+        else:
+            lstm_model = None
+        
+        if lstm_model is None:
+            start = time.perf_counter()
+            lstm_model, _ = self.train_lstm(X, y, epochs=epochs, hidden_layers=hidden_layers, streaming=streaming)
+            if use_registry:
+                self.model_registry.save_lstm(station_id, model_config_id, fingerprint, lstm_model, time.perf_counter() - start)
+        self.lstm_model = lstm_model
+        self.memory_report.record('train_lstm')
         
         # 3. LSTM预测
         lstm_preds = self.predict_lstm(lstm_model, X)
-        
-        # 4. 训练Prophet模型
-        prophet_model = self.train_prophet(df, time_column, target_column)
+        self.memory_report.record('predict_lstm', arrays=[lstm_preds])
+        
+        # 4. 加载或训练Prophet模型
+        prophet_model = self.model_registry.load_prophet(station_id, model_config_id, fingerprint) if use_registry else None
+        if prophet_model is None:
+            start = time.perf_counter()
+            prophet_model = self.train_prophet(df, time_column, target_column)
+            if use_registry:
+                self.model_registry.save_prophet(station_id, model_config_id, fingerprint, prophet_model, time.perf_counter() - start)
+        self.prophet_model = prophet_model
+        self.memory_report.record('train_prophet')
         
         # 5. Prophet预测
         future_periods = config.get('future_periods', 24)
@@ -294,12 +451,17 @@ class PredictionService:
             ensemble_preds,
             std_dev,
             n_simulations=config.get('monte_carlo_times', 10000),
-            confidence_level=config.get('confidence_level', 0.95)
+            confidence_level=config.get('confidence_level', 0.95),
+            method=config.get('monte_carlo_method', 'simulate'),
+            seed=config.get('monte_carlo_seed')
         )
         
+        self.memory_report.record('monte_carlo', arrays=[mean_pred, lower_bound, upper_bound])
+        
         # 8. 计算预测指标
         metrics = self.calculate_metrics(y[-future_periods:], ensemble_preds)
         
+        logger.info(f"Prediction memory: {self.memory_report.summary()}")
         logger.info("Charging amount prediction completed")
         
         return {
@@ -1,7 +1,6 @@
 # 定价计算服务
 import pandas as pd
 import numpy as np
-from scipy.optimize import minimize
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,6 +9,12 @@ logger = logging.getLogger(__name__)
 class PricingService:
     """定价计算服务类"""
     
+    def __init__(self, elasticity_store=None):
+        # 按 (station_id, hour) 累积的弹性回归充分统计量
+        self.elasticity_stats = None
+        # 持久化的弹性统计量（ElasticityStatsStore），设置后定价流程优先使用，不扫描历史数据
+        self.elasticity_store = elasticity_store
+    
     def calculate_cost_baseline(self, station_id: int, cost_per_kwh: float, fixed_costs: float, predicted_volume: float) -> float:
         """计算成本基准
         
@@ -33,38 +38,129 @@ class PricingService:
         logger.info(f"Cost baseline calculated: {cost_baseline:.4f} 元/kWh")
         return cost_baseline
     
-    def calculate_price_elasticity(self, df: pd.DataFrame, price_column: str, demand_column: str) -> float:
+    def calculate_price_elasticity(self, df: pd.DataFrame, price_column: str, demand_column: str, default_elasticity: float = -0.5) -> float:
         """计算价格弹性系数
         
         Args:
             df: 包含价格和需求数据的数据框
             price_column: 价格列名
             demand_column: 需求列名
+            default_elasticity: 有效数据不足以回归时返回的弹性系数
             
         Returns:
             价格弹性系数
         """
         logger.info(f"Calculating price elasticity using columns {price_column} and {demand_column}")
         
-        # 计算价格和需求的对数变化
-        df = df.copy()
-        df['ln_price'] = np.log(df[price_column])
-        df['ln_demand'] = np.log(df[demand_column])
+        # 对 ln(需求) ~ ln(价格) 做最小二乘回归，斜率即弹性系数
+        stats = self._elasticity_sufficient_stats(df, price_column, demand_column).sum()
+        elasticity = float(self._elasticity_from_stats(stats.to_frame().T, default_elasticity).iloc[0])
         
-        # 计算价格弹性系数（需求变化率 / 价格变化率）
-        # 使用线性回归计算弹性系数
-        from sklearn.linear_model import LinearRegression
+        logger.info(f"Price elasticity calculated: {elasticity:.4f}")
+        return elasticity
+    
+    def calculate_grouped_elasticity(self, df: pd.DataFrame, price_column: str = 'electricity_price', demand_column: str = 'charging_amount', time_column: str = 'time_slot', station_column: str = 'station_id', default_elasticity: float = -0.5) -> pd.Series:
+        """按充电站和时段分组计算价格弹性系数
         
-        X = df['ln_price'].values.reshape(-1, 1)
-        y = df['ln_demand'].values
+        一次分组向量化计算所有 (station_id, hour) 组合的弹性系数，不修改已累积的统计量。
         
-        model = LinearRegression()
-        model.fit(X, y)
+        Args:
+            df: 包含充电站、时间、价格和需求的数据
+            price_column: 价格列名
+            demand_column: 需求列名
+            time_column: 时间列名，按小时划分时段
+            station_column: 充电站ID列名
+            default_elasticity: 有效数据不足以回归时使用的弹性系数
+            
+        Returns:
+            以 (station_id, hour) 为索引的弹性系数
+        """
+        logger.info(f"Calculating grouped price elasticity for {len(df)} rows")
+        stats = self._grouped_elasticity_stats(df, price_column, demand_column, time_column, station_column)
+        return self._elasticity_from_stats(stats, default_elasticity)
+    
+    def update_elasticity_stats(self, df: pd.DataFrame, price_column: str = 'electricity_price', demand_column: str = 'charging_amount', time_column: str = 'time_slot', station_column: str = 'station_id', default_elasticity: float = -0.5) -> pd.Series:
+        """用新数据增量更新分组弹性系数
         
-        elasticity = model.coef_[0]
+        只对新行计算 (n, Σx, Σy, Σxy, Σx²) 并累加到已保存的统计量上，复杂度为 O(新行数)。
+        适用于新写入的 historical_data（charging_amount/electricity_price）
+        或 actual_data（actual_amount/actual_price）。
         
-        logger.info(f"Price elasticity calculated: {elasticity:.4f}")
-        return elasticity
+        Args:
+            df: 新增数据
+            price_column: 价格列名
+            demand_column: 需求列名
+            time_column: 时间列名
+            station_column: 充电站ID列名
+            default_elasticity: 有效数据不足以回归时使用的弹性系数
+            
+        Returns:
+            更新后全部分组的弹性系数
+        """
+        new_stats = self._grouped_elasticity_stats(df, price_column, demand_column, time_column, station_column)
+        if self.elasticity_stats is None:
+            self.elasticity_stats = new_stats
+        else:
+            self.elasticity_stats = self.elasticity_stats.add(new_stats, fill_value=0)
+        logger.info(f"Updated elasticity statistics with {len(df)} rows, {len(self.elasticity_stats)} groups tracked")
+        return self._elasticity_from_stats(self.elasticity_stats, default_elasticity)
+    
+    def get_elasticity(self, station_id: int, hour: int, default_elasticity: float = -0.5) -> float:
+        """查询已累积统计量下的弹性系数
+        
+        Args:
+            station_id: 充电站ID
+            hour: 时段（小时）
+            default_elasticity: 没有统计量时返回的弹性系数
+            
+        Returns:
+            价格弹性系数
+        """
+        if self.elasticity_stats is None or (station_id, hour) not in self.elasticity_stats.index:
+            return default_elasticity
+        stats = self.elasticity_stats.loc[[(station_id, hour)]]
+        return float(self._elasticity_from_stats(stats, default_elasticity).iloc[0])
+    
+    def _grouped_elasticity_stats(self, df: pd.DataFrame, price_column: str, demand_column: str, time_column: str, station_column: str) -> pd.DataFrame:
+        """按 (station_id, hour) 分组的回归充分统计量"""
+        keys = pd.DataFrame({
+            'station_id': df[station_column].values,
+            'hour': pd.to_datetime(df[time_column]).dt.hour.values
+        }, index=df.index)
+        stats = self._elasticity_sufficient_stats(df, price_column, demand_column)
+        return stats.groupby([keys['station_id'], keys['hour']]).sum()
+    
+    @staticmethod
+    def _elasticity_sufficient_stats(df: pd.DataFrame, price_column: str, demand_column: str) -> pd.DataFrame:
+        """逐行计算对数回归的充分统计量，非正或缺失的价格/需求不计入"""
+        price = df[price_column].to_numpy(dtype=np.float64)
+        demand = df[demand_column].to_numpy(dtype=np.float64)
+        valid = (price > 0) & (demand > 0) & np.isfinite(price) & np.isfinite(demand)
+        
+        x = np.log(np.where(valid, price, 1.0))
+        y = np.log(np.where(valid, demand, 1.0))
+        weight = valid.astype(np.float64)
+        return pd.DataFrame({
+            'n': weight,
+            'sum_x': x * weight,
+            'sum_y': y * weight,
+            'sum_xy': x * y * weight,
+            'sum_xx': x * x * weight
+        }, index=df.index)
+    
+    @staticmethod
+    def _elasticity_from_stats(stats: pd.DataFrame, default_elasticity: float) -> pd.Series:
+        """由充分统计量计算回归斜率，样本不足或价格无变化时返回默认弹性系数"""
+        n = stats['n'].to_numpy()
+        numerator = n * stats['sum_xy'].to_numpy() - stats['sum_x'].to_numpy() * stats['sum_y'].to_numpy()
+        denominator = n * stats['sum_xx'].to_numpy() - stats['sum_x'].to_numpy() ** 2
+        
+        # 分母相对 n²Σx² 过小视为价格无变化
+        scale = np.maximum(n * stats['sum_xx'].to_numpy(), 1.0)
+        solvable = (n >= 2) & (denominator > 1e-12 * scale)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            elasticity = np.where(solvable, numerator / denominator, default_elasticity)
+        return pd.Series(elasticity, index=stats.index, name='elasticity')
     
     def optimize_price(self, cost_baseline: float, elasticity: float, current_price: float, current_demand: float, competitor_price: float = None) -> float:
         """计算最优定价
@@ -81,39 +177,75 @@ class PricingService:
         """
         logger.info(f"Optimizing price with cost_baseline={cost_baseline}, elasticity={elasticity}, current_price={current_price}")
         
-        # 定义收益函数（负的，因为我们要最小化）
-        def negative_revenue(price):
-            # 价格弹性公式：ΔQ/Q = ε * ΔP/P
-            # 需求变化率 = 弹性系数 * 价格变化率
-            price_change_rate = (price - current_price) / current_price
-            demand_change_rate = elasticity * price_change_rate
-            new_demand = current_demand * (1 + demand_change_rate)
-            
-            # 确保需求为正
-            new_demand = max(new_demand, 0)
-            
-            # 收益 = (价格 - 成本基准) * 需求
-            revenue = (price - cost_baseline) * new_demand
-            
-            # 返回负收益，因为scipy.optimize.minimize最小化目标函数
-            return -revenue
+        optimal_prices, _ = self.optimize_prices_batch(cost_baseline, elasticity, current_price, current_demand)
+        optimal_price = float(optimal_prices)
         
-        # 设置价格范围（成本基准到当前价格的2倍）
-        bounds = [(cost_baseline, current_price * 2)]
+        logger.info(f"Optimal price calculated: {optimal_price:.4f} 元/kWh")
+        return optimal_price
+    
+    def optimize_prices_batch(self, cost_baselines, elasticities, current_prices, current_demands) -> tuple:
+        """批量计算最优定价（闭式解）
         
-        # 初始猜测为当前价格
-        initial_guess = [current_price]
+        需求对价格是线性的：Q(p) = Q0 * (1 + ε * (p - P0) / P0)，收益 (p - c) * Q(p) 是关于 p 的二次函数，
+        最优价格为顶点 (c + P0 * (1 - 1/ε)) / 2 截断到 [c, 2 * P0]；需求截断为0或非凹时在区间端点取得最优。
+        参数可以是任意可广播形状的数组，如 (充电站数, 时段数)。
         
-        # 优化收益函数
-        result = minimize(negative_revenue, initial_guess, bounds=bounds)
+        Args:
+            cost_baselines: 成本基准
+            elasticities: 价格弹性系数
+            current_prices: 当前价格
+            current_demands: 当前需求
+            
+        Returns:
+            最优定价数组和对应的收益数组；当前价格非正时保持当前价格
+        """
+        cost, elasticity, price, demand = np.broadcast_arrays(*[
+            np.asarray(values, dtype=np.float64)
+            for values in (cost_baselines, elasticities, current_prices, current_demands)
+        ])
+        
+        # 价格范围（成本基准到当前价格的2倍）
+        lower = cost
+        upper = np.maximum(price * 2, cost)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Q(p) = intercept + slope * p
+            slope = demand * elasticity / price
+            intercept = demand - slope * price
+            # dR/dp = intercept + 2 * slope * p - slope * cost = 0
+            vertex = (slope * cost - intercept) / (2 * slope)
+        vertex = np.where(np.isfinite(vertex), vertex, lower)
+        
+        candidates = np.stack([np.clip(vertex, lower, upper), lower, upper])
+        revenues = self.predict_revenue_batch(candidates, cost, elasticity, price, demand)
+        best = np.argmax(revenues, axis=0)[np.newaxis]
+        optimal_prices = np.take_along_axis(candidates, best, axis=0)[0]
+        optimal_revenues = np.take_along_axis(revenues, best, axis=0)[0]
+        
+        valid = price > 0
+        optimal_prices = np.where(valid, optimal_prices, price)
+        optimal_revenues = np.where(valid, optimal_revenues, self.predict_revenue_batch(price, cost, elasticity, price, demand))
+        return optimal_prices, optimal_revenues
+    
+    def predict_revenue_batch(self, prices, cost_baselines, elasticities, current_prices, current_demands) -> np.ndarray:
+        """批量预测收益
         
-        if result.success:
-            optimal_price = result.x[0]
-            logger.info(f"Optimal price calculated: {optimal_price:.4f} 元/kWh")
-            return optimal_price
-        else:
-            logger.error(f"Price optimization failed: {result.message}")
-            return current_price
+        Args:
+            prices: 预测价格
+            cost_baselines: 成本基准
+            elasticities: 价格弹性系数
+            current_prices: 当前价格
+            current_demands: 当前需求
+            
+        Returns:
+            收益数组
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        current_prices = np.asarray(current_prices, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            price_change_rate = np.where(current_prices != 0, (prices - current_prices) / current_prices, 0.0)
+        new_demand = np.maximum(np.asarray(current_demands) * (1 + np.asarray(elasticities) * price_change_rate), 0)
+        return (prices - np.asarray(cost_baselines)) * new_demand
     
     def calculate_nash_equilibrium(self, station_cost: float, competitor_cost: float, station_elasticity: float, competitor_elasticity: float, cross_elasticity: float = 0.1) -> tuple:
         """计算纳什均衡价格
@@ -130,53 +262,88 @@ class PricingService:
         """
         logger.info("Calculating Nash equilibrium prices")
         
-        # 定义充电站的收益函数（负的）
-        def station_negative_revenue(prices):
-            station_price, competitor_price = prices
-            
-            # 计算充电站的需求
-            # 自身价格影响 + 竞品价格影响
-            station_demand = 1000 * (1 + station_elasticity * (station_price - 1) + cross_elasticity * (competitor_price - 1))
-            station_demand = max(station_demand, 0)
-            
-            # 充电站收益
-            station_revenue = (station_price - station_cost) * station_demand
-            
-            return -station_revenue
-        
-        # 定义竞品的收益函数（负的）
-        def competitor_negative_revenue(prices):
-            station_price, competitor_price = prices
-            
-            # 计算竞品的需求
-            competitor_demand = 1000 * (1 + competitor_elasticity * (competitor_price - 1) + cross_elasticity * (station_price - 1))
-            competitor_demand = max(competitor_demand, 0)
-            
-            # 竞品收益
-            competitor_revenue = (competitor_price - competitor_cost) * competitor_demand
-            
-            return -competitor_revenue
-        
-        # 联合收益函数（两者之和的负数）
-        def joint_negative_revenue(prices):
-            return station_negative_revenue(prices) + competitor_negative_revenue(prices)
-        
-        # 初始猜测价格
-        initial_guess = [1.0, 1.0]
+        result = self.solve_nash_equilibrium(
+            np.array([[station_elasticity, cross_elasticity], [cross_elasticity, competitor_elasticity]]),
+            np.array([station_cost, competitor_cost]),
+            upper_bounds=3.0
+        )
+        station_eq_price, competitor_eq_price = result['prices']
         
-        # 价格范围
-        bounds = [(station_cost, 3.0), (competitor_cost, 3.0)]
+        if result['converged']:
+            logger.info(f"Nash equilibrium prices calculated: station={station_eq_price:.4f}, competitor={competitor_eq_price:.4f}")
+        else:
+            logger.error(f"Nash equilibrium did not converge after {result['iterations']} iterations, residual={result['residual']:.2e}")
+        return float(station_eq_price), float(competitor_eq_price)
+    
+    def solve_nash_equilibrium(self, elasticity_matrix, costs, reference_prices=1.0, lower_bounds=None, upper_bounds=3.0, method: str = 'best_response', tol: float = 1e-8, max_iter: int = 1000, damping: float = 1.0) -> dict:
+        """N个充电站的纳什均衡价格
         
-        # 优化联合收益函数
-        result = minimize(joint_negative_revenue, initial_guess, bounds=bounds)
+        需求模型：Q_i = Q0_i * (1 + Σ_j E_ij * (p_j - r_j))，E 的对角线为自身价格弹性（应为负），
+        非对角线为交叉弹性。每个充电站最大化 (p_i - c_i) * Q_i，一阶条件是线性方程组
+        (E + diag(E)) p = diag(E) c - 1 + E r，与 Q0_i 无关。
         
-        if result.success:
-            station_eq_price, competitor_eq_price = result.x
-            logger.info(f"Nash equilibrium prices calculated: station={station_eq_price:.4f}, competitor={competitor_eq_price:.4f}")
-            return station_eq_price, competitor_eq_price
+        Args:
+            elasticity_matrix: N×N 弹性矩阵，可以是 numpy 数组或 scipy.sparse 矩阵
+            costs: 各充电站成本
+            reference_prices: 参考价格
+            lower_bounds: 价格下限，默认等于成本
+            upper_bounds: 价格上限
+            method: 'best_response' 投影最优反应迭代，'linear' 先直接求解线性方程组再投影修正
+            tol: 收敛阈值（相邻两次迭代价格的最大变化）
+            max_iter: 最大迭代次数
+            damping: 阻尼系数，(0, 1]，交叉弹性较大时减小以保证收敛
+            
+        Returns:
+            包含均衡价格 prices、迭代次数 iterations、残差 residual 和是否收敛 converged 的字典
+        """
+        if not hasattr(elasticity_matrix, 'tocsr'):
+            elasticity_matrix = np.asarray(elasticity_matrix, dtype=np.float64)
+        costs = np.asarray(costs, dtype=np.float64)
+        n_players = len(costs)
+        if elasticity_matrix.ndim != 2 or elasticity_matrix.shape != (n_players, n_players):
+            raise ValueError(f"Elasticity matrix shape {elasticity_matrix.shape} does not match {n_players} costs")
+        reference_prices = np.broadcast_to(np.asarray(reference_prices, dtype=np.float64), (n_players,))
+        lower = np.broadcast_to(np.asarray(costs if lower_bounds is None else lower_bounds, dtype=np.float64), (n_players,))
+        upper = np.maximum(np.broadcast_to(np.asarray(upper_bounds, dtype=np.float64), (n_players,)), lower)
+        
+        own = np.asarray(elasticity_matrix.diagonal(), dtype=np.float64)
+        if np.any(own >= 0):
+            raise ValueError("Own-price elasticities on the diagonal must be negative")
+        rhs = own * costs - 1 + elasticity_matrix @ reference_prices
+        
+        if method == 'linear':
+            if hasattr(elasticity_matrix, 'tocsr'):
+                from scipy.sparse import diags
+                from scipy.sparse.linalg import spsolve
+                prices = spsolve((elasticity_matrix + diags(own)).tocsc(), rhs)
+            else:
+                prices = np.linalg.solve(elasticity_matrix + np.diag(own), rhs)
+            prices = np.clip(prices, lower, upper)
+        elif method == 'best_response':
+            prices = np.clip(reference_prices.copy(), lower, upper)
         else:
-            logger.error(f"Nash equilibrium calculation failed: {result.message}")
-            return 1.0, 1.0
+            raise ValueError(f"Unsupported Nash equilibrium method: {method}")
+        
+        # 投影最优反应迭代：p_i = (rhs_i - Σ_{j≠i} E_ij p_j) / (2 E_ii)，再截断到价格范围
+        residual = np.inf
+        iterations = 0
+        for iterations in range(1, max_iter + 1):
+            best_response = (rhs - elasticity_matrix @ prices + own * prices) / (2 * own)
+            best_response = np.clip(best_response, lower, upper)
+            step = best_response - prices
+            residual = float(np.max(np.abs(step))) if n_players else 0.0
+            prices = prices + damping * step
+            if residual < tol:
+                break
+        
+        converged = residual < tol
+        logger.info(f"Nash equilibrium for {n_players} stations: method={method}, iterations={iterations}, residual={residual:.2e}, converged={converged}")
+        return {
+            'prices': prices,
+            'iterations': iterations,
+            'residual': residual,
+            'converged': converged
+        }
     
     def predict_revenue(self, price: float, cost_baseline: float, elasticity: float, current_price: float, current_demand: float) -> float:
         """预测收益
@@ -229,10 +396,16 @@ class PricingService:
             predicted_volume
         )
         
-        # 2. 计算价格弹性系数
+        # 2. 计算价格弹性系数：优先使用持久化的统计量，没有统计量时扫描输入数据
         price_column = config.get('price_column', 'electricity_price')
         demand_column = config.get('demand_column', 'charging_amount')
-        elasticity = self.calculate_price_elasticity(df, price_column, demand_column)
+        elasticity = None
+        if self.elasticity_store is not None and 'station_id' in config and (price_column, demand_column) == ('electricity_price', 'charging_amount'):
+            elasticity = self.elasticity_store.get_elasticity(config['station_id'])
+            if elasticity is not None:
+                logger.info(f"Price elasticity from stored statistics: {elasticity:.4f}")
+        if elasticity is None:
+            elasticity = self.calculate_price_elasticity(df, price_column, demand_column)
         
         # 3. 计算当前价格和需求
         current_price = df[price_column].mean()
@@ -248,19 +421,43 @@ class PricingService:
             competitor_price
         )
         
-        # 5. 如果有竞品价格，进行纳什均衡修正
+        # 5. 如果有竞品价格或竞争弹性矩阵，进行纳什均衡修正
+        # 均衡要求自身价格弹性为负，数据估计出非负弹性时改用默认弹性系数；求解失败时保留独家定价
+        game_elasticity = elasticity
+        if game_elasticity >= 0:
+            game_elasticity = config.get('default_elasticity', -0.5)
+            logger.warning(f"Estimated elasticity {elasticity:.4f} is not negative, using {game_elasticity} for the Nash equilibrium")
         if competitor_price is not None:
             competitor_cost = config.get('competitor_cost', cost_per_kwh + 0.05)
-            competitor_elasticity = config.get('competitor_elasticity', elasticity)
+            competitor_elasticity = config.get('competitor_elasticity', game_elasticity)
             cross_elasticity = config.get('cross_elasticity', 0.1)
             
-            optimal_price, _ = self.calculate_nash_equilibrium(
-                cost_baseline,
-                competitor_cost,
-                elasticity,
-                competitor_elasticity,
-                cross_elasticity
-            )
+            try:
+                optimal_price, _ = self.calculate_nash_equilibrium(
+                    cost_baseline,
+                    competitor_cost,
+                    game_elasticity,
+                    competitor_elasticity,
+                    cross_elasticity
+                )
+            except ValueError as e:
+                logger.warning(f"Nash equilibrium failed, keeping monopoly price {optimal_price:.4f}: {e}")
+        
+        # 多个竞争充电站：充电站为第0个参与者，求解N人纳什均衡
+        if config.get('elasticity_matrix') is not None:
+            try:
+                elasticity_matrix = np.array(config['elasticity_matrix'], dtype=np.float64)
+                elasticity_matrix[0, 0] = game_elasticity
+                costs = np.concatenate([[cost_baseline], config.get('competitor_costs', [])])
+                equilibrium = self.solve_nash_equilibrium(
+                    elasticity_matrix,
+                    costs,
+                    upper_bounds=config.get('price_upper_bound', 3.0),
+                    method=config.get('nash_method', 'best_response')
+                )
+                optimal_price = float(equilibrium['prices'][0])
+            except ValueError as e:
+                logger.warning(f"N-player Nash equilibrium failed, keeping price {optimal_price:.4f}: {e}")
         
         # 6. 预测收益
         predicted_revenue = self.predict_revenue(
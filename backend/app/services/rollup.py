@@ -0,0 +1,488 @@
+# 看板汇总表服务
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Delete, Insert, Update, delete, event, func, select, union
+
+from app.core.bulk_ops import build_upsert, execute_batches
+from app.core.config import settings
+from app.core.database import engine as default_engine
+from app.models.mysql import ActualData, HistoricalData, NetworkDailyRollup, PredictResult, StationDailyRollup, StationHourlyRollup
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 汇总指标及其合并方式
+SUM_COLUMNS = [
+    'charging_count', 'charging_amount_sum', 'charging_duration_sum', 'revenue_sum',
+    'actual_count', 'actual_amount_sum', 'actual_revenue_sum',
+    'predicted_count', 'predicted_amount_sum', 'predicted_revenue_sum',
+    'matched_count', 'abs_error_sum', 'squared_error_sum', 'ape_sum', 'ape_count'
+]
+MIN_COLUMNS = ['charging_amount_min', 'actual_amount_min']
+MAX_COLUMNS = ['charging_amount_max', 'actual_amount_max']
+METRIC_COLUMNS = SUM_COLUMNS + MIN_COLUMNS + MAX_COLUMNS
+COUNT_COLUMNS = {'charging_count', 'actual_count', 'predicted_count', 'matched_count', 'ape_count'}
+
+# 写入后需要更新汇总的表
+MAINTAINED_TABLES = ('historical_data', 'actual_data', 'predict_result')
+# 连接上已写入、尚未提交的 {充电站ID: [最早时间, 最晚时间]}
+PENDING_KEY = 'rollup_pending'
+
+HOUR = pd.Timedelta(hours=1)
+DAY = pd.Timedelta(days=1)
+
+
+class RollupService:
+    """看板汇总表服务
+
+    维护三张汇总表：充电站×小时（由 historical_data、actual_data、predict_result 的原始行计算）、
+    充电站×天（由小时汇总合并）和全网×天（由充电站日汇总合并）。计数和求和直接相加、最小/最大值再取最小/最大，
+    粗粒度汇总与直接扫描原始行的结果一致。
+
+    维护方式是重算受影响的时段而不是累加增量：导入服务的 upsert 可能覆盖已有的行，累加会重复计数。
+    写入时只把 (充电站, 时间范围) 标记为待更新，由后台线程稍作合并后按批重算，回填的历史范围用 rebuild 重建。
+    查询时把时间范围拆成整天部分和首尾不足一天的部分，分别从日汇总和小时汇总读取。
+    """
+
+    def __init__(self, engine=None, batch_days: Optional[int] = None, refresh_delay: Optional[float] = None):
+        self.engine = engine if engine is not None else default_engine
+        self.batch_days = batch_days or settings.ROLLUP_BATCH_DAYS
+        self.refresh_delay = refresh_delay if refresh_delay is not None else settings.ROLLUP_REFRESH_DELAY_SECONDS
+        self.stats = {'refreshes': 0, 'hours_refreshed': 0}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._worker = None
+
+    # 维护
+
+    def refresh(self, station_id: int, start, end) -> None:
+        """立即重算充电站在 [start, end) 范围内的小时、日汇总和对应日期的全网汇总
+
+        Args:
+            station_id: 充电站ID
+            start: 起始时间，向下取整到小时
+            end: 结束时间（不包含），向上取整到小时
+        """
+        day_start, day_end = self._refresh_station(station_id, start, end)
+        self._refresh_network(day_start, day_end)
+
+    def mark_dirty(self, station_id: int, start, end=None) -> None:
+        """标记待更新的范围，由后台线程或 flush 重算
+
+        Args:
+            station_id: 充电站ID
+            start: 起始时间
+            end: 结束时间（不包含），为空时只标记 start 所在的小时
+        """
+        start = pd.Timestamp(start).floor('h')
+        end = self._ceil(end, HOUR) if end is not None else start + HOUR
+        with self._lock:
+            self._pending[station_id] = _merge_intervals(self._pending.get(station_id, []) + [(start, end)])
+        self._wakeup.set()
+
+    def flush(self) -> int:
+        """重算所有待更新的范围
+
+        Returns:
+            重算的范围数
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        days = []
+        count = 0
+        for station_id, intervals in pending.items():
+            for start, end in intervals:
+                days.append(self._refresh_station(station_id, start, end))
+                count += 1
+        for day_start, day_end in _merge_intervals(days):
+            self._refresh_network(day_start, day_end)
+        if count:
+            logger.info(f"Refreshed {count} rollup ranges for {len(pending)} stations")
+        return count
+
+    def rebuild(self, start=None, end=None, station_ids: Optional[list] = None, background: bool = False) -> None:
+        """重建汇总，用于回填历史数据或首次建表
+
+        Args:
+            start: 起始时间，为空时从各充电站最早的数据开始
+            end: 结束时间（不包含），为空时到最新的数据为止
+            station_ids: 充电站ID列表，默认为有数据的全部充电站
+            background: 是否交给后台线程执行
+        """
+        bounds = self._station_bounds(station_ids)
+        for station_id, (first, last) in bounds.items():
+            range_start = pd.Timestamp(start) if start is not None else first
+            range_end = pd.Timestamp(end) if end is not None else last + HOUR
+            if range_end <= range_start:
+                continue
+            if background:
+                self.mark_dirty(station_id, range_start, range_end)
+            else:
+                self._refresh_station(station_id, range_start, range_end)
+        if background:
+            self.start()
+            logger.info(f"Queued rollup rebuild for {len(bounds)} stations")
+            return
+        if bounds:
+            day_start = min(pd.Timestamp(start) if start is not None else first for first, _ in bounds.values()).floor('D')
+            day_end = self._ceil(max(pd.Timestamp(end) if end is not None else last + HOUR for _, last in bounds.values()), DAY)
+            self._refresh_network(day_start, day_end)
+        logger.info(f"Rebuilt rollups for {len(bounds)} stations")
+
+    def start(self) -> None:
+        """启动后台更新线程"""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stopped.clear()
+        self._worker = threading.Thread(target=self._run, name='rollup-refresh', daemon=True)
+        self._worker.start()
+
+    def stop(self, flush: bool = True) -> None:
+        """停止后台更新线程
+
+        Args:
+            flush: 是否在停止前重算剩余的待更新范围
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+        if flush:
+            self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            if not self._wakeup.wait(timeout=1):
+                continue
+            # 等待一小段时间，合并连续写入标记的范围
+            self._stopped.wait(self.refresh_delay)
+            self._wakeup.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Rollup refresh failed: {e}", exc_info=e)
+
+    def _refresh_station(self, station_id: int, start, end) -> tuple:
+        """重算充电站的小时汇总和日汇总，返回受影响的日期范围"""
+        start = pd.Timestamp(start).floor('h')
+        end = self._ceil(end, HOUR)
+        batch = DAY * self.batch_days
+        batch_start = start
+        while batch_start < end:
+            batch_end = min(batch_start + batch, end)
+            with self.engine.begin() as connection:
+                hourly = self._aggregate_hourly(connection, station_id, batch_start, batch_end)
+                self._replace(connection, StationHourlyRollup, hourly, batch_start, batch_end, station_id)
+            batch_start = batch_end
+
+        day_start = start.floor('D')
+        day_end = self._ceil(end, DAY)
+        with self.engine.begin() as connection:
+            hourly = self._read(connection, StationHourlyRollup, day_start, day_end, station_id)
+            daily = _combine(hourly.assign(bucket=hourly['bucket'].dt.floor('D')), ['bucket'])
+            self._replace(connection, StationDailyRollup, daily, day_start, day_end, station_id)
+        self.stats['refreshes'] += 1
+        self.stats['hours_refreshed'] += int((end - start) / HOUR)
+        return day_start, day_end
+
+    def _refresh_network(self, day_start: pd.Timestamp, day_end: pd.Timestamp) -> None:
+        """由充电站日汇总重算全网日汇总"""
+        with self.engine.begin() as connection:
+            daily = self._read(connection, StationDailyRollup, day_start, day_end)
+            self._replace(connection, NetworkDailyRollup, _combine(daily, ['bucket']), day_start, day_end)
+
+    def _aggregate_hourly(self, connection, station_id: int, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """从原始行计算充电站在 [start, end) 内每小时的汇总指标"""
+        historical = pd.read_sql(
+            select(HistoricalData.time_slot, HistoricalData.charging_amount, HistoricalData.electricity_price, HistoricalData.charging_duration)
+            .where(HistoricalData.station_id == station_id, HistoricalData.time_slot >= start.to_pydatetime(), HistoricalData.time_slot < end.to_pydatetime()),
+            connection, parse_dates=['time_slot']
+        )
+        actual = pd.read_sql(
+            select(ActualData.time_slot, ActualData.actual_amount, ActualData.actual_price)
+            .where(ActualData.station_id == station_id, ActualData.time_slot >= start.to_pydatetime(), ActualData.time_slot < end.to_pydatetime()),
+            connection, parse_dates=['time_slot']
+        )
+        # 同一时段有多次预测时取平均
+        predicted = pd.read_sql(
+            select(
+                PredictResult.time_slot,
+                func.avg(PredictResult.predicted_amount_mean).label('predicted_amount'),
+                func.avg(PredictResult.revenue_prediction).label('predicted_revenue')
+            )
+            .where(PredictResult.station_id == station_id, PredictResult.time_slot >= start.to_pydatetime(), PredictResult.time_slot < end.to_pydatetime())
+            .group_by(PredictResult.time_slot),
+            connection, parse_dates=['time_slot']
+        )
+
+        parts = []
+        if not historical.empty:
+            historical['revenue'] = historical['charging_amount'] * historical['electricity_price']
+            parts.append(historical.groupby(historical['time_slot'].dt.floor('h')).agg(
+                charging_count=('charging_amount', 'size'),
+                charging_amount_sum=('charging_amount', 'sum'),
+                charging_amount_min=('charging_amount', 'min'),
+                charging_amount_max=('charging_amount', 'max'),
+                charging_duration_sum=('charging_duration', 'sum'),
+                revenue_sum=('revenue', 'sum')
+            ))
+        if not actual.empty:
+            actual['revenue'] = actual['actual_amount'] * actual['actual_price']
+            parts.append(actual.groupby(actual['time_slot'].dt.floor('h')).agg(
+                actual_count=('actual_amount', 'size'),
+                actual_amount_sum=('actual_amount', 'sum'),
+                actual_amount_min=('actual_amount', 'min'),
+                actual_amount_max=('actual_amount', 'max'),
+                actual_revenue_sum=('revenue', 'sum')
+            ))
+        if not predicted.empty:
+            parts.append(predicted.groupby(predicted['time_slot'].dt.floor('h')).agg(
+                predicted_count=('predicted_amount', 'size'),
+                predicted_amount_sum=('predicted_amount', 'sum'),
+                predicted_revenue_sum=('predicted_revenue', 'sum')
+            ))
+            if not actual.empty:
+                matched = predicted.merge(actual.groupby('time_slot', as_index=False)['actual_amount'].sum(), on='time_slot')
+                if not matched.empty:
+                    error = (matched['predicted_amount'] - matched['actual_amount']).abs()
+                    positive = matched['actual_amount'] > 0
+                    matched = matched.assign(
+                        abs_error=error,
+                        squared_error=error ** 2,
+                        ape=np.where(positive, error / matched['actual_amount'].where(positive, 1), 0.0),
+                        has_ape=positive.astype(int)
+                    )
+                    parts.append(matched.groupby(matched['time_slot'].dt.floor('h')).agg(
+                        matched_count=('abs_error', 'size'),
+                        abs_error_sum=('abs_error', 'sum'),
+                        squared_error_sum=('squared_error', 'sum'),
+                        ape_sum=('ape', 'sum'),
+                        ape_count=('has_ape', 'sum')
+                    ))
+
+        if not parts:
+            return _empty_rollup()
+        hourly = pd.concat(parts, axis=1)
+        hourly.index.name = 'bucket'
+        hourly = hourly.reindex(columns=METRIC_COLUMNS).reset_index()
+        hourly[SUM_COLUMNS] = hourly[SUM_COLUMNS].fillna(0)
+        return hourly
+
+    def _replace(self, connection, model, rows: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp, station_id: Optional[int] = None) -> None:
+        """替换汇总表在 [start, end) 内的行，范围内已没有数据的时段被删除"""
+        table = model.__table__
+        stmt = delete(table).where(table.c.bucket >= start.to_pydatetime(), table.c.bucket < end.to_pydatetime())
+        if station_id is not None:
+            stmt = stmt.where(table.c.station_id == station_id)
+        connection.execute(stmt)
+        if rows.empty:
+            return
+        keys = ['station_id', 'bucket'] if station_id is not None else ['bucket']
+        upsert = build_upsert(table, connection.dialect.name, keys, METRIC_COLUMNS)
+        execute_batches(connection, upsert, _to_records(rows, station_id))
+
+    def _read(self, connection, model, start: pd.Timestamp, end: pd.Timestamp, station_id: Optional[int] = None) -> pd.DataFrame:
+        """读取汇总表在 [start, end) 内的行"""
+        columns = [model.bucket] + [getattr(model, c) for c in METRIC_COLUMNS]
+        query = select(*columns).where(model.bucket >= start.to_pydatetime(), model.bucket < end.to_pydatetime())
+        if station_id is not None:
+            query = query.where(model.station_id == station_id)
+        return pd.read_sql(query.order_by(model.bucket), connection, parse_dates=['bucket'])
+
+    def _station_bounds(self, station_ids: Optional[list]) -> dict:
+        """各充电站原始数据的最早和最晚时间"""
+        parts = []
+        for model in (HistoricalData, ActualData, PredictResult):
+            query = select(model.station_id, func.min(model.time_slot).label('first'), func.max(model.time_slot).label('last')).group_by(model.station_id)
+            if station_ids is not None:
+                query = query.where(model.station_id.in_(station_ids))
+            parts.append(query)
+        with self.engine.connect() as connection:
+            bounds = pd.read_sql(union(*parts), connection, parse_dates=['first', 'last'])
+        bounds = bounds.groupby('station_id').agg(first=('first', 'min'), last=('last', 'max'))
+        return {int(station_id): (row.first.floor('h'), row.last.floor('h')) for station_id, row in bounds.iterrows()}
+
+    @staticmethod
+    def _ceil(value, unit: pd.Timedelta) -> pd.Timestamp:
+        value = pd.Timestamp(value)
+        return value.ceil('h') if unit == HOUR else value.ceil('D')
+
+    # 查询
+
+    def route(self, start, end) -> list:
+        """把查询范围拆成从最粗粒度汇总读取的片段
+
+        Args:
+            start: 起始时间，向下取整到小时
+            end: 结束时间（不包含），向上取整到小时
+
+        Returns:
+            [(粒度, 片段起点, 片段终点)]，粒度为 'day' 或 'hour'
+        """
+        start = pd.Timestamp(start).floor('h')
+        end = self._ceil(end, HOUR)
+        first_day = self._ceil(start, DAY)
+        last_day = end.floor('D')
+        if first_day >= last_day:
+            return [('hour', start, end)]
+        segments = []
+        if start < first_day:
+            segments.append(('hour', start, first_day))
+        segments.append(('day', first_day, last_day))
+        if last_day < end:
+            segments.append(('hour', last_day, end))
+        return segments
+
+    def series(self, start, end, station_id: Optional[int] = None, granularity: str = 'day') -> pd.DataFrame:
+        """看板时间序列
+
+        Args:
+            start: 起始时间
+            end: 结束时间（不包含）
+            station_id: 充电站ID，为空时查询全网
+            granularity: 'day' 或 'hour'
+
+        Returns:
+            每个时段的汇总指标和派生指标（均值、MAE、RMSE、MAPE）
+        """
+        if granularity not in ('day', 'hour'):
+            raise ValueError(f"Unsupported granularity: {granularity}")
+        segments = self.route(start, end) if granularity == 'day' else [('hour', pd.Timestamp(start).floor('h'), self._ceil(end, HOUR))]
+        frames = []
+        with self.engine.connect() as connection:
+            for level, segment_start, segment_end in segments:
+                if level == 'day':
+                    model = StationDailyRollup if station_id is not None else NetworkDailyRollup
+                    frames.append(self._read(connection, model, segment_start, segment_end, station_id))
+                else:
+                    frames.append(self._read(connection, StationHourlyRollup, segment_start, segment_end, station_id))
+        rows = pd.concat(frames, ignore_index=True) if frames else _empty_rollup()
+        if granularity == 'day':
+            rows = rows.assign(bucket=rows['bucket'].dt.floor('D'))
+        # 全网的小时汇总需要合并各充电站
+        return with_derived_metrics(_combine(rows, ['bucket']))
+
+    def summary(self, start, end, station_id: Optional[int] = None) -> dict:
+        """看板范围合计
+
+        Args:
+            start: 起始时间
+            end: 结束时间（不包含）
+            station_id: 充电站ID，为空时查询全网
+
+        Returns:
+            汇总指标和派生指标
+        """
+        rows = self.series(start, end, station_id, granularity='day')
+        totals = _combine(rows.assign(bucket=0), ['bucket'])
+        if totals.empty:
+            totals = pd.DataFrame([{c: 0 for c in SUM_COLUMNS}], columns=METRIC_COLUMNS)
+        result = with_derived_metrics(totals).iloc[0].drop(labels=['bucket'], errors='ignore').to_dict()
+        return {k: (None if pd.isna(v) else (int(v) if k in COUNT_COLUMNS else float(v))) for k, v in result.items()}
+
+
+def with_derived_metrics(rows: pd.DataFrame) -> pd.DataFrame:
+    """由汇总指标计算均值和预测准确度"""
+    rows = rows.copy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rows['charging_amount_avg'] = rows['charging_amount_sum'] / rows['charging_count'].replace(0, np.nan)
+        rows['actual_amount_avg'] = rows['actual_amount_sum'] / rows['actual_count'].replace(0, np.nan)
+        matched = rows['matched_count'].replace(0, np.nan)
+        rows['mae'] = rows['abs_error_sum'] / matched
+        rows['rmse'] = np.sqrt(rows['squared_error_sum'] / matched)
+        rows['mape'] = rows['ape_sum'] / rows['ape_count'].replace(0, np.nan)
+    return rows
+
+
+def register_maintenance(service: RollupService, engine=None, tables: tuple = MAINTAINED_TABLES) -> None:
+    """在数据库引擎上注册写入监听，提交写入时把涉及的 (充电站, 时间范围) 标记为待更新
+
+    ORM 会话和 Core 批量写入（如数据导入服务）都会经过引擎。无法从参数确定充电站和时间的写入（如按条件更新）
+    不会被标记，需要调用 rebuild 重建对应范围。
+
+    Args:
+        service: 汇总表服务
+        engine: 数据库引擎，默认使用应用的引擎
+        tables: 监听的表名
+    """
+    engine = engine if engine is not None else default_engine
+    pending_key = (PENDING_KEY, id(service))
+
+    @event.listens_for(engine, 'after_execute')
+    def after_execute(conn, clauseelement, multiparams, params, execution_options, result):
+        if not isinstance(clauseelement, (Insert, Update, Delete)) or clauseelement.table.name not in tables:
+            return
+        if isinstance(multiparams, dict):
+            multiparams = [multiparams]
+        rows = list(multiparams or []) + ([params] if params else [])
+        if not rows and isinstance(clauseelement, Insert):
+            rows = [clauseelement.compile().params]
+        pending = conn.info.setdefault(pending_key, {})
+        for row in rows:
+            if not isinstance(row, dict) or row.get('station_id') is None or row.get('time_slot') is None:
+                logger.warning(f"Write to {clauseelement.table.name} without station_id/time_slot parameters, rollups need a rebuild")
+                return
+            time_slot = row['time_slot']
+            station_id = int(row['station_id'])
+            if station_id in pending:
+                first, last = pending[station_id]
+                pending[station_id] = (min(first, time_slot), max(last, time_slot))
+            else:
+                pending[station_id] = (time_slot, time_slot)
+
+    @event.listens_for(engine, 'commit')
+    def on_commit(conn):
+        for station_id, (first, last) in conn.info.pop(pending_key, {}).items():
+            service.mark_dirty(station_id, first, pd.Timestamp(last).floor('h') + HOUR)
+
+    @event.listens_for(engine, 'rollback')
+    def on_rollback(conn):
+        conn.info.pop(pending_key, None)
+
+
+def _combine(rows: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """按键合并汇总行：求和列相加，最小/最大值列取最小/最大"""
+    if rows.empty:
+        return _empty_rollup()
+    aggregations = {**{c: 'sum' for c in SUM_COLUMNS}, **{c: 'min' for c in MIN_COLUMNS}, **{c: 'max' for c in MAX_COLUMNS}}
+    return rows.groupby(keys, as_index=False).agg(aggregations)
+
+
+def _empty_rollup() -> pd.DataFrame:
+    return pd.DataFrame({'bucket': pd.Series(dtype='datetime64[ns]'), **{c: pd.Series(dtype=float) for c in METRIC_COLUMNS}})
+
+
+def _merge_intervals(intervals: list) -> list:
+    """合并重叠或相邻的区间"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _to_records(rows: pd.DataFrame, station_id: Optional[int]) -> list:
+    """转换为 executemany 参数，计数列转为整数，NaN 转为 None"""
+    records = []
+    for row in rows.itertuples(index=False):
+        record = {'bucket': pd.Timestamp(row.bucket).to_pydatetime()}
+        if station_id is not None:
+            record['station_id'] = station_id
+        for column in METRIC_COLUMNS:
+            value = getattr(row, column)
+            if pd.isna(value):
+                record[column] = None
+            else:
+                record[column] = int(value) if column in COUNT_COLUMNS else float(value)
+        records.append(record)
+    return records
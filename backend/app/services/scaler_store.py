@@ -0,0 +1,139 @@
+# 标准化器存储服务
+import copy
+import hashlib
+import os
+import threading
+from typing import Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ScalerStore:
+    """按 (充电站, 列集合) 命名的持久化标准化器
+
+    标准化器可以整体拟合，也可以随新数据块 partial_fit 增量更新；预测时只做 transform，
+    不会在全部历史数据上重新拟合。每次更新都在副本上完成后再替换引用，已发布的标准化器不再被修改，
+    并发请求读取时无需加锁。充电站ID不为空的标准化器以 joblib 文件保存在模型目录下。
+    """
+
+    def __init__(self, root_dir: Optional[str] = None):
+        self.root_dir = root_dir or settings.SCALER_STORE_DIR
+        self._scalers = {}
+        self._lock = threading.Lock()
+
+    def get(self, station_id: Optional[int], columns: list) -> Optional[MinMaxScaler]:
+        """获取已拟合的标准化器，内存中没有时从磁盘加载
+
+        Args:
+            station_id: 充电站ID
+            columns: 列名列表
+
+        Returns:
+            标准化器，不存在时返回None
+        """
+        scaler = self._scalers.get(self._key(station_id, columns))
+        if scaler is not None or station_id is None:
+            return scaler
+        with self._lock:
+            return self._load(station_id, columns)
+
+    def fit(self, station_id: Optional[int], columns: list, df: pd.DataFrame, chunk_rows: Optional[int] = None) -> MinMaxScaler:
+        """在数据上重新拟合标准化器并替换已有的，指定 chunk_rows 时分块拟合（结果与整体拟合相同）"""
+        values = self._fit_values(station_id, columns, df)
+        scaler = MinMaxScaler()
+        for start in range(0, len(values), chunk_rows or len(values)):
+            scaler.partial_fit(values.iloc[start:start + chunk_rows] if chunk_rows else values)
+        with self._lock:
+            self._publish(station_id, columns, scaler)
+        logger.info(f"Fitted scaler for station {station_id} on {len(df)} rows")
+        return scaler
+
+    def partial_fit(self, station_id: Optional[int], columns: list, df: pd.DataFrame, chunk_rows: Optional[int] = None) -> MinMaxScaler:
+        """用新数据增量更新标准化器，没有已拟合的标准化器时新建"""
+        values = self._fit_values(station_id, columns, df)
+        with self._lock:
+            current = self._load(station_id, columns)
+            scaler = copy.deepcopy(current) if current is not None else MinMaxScaler()
+            for start in range(0, len(values), chunk_rows or len(values)):
+                scaler.partial_fit(values.iloc[start:start + chunk_rows] if chunk_rows else values)
+            self._publish(station_id, columns, scaler)
+        logger.info(f"Updated scaler for station {station_id} with {len(df)} rows ({int(scaler.n_samples_seen_)} seen)")
+        return scaler
+
+    def transform(self, station_id: Optional[int], columns: list, df: pd.DataFrame) -> np.ndarray:
+        """只用已拟合的标准化器转换数据"""
+        return self.require(station_id, columns).transform(df[columns])
+
+    def inverse_transform(self, station_id: Optional[int], columns: list, values: np.ndarray, column: Optional[str] = None) -> np.ndarray:
+        """反标准化
+
+        Args:
+            station_id: 充电站ID
+            columns: 标准化器的列名列表
+            values: 标准化后的值
+            column: 指定时 values 只包含这一列（如LSTM预测的目标列）
+
+        Returns:
+            原始尺度的值
+        """
+        scaler = self.require(station_id, columns)
+        if column is None:
+            return scaler.inverse_transform(values)
+        j = list(columns).index(column)
+        return (np.asarray(values) - scaler.min_[j]) / scaler.scale_[j]
+
+    def require(self, station_id: Optional[int], columns: list) -> MinMaxScaler:
+        """获取已拟合的标准化器，不存在时抛出 ValueError"""
+        scaler = self.get(station_id, columns)
+        if scaler is None:
+            raise ValueError(f"No fitted scaler for station {station_id} columns {list(columns)}")
+        return scaler
+
+    @staticmethod
+    def _fit_values(station_id: Optional[int], columns: list, df: pd.DataFrame) -> pd.DataFrame:
+        """选出拟合用的列（只选一次，分块时不重复复制整表），空数据不拟合，避免发布未拟合的标准化器"""
+        if df.empty:
+            raise ValueError(f"Cannot fit scaler for station {station_id} columns {list(columns)} on empty data")
+        return df[columns]
+
+    def _load(self, station_id: Optional[int], columns: list) -> Optional[MinMaxScaler]:
+        """从内存或磁盘获取标准化器，调用方需持有锁"""
+        key = self._key(station_id, columns)
+        if key in self._scalers or station_id is None:
+            return self._scalers.get(key)
+        path = self._path(station_id, columns)
+        if not os.path.exists(path):
+            return None
+        stored = joblib.load(path)
+        if stored['columns'] != list(columns):
+            return None
+        self._scalers[key] = stored['scaler']
+        logger.info(f"Loaded persisted scaler for station {station_id} columns {list(columns)}")
+        return stored['scaler']
+
+    def _publish(self, station_id: Optional[int], columns: list, scaler: MinMaxScaler) -> None:
+        """替换内存中的标准化器并持久化，调用方需持有锁"""
+        self._scalers[self._key(station_id, columns)] = scaler
+        if station_id is None:
+            return
+        path = self._path(station_id, columns)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        joblib.dump({'columns': list(columns), 'scaler': scaler}, tmp_path)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _key(station_id: Optional[int], columns: list) -> tuple:
+        return station_id, tuple(columns)
+
+    def _path(self, station_id: int, columns: list) -> str:
+        digest = hashlib.sha1('\x1f'.join(columns).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.root_dir, f'station_{station_id}', f'{digest}.joblib')
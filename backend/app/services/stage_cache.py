@@ -0,0 +1,128 @@
+# 预处理阶段缓存服务
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Optional
+
+import pandas as pd
+
+from app.core.columnar import SCHEMA_FILE, directory_size, read_columnar, write_columnar
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_COLUMN = '__stage_cache_index__'
+
+
+class StageCache:
+    """按内容寻址的预处理阶段缓存
+
+    每个阶段的输出以 (上一阶段键, 阶段名, 阶段参数) 的哈希为键、以列式格式保存在磁盘上，
+    第一个阶段的上一阶段键是输入数据指纹。只修改后面阶段的参数时，前面阶段的键不变，
+    重跑时可以直接从最后一个未变化阶段的缓存输出继续。超过总大小上限时按最近访问时间淘汰。
+    """
+
+    def __init__(self, root_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root_dir = root_dir or settings.STAGE_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else settings.STAGE_CACHE_MAX_BYTES
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def stage_key(previous_key: str, stage: str, params: dict) -> str:
+        """计算阶段输出的缓存键
+
+        Args:
+            previous_key: 上一阶段的缓存键或输入数据指纹
+            stage: 阶段名
+            params: 阶段参数
+
+        Returns:
+            十六进制缓存键
+        """
+        payload = json.dumps({'previous': previous_key, 'stage': stage, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def contains(self, key: str) -> bool:
+        """缓存中是否有完整的条目"""
+        return os.path.exists(os.path.join(self._entry_dir(key), SCHEMA_FILE))
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """读取缓存的阶段输出，数值列以写时复制方式内存映射
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            阶段输出，未命中时返回None
+        """
+        if not self.contains(key):
+            self.stats['misses'] += 1
+            return None
+        entry = self._entry_dir(key)
+        df = read_columnar(entry)
+        if INDEX_COLUMN in df.columns:
+            df = df.set_index(INDEX_COLUMN)
+            df.index.name = None
+        # 以 schema.json 的修改时间作为最近访问时间
+        os.utime(os.path.join(entry, SCHEMA_FILE))
+        self.stats['hits'] += 1
+        return df
+
+    def record_miss(self) -> None:
+        """记录一次未命中（例如所有阶段的键都不在缓存中）"""
+        self.stats['misses'] += 1
+
+    def put(self, key: str, df: pd.DataFrame, stage: Optional[str] = None) -> None:
+        """保存阶段输出并按大小上限淘汰
+
+        Args:
+            key: 缓存键
+            df: 阶段输出
+            stage: 阶段名，写入元数据便于排查
+        """
+        os.makedirs(self.root_dir, exist_ok=True)
+        frame = df
+        if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+            # 保留删除行等操作后的非连续索引
+            frame = df.reset_index(drop=True)
+            frame.insert(0, INDEX_COLUMN, df.index.to_numpy())
+        entry = self._entry_dir(key)
+        size = write_columnar(frame, entry, metadata={'stage': stage, 'created_at': time.time()})
+        logger.info(f"Cached {stage} stage output ({size / 1024 ** 2:.1f} MB)")
+        self.evict(keep=entry)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """按最近访问时间淘汰条目，直到总大小不超过上限
+
+        Args:
+            keep: 不淘汰的条目目录（例如刚写入的条目）
+        """
+        if not os.path.isdir(self.root_dir):
+            return
+        entries = []
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            schema_path = os.path.join(path, SCHEMA_FILE)
+            if os.path.isdir(path) and os.path.exists(schema_path):
+                entries.append((os.path.getmtime(schema_path), directory_size(path), path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            self.stats['evictions'] += 1
+            logger.info(f"Evicted stage cache entry {os.path.basename(path)}")
+
+    def clear(self) -> None:
+        """清空缓存"""
+        shutil.rmtree(self.root_dir, ignore_errors=True)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root_dir, key)
@@ -0,0 +1,342 @@
+# 在线统计与异常值检测服务
+import json
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WelfordStats:
+    """Welford 在线均值/方差
+
+    逐条或按批合并（Chan 并行合并公式），数值稳定，不需要保留历史数据。
+    """
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, values: np.ndarray) -> None:
+        """合并一批观测值（忽略缺失值）"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        batch_count = len(values)
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        self.mean += delta * batch_count / total
+        self.m2 += batch_m2 + delta * delta * self.count * batch_count / total
+        self.count = total
+
+    @property
+    def variance(self) -> float:
+        """样本方差（ddof=1）"""
+        return self.m2 / (self.count - 1) if self.count > 1 else float('nan')
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+
+
+class P2Quantile:
+    """P² 分位数估计（Jain & Chlamtac）
+
+    只保存5个标记点，每条观测 O(1) 更新，内存固定。可以用一批历史数据的精确分位数直接初始化。
+    """
+
+    def __init__(self, p: float):
+        self.p = p
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+        self.heights = []
+        self.positions = []
+        self.desired = []
+
+    def update(self, values: np.ndarray) -> None:
+        """逐条合并观测值（忽略缺失值）"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        if not self.positions and len(self.heights) + len(values) >= 5:
+            # 标记点尚未初始化：用已缓冲的值和这批数据的精确分位数初始化
+            self._initialize(np.concatenate([np.asarray(self.heights, dtype=np.float64), values]))
+            return
+        for x in values.tolist():
+            self._add(x)
+
+    def _initialize(self, values: np.ndarray) -> None:
+        n = len(values)
+        probs = np.asarray(self.increments)
+        self.heights = np.quantile(values, probs).tolist()
+        positions = np.round(1 + (n - 1) * probs).astype(int)
+        # 标记点位置必须严格递增
+        for i in range(1, 5):
+            positions[i] = max(positions[i], positions[i - 1] + 1)
+        for i in range(3, -1, -1):
+            positions[i] = min(positions[i], positions[i + 1] - 1)
+        self.positions = positions.tolist()
+        self.desired = (1 + (n - 1) * probs).tolist()
+
+    def _add(self, x: float) -> None:
+        if not self.positions:
+            self.heights.append(x)
+            if len(self.heights) == 5:
+                self._initialize(np.asarray(self.heights))
+            return
+
+        q, n = self.heights, self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] += d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    @property
+    def value(self) -> float:
+        """当前分位数估计"""
+        if self.positions:
+            return self.heights[2]
+        if self.heights:
+            return float(np.quantile(self.heights, self.p))
+        return float('nan')
+
+    def to_dict(self) -> dict:
+        return {'p': self.p, 'heights': list(self.heights), 'positions': list(self.positions), 'desired': list(self.desired)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'P2Quantile':
+        sketch = cls(data['p'])
+        sketch.heights = list(data['heights'])
+        sketch.positions = list(data['positions'])
+        sketch.desired = list(data['desired'])
+        return sketch
+
+
+class ColumnStats:
+    """单个 (充电站, 列[, 小时]) 的在线统计：Welford 均值/方差和 Q1/Q3 分位数估计"""
+
+    def __init__(self):
+        self.moments = WelfordStats()
+        self.q1 = P2Quantile(0.25)
+        self.q3 = P2Quantile(0.75)
+
+    def update(self, values: np.ndarray) -> None:
+        self.moments.update(values)
+        self.q1.update(values)
+        self.q3.update(values)
+
+    def bounds(self, method: str, threshold: float, iqr_factor: float) -> tuple:
+        """当前的异常值上下界"""
+        if method == 'zscore':
+            std = self.moments.std
+            return self.moments.mean - threshold * std, self.moments.mean + threshold * std
+        if method == 'iqr':
+            q1, q3 = self.q1.value, self.q3.value
+            return q1 - iqr_factor * (q3 - q1), q3 + iqr_factor * (q3 - q1)
+        raise ValueError(f"Unsupported outlier detection method: {method}")
+
+    def to_dict(self) -> dict:
+        return {'moments': self.moments.to_dict(), 'q1': self.q1.to_dict(), 'q3': self.q3.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ColumnStats':
+        stats = cls()
+        stats.moments = WelfordStats(**data['moments'])
+        stats.q1 = P2Quantile.from_dict(data['q1'])
+        stats.q3 = P2Quantile.from_dict(data['q3'])
+        return stats
+
+
+class StreamingOutlierDetector:
+    """按充电站维护在线统计的异常值检测器
+
+    每个 (充电站, 列[, 小时]) 保存 Welford 均值/方差和 P² 分位数估计，新数据只需与已有界限比较
+    并合并进统计量，每行 O(1)，不需要重新读取历史数据。统计量不足 min_count 条时不做标记。
+    """
+
+    def __init__(self, columns: list, method: str = 'zscore', threshold: float = 3.0, iqr_factor: float = 1.5, min_count: int = 30, by_hour: bool = False, station_column: str = 'station_id', time_column: str = 'time_slot'):
+        self.columns = list(columns)
+        self.method = method
+        self.threshold = threshold
+        self.iqr_factor = iqr_factor
+        self.min_count = min_count
+        self.by_hour = by_hour
+        self.station_column = station_column
+        self.time_column = time_column
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def fit(self, df: pd.DataFrame) -> 'StreamingOutlierDetector':
+        """用历史数据初始化统计量（清空已有状态）
+
+        Args:
+            df: 历史数据，需包含充电站列、检测列，按小时统计时还需时间列
+
+        Returns:
+            检测器本身
+        """
+        with self._lock:
+            self.stats = {}
+        self.partial_fit(df)
+        logger.info(f"Initialized streaming outlier statistics for {len(self.stats)} groups from {len(df)} rows")
+        return self
+
+    def partial_fit(self, df: pd.DataFrame) -> None:
+        """把新数据合并进统计量
+
+        Args:
+            df: 新数据
+        """
+        if df.empty:
+            return
+        with self._lock:
+            for group_key, rows in df.groupby(self._group_keys(df), sort=False):
+                group_key = self._normalize_key(group_key)
+                for column in self.columns:
+                    key = self._stats_key(group_key, column)
+                    if key not in self.stats:
+                        self.stats[key] = ColumnStats()
+                    self.stats[key].update(rows[column].to_numpy(dtype=np.float64))
+
+    def flag(self, df: pd.DataFrame, update: bool = True, absorb_outliers: bool = False) -> pd.DataFrame:
+        """标记新数据中的异常值
+
+        先用已有统计量的界限判断，再（可选）把新数据合并进统计量。
+
+        Args:
+            df: 新数据
+            update: 判断后是否更新统计量
+            absorb_outliers: 更新时是否也合并被标记为异常的行，默认不合并以免污染统计量
+
+        Returns:
+            与 df 同索引的 {列名}_is_outlier 布尔数据
+        """
+        flags = np.zeros((len(df), len(self.columns)), dtype=bool)
+        if df.empty:
+            return pd.DataFrame(flags, index=df.index, columns=[f'{c}_is_outlier' for c in self.columns])
+
+        with self._lock:
+            for group_key, positions in df.groupby(self._group_keys(df), sort=False).indices.items():
+                group_key = self._normalize_key(group_key)
+                for j, column in enumerate(self.columns):
+                    stats = self.stats.get(self._stats_key(group_key, column))
+                    if stats is None or stats.moments.count < self.min_count:
+                        continue
+                    low, high = stats.bounds(self.method, self.threshold, self.iqr_factor)
+                    values = df[column].to_numpy(dtype=np.float64)[positions]
+                    flags[positions, j] = (values < low) | (values > high)
+
+        result = pd.DataFrame(flags, index=df.index, columns=[f'{c}_is_outlier' for c in self.columns])
+        if update:
+            if absorb_outliers:
+                self.partial_fit(df)
+            else:
+                self.partial_fit_unflagged(df, result)
+
+        logger.info(f"Flagged outliers per column: {dict(zip(self.columns, flags.sum(axis=0).tolist()))}")
+        return result
+
+    def partial_fit_unflagged(self, df: pd.DataFrame, flags: pd.DataFrame) -> None:
+        """只把各列未被标记为异常的值合并进统计量
+
+        Args:
+            df: 新数据
+            flags: flag 返回的标记（与 df 同索引）
+        """
+        masked = df.copy()
+        for column in self.columns:
+            masked[column] = np.where(flags[f'{column}_is_outlier'].to_numpy(), np.nan, df[column].to_numpy(dtype=np.float64))
+        self.partial_fit(masked)
+
+    def bounds(self, station_id: int, column: str, hour: Optional[int] = None) -> Optional[tuple]:
+        """某个充电站（及小时）某列当前的异常值上下界，统计量不足时返回 None"""
+        group_key = (station_id, hour) if self.by_hour else (station_id,)
+        stats = self.stats.get(self._stats_key(group_key, column))
+        if stats is None or stats.moments.count < self.min_count:
+            return None
+        return stats.bounds(self.method, self.threshold, self.iqr_factor)
+
+    def save(self, path: str) -> None:
+        """保存检测器状态为JSON"""
+        with self._lock:
+            state = {
+                'config': {
+                    'columns': self.columns,
+                    'method': self.method,
+                    'threshold': self.threshold,
+                    'iqr_factor': self.iqr_factor,
+                    'min_count': self.min_count,
+                    'by_hour': self.by_hour,
+                    'station_column': self.station_column,
+                    'time_column': self.time_column
+                },
+                'stats': [{'key': list(key), 'stats': stats.to_dict()} for key, stats in self.stats.items()]
+            }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'StreamingOutlierDetector':
+        """从JSON加载检测器状态"""
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        detector = cls(**state['config'])
+        detector.stats = {tuple(item['key']): ColumnStats.from_dict(item['stats']) for item in state['stats']}
+        return detector
+
+    def _group_keys(self, df: pd.DataFrame) -> list:
+        keys = [df[self.station_column]]
+        if self.by_hour:
+            keys.append(pd.to_datetime(df[self.time_column]).dt.hour.rename('hour'))
+        return keys
+
+    @staticmethod
+    def _normalize_key(group_key) -> tuple:
+        if not isinstance(group_key, tuple):
+            group_key = (group_key,)
+        return tuple(int(k) for k in group_key)
+
+    @staticmethod
+    def _stats_key(group_key: tuple, column: str) -> tuple:
+        return (*group_key, column)
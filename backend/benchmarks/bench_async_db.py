@@ -0,0 +1,147 @@
+# 同步/异步数据库访问并发基准测试
+# 运行方式（在 backend 目录下）：python -m benchmarks.bench_async_db --requests 400 --concurrency 50
+# 使用临时 SQLite 文件（同步 sqlite3 / 异步 aiosqlite），每次查询通过 SQL 函数 server_latency()
+# 在数据库线程中等待 --latency-ms 毫秒，模拟 MySQL 的网络往返和服务端耗时
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base, async_database_url
+from app.models.mysql import HistoricalData
+
+
+def add_latency_function(engine, latency_ms: float) -> None:
+    """在每个连接上注册模拟数据库耗时的 SQL 函数"""
+    def server_latency(value):
+        time.sleep(latency_ms / 1000)
+        return value
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function('server_latency', 1, server_latency)
+
+
+def seed(engine, stations: int, hours: int) -> None:
+    Base.metadata.create_all(engine, tables=[HistoricalData.__table__])
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(insert(HistoricalData), [
+            {
+                'station_id': station_id,
+                'time_slot': start + timedelta(hours=h),
+                'charging_amount': float(h % 50),
+                'electricity_price': 1.0,
+                'charging_duration': 2.0
+            }
+            for station_id in range(1, stations + 1)
+            for h in range(hours)
+        ])
+
+
+def dashboard_query(station_id: int):
+    """看板请求：充电站最近24小时的充电量"""
+    # 非关联标量子查询只执行一次，每次查询等待一次模拟耗时
+    latency = select(func.server_latency(station_id)).scalar_subquery()
+    return (
+        select(HistoricalData.time_slot, HistoricalData.charging_amount)
+        .where(HistoricalData.station_id == latency)
+        .order_by(HistoricalData.time_slot.desc())
+        .limit(24)
+    )
+
+
+async def run_blocking(session_factory, args) -> None:
+    """async 路由中直接调用同步会话：查询阻塞事件循环"""
+    async def handle(i):
+        with session_factory() as session:
+            session.execute(dashboard_query(i % args.stations + 1)).all()
+    await gather_limited(handle, args)
+
+
+async def run_threadpool(session_factory, args) -> None:
+    """同步会话放到线程池（FastAPI 普通 def 路由的方式）"""
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=args.threads)
+
+    def query(i):
+        with session_factory() as session:
+            return session.execute(dashboard_query(i % args.stations + 1)).all()
+
+    async def handle(i):
+        await loop.run_in_executor(executor, query, i)
+    await gather_limited(handle, args)
+    executor.shutdown()
+
+
+async def run_async(url: str, pool: dict, args) -> str:
+    """异步会话（get_async_db 的方式），返回结束时的连接池状态"""
+    async_engine = create_async_engine(async_database_url(url), **pool)
+    add_latency_function(async_engine.sync_engine, args.latency_ms)
+    session_factory = async_sessionmaker(async_engine)
+
+    async def handle(i):
+        async with session_factory() as session:
+            (await session.execute(dashboard_query(i % args.stations + 1))).all()
+    await gather_limited(handle, args)
+    status = async_engine.sync_engine.pool.status()
+    await async_engine.dispose()
+    return status
+
+
+async def gather_limited(handle, args) -> None:
+    """以固定并发数发出请求"""
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(i):
+        async with semaphore:
+            await handle(i)
+    await asyncio.gather(*(limited(i) for i in range(args.requests)))
+
+
+def report(name: str, elapsed: float, requests: int, pool_status: str) -> None:
+    print(f"{name:<22} time={elapsed:7.2f}s  req/s={requests / elapsed:8.1f}  pool: {pool_status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async database access under concurrency")
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--pool-size', type=int, default=10)
+    parser.add_argument('--max-overflow', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=40, help="Threadpool size for sync sessions (AnyIO default is 40)")
+    parser.add_argument('--stations', type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench_async_db.db')
+    url = f'sqlite:///{path}'
+    pool = {'pool_size': args.pool_size, 'max_overflow': args.max_overflow, 'pool_pre_ping': True}
+    sync_engine = create_engine(url, **pool)
+    add_latency_function(sync_engine, args.latency_ms)
+    seed(sync_engine, args.stations, 24 * 30)
+    sync_factory = sessionmaker(bind=sync_engine)
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.latency_ms:.0f} ms per query, pool {args.pool_size}+{args.max_overflow}")
+
+    start = time.perf_counter()
+    asyncio.run(run_blocking(sync_factory, args))
+    report('sync in event loop', time.perf_counter() - start, args.requests, sync_engine.pool.status())
+
+    start = time.perf_counter()
+    asyncio.run(run_threadpool(sync_factory, args))
+    report('sync in threadpool', time.perf_counter() - start, args.requests, sync_engine.pool.status())
+
+    start = time.perf_counter()
+    status = asyncio.run(run_async(url, pool, args))
+    report('async (aiosqlite)', time.perf_counter() - start, args.requests, status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# 历史数据加载基准测试
+# 运行方式（在 backend 目录下）：python -m benchmarks.bench_loader --rows 200000
+# 默认在临时 SQLite 库中生成数据；指定 --url 时使用已有数据库中的数据（不写入）
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.database import Base
+from app.models.mysql import HistoricalData
+from app.services.data_loader import HISTORICAL_VALUE_COLUMNS, HistoricalDataLoader
+
+
+def seed(engine, rows: int, stations: int) -> None:
+    """生成每个充电站 rows 行的逐小时历史数据"""
+    Base.metadata.create_all(engine, tables=[HistoricalData.__table__])
+    rng = np.random.default_rng(0)
+    start = datetime(2020, 1, 1)
+    with engine.begin() as connection:
+        for station_id in range(1, stations + 1):
+            values = rng.random((rows, 3)) * [50, 1.5, 3]
+            records = [
+                {
+                    'station_id': station_id,
+                    'time_slot': start + timedelta(hours=i),
+                    'charging_amount': float(values[i, 0]),
+                    'electricity_price': float(values[i, 1]),
+                    'charging_duration': float(values[i, 2])
+                }
+                for i in range(rows)
+            ]
+            for offset in range(0, rows, 50000):
+                connection.execute(insert(HistoricalData), records[offset:offset + 50000])
+
+
+def orm_frame(engine, station_id: int) -> pd.DataFrame:
+    """旧方式：加载 HistoricalData ORM 对象后再构建数据帧"""
+    with Session(engine) as session:
+        objects = session.execute(
+            select(HistoricalData).where(HistoricalData.station_id == station_id).order_by(HistoricalData.time_slot)
+        ).scalars().all()
+        return pd.DataFrame([
+            {'time_slot': obj.time_slot, **{c: getattr(obj, c) for c in HISTORICAL_VALUE_COLUMNS}}
+            for obj in objects
+        ])
+
+
+def read_sql_frame(engine, station_id: int) -> pd.DataFrame:
+    """pandas.read_sql 一次性读取"""
+    query = (
+        select(HistoricalData.time_slot, *[getattr(HistoricalData, c) for c in HISTORICAL_VALUE_COLUMNS])
+        .where(HistoricalData.station_id == station_id)
+        .order_by(HistoricalData.time_slot)
+    )
+    with engine.connect() as connection:
+        return pd.read_sql(query, connection, parse_dates=['time_slot'])
+
+
+def stream_rows(loader: HistoricalDataLoader, station_id: int) -> int:
+    """逐块消费，不保留整段数据"""
+    return sum(len(chunk) for chunk in loader.iter_chunks(station_id))
+
+
+def measure(name: str, fn) -> None:
+    """测量耗时（不开启 tracemalloc）和峰值内存（单独一次运行）"""
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = result if isinstance(result, int) else len(result)
+    print(f"{name:<24} time={elapsed:8.3f}s  rows/s={rows / elapsed:>12,.0f}  peak={peak / 1024 ** 2:10.2f} MB  rows={rows}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading historical_data into training frames")
+    parser.add_argument('--rows', type=int, default=8760 * 10, help="Rows per station when seeding")
+    parser.add_argument('--stations', type=int, default=3)
+    parser.add_argument('--station-id', type=int, default=2)
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--url', default=None, help="Existing database URL, seeds a temporary SQLite file when omitted")
+    args = parser.parse_args()
+
+    if args.url:
+        engine = create_engine(args.url)
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'bench_loader.db')
+        engine = create_engine(f'sqlite:///{path}')
+        start = time.perf_counter()
+        seed(engine, args.rows, args.stations)
+        print(f"Seeded {args.rows * args.stations} rows in {time.perf_counter() - start:.1f}s")
+
+    loader = HistoricalDataLoader(engine, chunk_rows=args.chunk_rows)
+    compact_loader = HistoricalDataLoader(engine, chunk_rows=args.chunk_rows, compact=True)
+    measure('orm objects', lambda: orm_frame(engine, args.station_id))
+    measure('pandas read_sql', lambda: read_sql_frame(engine, args.station_id))
+    measure('keyset loader', lambda: loader.load_frame(args.station_id))
+    measure('keyset loader float32', lambda: compact_loader.load_frame(args.station_id))
+    measure('keyset stream chunks', lambda: stream_rows(loader, args.station_id))
+
+
+if __name__ == '__main__':
+    main()
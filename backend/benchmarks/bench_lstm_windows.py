@@ -0,0 +1,56 @@
+# LSTM滑动窗口构建基准测试
+# 运行方式（在 backend 目录下）：python -m benchmarks.bench_lstm_windows --rows 87600 --features 8
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from app.services.prediction import PredictionService
+
+
+def loop_windows(df: pd.DataFrame, target_column: str, look_back: int) -> tuple:
+    """旧实现：逐个切片追加后再 np.array"""
+    numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
+    data = df[numeric_columns].values
+    X, y = [], []
+    for i in range(len(data) - look_back):
+        X.append(data[i:(i + look_back), :])
+        y.append(data[i + look_back, numeric_columns.index(target_column)])
+    return np.array(X), np.array(y)
+
+
+def measure(name: str, fn) -> None:
+    """测量耗时和峰值内存"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<24} time={elapsed:8.3f}s  retained={retained / 1024 ** 2:8.2f} MB  peak={peak / 1024 ** 2:10.2f} MB  X.shape={result[0].shape}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LSTM window construction")
+    parser.add_argument('--rows', type=int, default=8760 * 10)
+    parser.add_argument('--features', type=int, default=8)
+    parser.add_argument('--look-back', type=int, default=24)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.random((args.rows, args.features)), columns=[f'f{i}' for i in range(args.features)])
+    df = df.rename(columns={'f0': 'charging_amount'})
+    service = PredictionService()
+
+    measure('python loop', lambda: loop_windows(df, 'charging_amount', args.look_back))
+    measure('strided view', lambda: service.prepare_lstm_data(df, 'charging_amount', args.look_back))
+    measure('strided view float32', lambda: service.prepare_lstm_data(df, 'charging_amount', args.look_back, dtype=np.float32))
+
+    X, y = service.prepare_lstm_data(df, 'charging_amount', args.look_back, dtype=np.float32)
+    measure('float32 batches', lambda: (X, sum(len(batch) for batch, _ in service.iter_lstm_batches(X, y, batch_size=256))))
+
+
+if __name__ == '__main__':
+    main()
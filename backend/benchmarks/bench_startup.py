@@ -0,0 +1,45 @@
+# 服务启动耗时与内存基准测试
+# 运行方式（在 backend 目录下）：python -m benchmarks.bench_startup
+import json
+import subprocess
+import sys
+
+# 各类工作进程的导入场景
+PROFILES = {
+    'pricing-only': 'import app.services.pricing',
+    'data-only': 'import app.services.data_processing',
+    'prediction-lazy': 'import app.services.prediction',
+    'full-prediction': 'import app.services.prediction as p; p.preload_backends()',
+}
+
+PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+heavy = [name for name in ('tensorflow', 'prophet') if name in sys.modules]
+print(json.dumps({{'import_time': elapsed, 'max_rss_mb': rss_kb / 1024, 'heavy_loaded': heavy}}))
+'''
+
+
+def run_profile(code: str, repeat: int) -> dict:
+    """在独立子进程中测量导入耗时和最大常驻内存"""
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', PROBE.format(code=code)], capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(samples, key=lambda sample: sample['import_time'])
+    return best
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print(f"{'profile':<18}{'import_time(s)':>16}{'max_rss(MB)':>14}  heavy backends")
+    for name, code in PROFILES.items():
+        result = run_profile(code, repeat)
+        print(f"{name:<18}{result['import_time']:>16.3f}{result['max_rss_mb']:>14.1f}  {', '.join(result['heavy_loaded']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
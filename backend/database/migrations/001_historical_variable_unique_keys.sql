@@ -0,0 +1,41 @@
+-- 为已有数据库的 historical_data 和 variable_data 添加 (station_id, time_slot) 唯一键
+-- 数据导入服务按该唯一键 upsert（ON DUPLICATE KEY UPDATE），没有唯一键时重复导入会插入重复行。
+-- 先删除重复行（每个键保留 id 最大、即最后写入的一行，与 upsert 的覆盖语义一致），再添加唯一键。
+-- 可以重复执行：唯一键已存在时跳过。执行后如已使用汇总表和弹性统计量，需要重建
+-- （RollupService.rebuild、ElasticityStatsStore.rebuild）。
+
+-- 历史充电数据表
+DELETE older FROM historical_data older
+JOIN historical_data newer
+    ON newer.station_id = older.station_id
+    AND newer.time_slot = older.time_slot
+    AND newer.id > older.id;
+
+SET @index_exists = (
+    SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'historical_data' AND index_name = 'uq_historical_data_station_time'
+);
+SET @ddl = IF(@index_exists = 0,
+    'ALTER TABLE historical_data ADD UNIQUE KEY uq_historical_data_station_time (station_id, time_slot)',
+    'SELECT 1');
+PREPARE migration FROM @ddl;
+EXECUTE migration;
+DEALLOCATE PREPARE migration;
+
+-- 变量数据表
+DELETE older FROM variable_data older
+JOIN variable_data newer
+    ON newer.station_id = older.station_id
+    AND newer.time_slot = older.time_slot
+    AND newer.id > older.id;
+
+SET @index_exists = (
+    SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'variable_data' AND index_name = 'uq_variable_data_station_time'
+);
+SET @ddl = IF(@index_exists = 0,
+    'ALTER TABLE variable_data ADD UNIQUE KEY uq_variable_data_station_time (station_id, time_slot)',
+    'SELECT 1');
+PREPARE migration FROM @ddl;
+EXECUTE migration;
+DEALLOCATE PREPARE migration;
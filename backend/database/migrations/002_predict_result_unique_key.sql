@@ -0,0 +1,22 @@
+-- 为已有数据库的 predict_result 添加 (station_id, time_slot, model_config_id) 唯一键
+-- 预测结果写入按该唯一键 upsert（ON DUPLICATE KEY UPDATE），没有唯一键时重新预测相同时段会插入重复行。
+-- 先删除重复行（每个键保留 id 最大、即最近一次预测的一行，与 upsert 的覆盖语义一致），再添加唯一键。
+-- 可以重复执行：唯一键已存在时跳过。
+
+DELETE older FROM predict_result older
+JOIN predict_result newer
+    ON newer.station_id = older.station_id
+    AND newer.time_slot = older.time_slot
+    AND newer.model_config_id = older.model_config_id
+    AND newer.id > older.id;
+
+SET @index_exists = (
+    SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'predict_result' AND index_name = 'uq_predict_result_station_time_config'
+);
+SET @ddl = IF(@index_exists = 0,
+    'ALTER TABLE predict_result ADD UNIQUE KEY uq_predict_result_station_time_config (station_id, time_slot, model_config_id)',
+    'SELECT 1');
+PREPARE migration FROM @ddl;
+EXECUTE migration;
+DEALLOCATE PREPARE migration;
@@ -0,0 +1,10 @@
+-- 把已有数据库 elasticity_stats 的统计量列从 FLOAT 改为 DOUBLE
+-- 单精度求和项经多次增量累加后误差累积，并在弹性回归的 n·Σxy − Σx·Σy 中被放大。
+-- 可以重复执行。修改列类型不能恢复已损失的精度，执行后需用 ElasticityStatsStore.rebuild 从 historical_data 重算。
+
+ALTER TABLE elasticity_stats
+    MODIFY n DOUBLE NOT NULL DEFAULT 0 COMMENT '有效样本数',
+    MODIFY sum_x DOUBLE NOT NULL DEFAULT 0 COMMENT 'Σln(价格)',
+    MODIFY sum_y DOUBLE NOT NULL DEFAULT 0 COMMENT 'Σln(需求)',
+    MODIFY sum_xy DOUBLE NOT NULL DEFAULT 0 COMMENT 'Σln(价格)·ln(需求)',
+    MODIFY sum_xx DOUBLE NOT NULL DEFAULT 0 COMMENT 'Σln(价格)²';
@@ -0,0 +1,39 @@
+-- 把已有数据库汇总表的求和列从 FLOAT 改为 DOUBLE
+-- 单精度只有约7位有效数字，全网按天的收入合计超过约10万元后就会丢失分。
+-- 可以重复执行。修改列类型不能恢复已损失的精度，执行后需用 RollupService.rebuild 重建汇总。
+
+ALTER TABLE rollup_station_hourly
+    MODIFY charging_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电量合计(kWh)',
+    MODIFY charging_duration_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电时长合计(h)',
+    MODIFY revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '收入合计(元)',
+    MODIFY actual_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际充电量合计(kWh)',
+    MODIFY actual_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际收入合计(元)',
+    MODIFY predicted_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测充电量合计(kWh)',
+    MODIFY predicted_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测收益合计(元)',
+    MODIFY abs_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对误差合计(kWh)',
+    MODIFY squared_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '误差平方合计',
+    MODIFY ape_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对百分比误差合计';
+
+ALTER TABLE rollup_station_daily
+    MODIFY charging_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电量合计(kWh)',
+    MODIFY charging_duration_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电时长合计(h)',
+    MODIFY revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '收入合计(元)',
+    MODIFY actual_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际充电量合计(kWh)',
+    MODIFY actual_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际收入合计(元)',
+    MODIFY predicted_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测充电量合计(kWh)',
+    MODIFY predicted_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测收益合计(元)',
+    MODIFY abs_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对误差合计(kWh)',
+    MODIFY squared_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '误差平方合计',
+    MODIFY ape_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对百分比误差合计';
+
+ALTER TABLE rollup_network_daily
+    MODIFY charging_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电量合计(kWh)',
+    MODIFY charging_duration_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电时长合计(h)',
+    MODIFY revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '收入合计(元)',
+    MODIFY actual_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际充电量合计(kWh)',
+    MODIFY actual_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际收入合计(元)',
+    MODIFY predicted_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测充电量合计(kWh)',
+    MODIFY predicted_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测收益合计(元)',
+    MODIFY abs_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对误差合计(kWh)',
+    MODIFY squared_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '误差平方合计',
+    MODIFY ape_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对百分比误差合计';
@@ -1,5 +1,6 @@
 -- MySQL数据库建表语句
 -- 充电站智能预测平台
+-- 已有数据库升级时执行 database/migrations 下的迁移脚本（按编号顺序），CREATE TABLE IF NOT EXISTS 不会修改已存在的表
 
 -- 创建数据库
 CREATE DATABASE IF NOT EXISTS charging_station_forecast;
@@ -26,6 +27,22 @@ CREATE TABLE IF NOT EXISTS historical_data (
     electricity_price FLOAT NOT NULL COMMENT '电价(元/kWh)',
     charging_duration FLOAT NOT NULL COMMENT '充电时长(h)',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_historical_data_station_time (station_id, time_slot),
+    FOREIGN KEY (station_id) REFERENCES stations(id) ON DELETE CASCADE
+);
+
+-- 历史数据异常值标记表（数据导入时在线检测）
+CREATE TABLE IF NOT EXISTS historical_outlier (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    station_id INT NOT NULL,
+    time_slot DATETIME NOT NULL,
+    column_name VARCHAR(50) NOT NULL COMMENT '异常列名',
+    value FLOAT NOT NULL COMMENT '异常值',
+    lower_bound FLOAT COMMENT '检测下界',
+    upper_bound FLOAT COMMENT '检测上界',
+    dropped BOOLEAN NOT NULL DEFAULT FALSE COMMENT '是否未写入historical_data',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_historical_outlier_station_time_column (station_id, time_slot, column_name),
     FOREIGN KEY (station_id) REFERENCES stations(id) ON DELETE CASCADE
 );
 
@@ -40,6 +57,7 @@ CREATE TABLE IF NOT EXISTS variable_data (
     competitor_price FLOAT COMMENT '竞品价格(元/kWh)',
     user_behavior_score FLOAT COMMENT '用户行为评分',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_variable_data_station_time (station_id, time_slot),
     FOREIGN KEY (station_id) REFERENCES stations(id) ON DELETE CASCADE
 );
 
@@ -72,6 +90,28 @@ CREATE TABLE IF NOT EXISTS predict_result (
     revenue_prediction FLOAT NOT NULL COMMENT '收益预测(元)',
     model_config_id INT NOT NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_predict_result_station_time_config (station_id, time_slot, model_config_id),
+    FOREIGN KEY (station_id) REFERENCES stations(id) ON DELETE CASCADE,
+    FOREIGN KEY (model_config_id) REFERENCES model_config(id) ON DELETE CASCADE
+);
+
+-- 预测批次表（紧凑存储，各指标为 float32 小端数组）
+CREATE TABLE IF NOT EXISTS predict_run (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    station_id INT NOT NULL,
+    model_config_id INT NOT NULL,
+    start_slot DATETIME NOT NULL COMMENT '第一个预测时段',
+    step_seconds INT NOT NULL DEFAULT 3600 COMMENT '时段间隔(秒)',
+    slot_count INT NOT NULL COMMENT '预测时段数',
+    predicted_amount_mean BLOB NOT NULL COMMENT '预测充电量均值(kWh)',
+    predicted_amount_lower BLOB NOT NULL COMMENT '预测充电量下限(kWh)',
+    predicted_amount_upper BLOB NOT NULL COMMENT '预测充电量上限(kWh)',
+    suggested_price_mean BLOB NOT NULL COMMENT '建议价格均值(元/kWh)',
+    suggested_price_lower BLOB NOT NULL COMMENT '建议价格下限(元/kWh)',
+    suggested_price_upper BLOB NOT NULL COMMENT '建议价格上限(元/kWh)',
+    revenue_prediction BLOB NOT NULL COMMENT '收益预测(元)',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_predict_run_station_config_start (station_id, model_config_id, start_slot),
     FOREIGN KEY (station_id) REFERENCES stations(id) ON DELETE CASCADE,
     FOREIGN KEY (model_config_id) REFERENCES model_config(id) ON DELETE CASCADE
 );
@@ -110,6 +150,106 @@ CREATE TABLE IF NOT EXISTS time_slot_pricing (
     FOREIGN KEY (strategy_id) REFERENCES pricing_strategy(id) ON DELETE CASCADE
 );
 
+-- 价格弹性统计量表（按充电站和小时累积 ln(需求) ~ ln(价格) 的回归求和项）
+CREATE TABLE IF NOT EXISTS elasticity_stats (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    station_id INT NOT NULL,
+    hour INT NOT NULL COMMENT '时段(小时)',
+    n DOUBLE NOT NULL DEFAULT 0 COMMENT '有效样本数',
+    sum_x DOUBLE NOT NULL DEFAULT 0 COMMENT 'Σln(价格)',
+    sum_y DOUBLE NOT NULL DEFAULT 0 COMMENT 'Σln(需求)',
+    sum_xy DOUBLE NOT NULL DEFAULT 0 COMMENT 'Σln(价格)·ln(需求)',
+    sum_xx DOUBLE NOT NULL DEFAULT 0 COMMENT 'Σln(价格)²',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_elasticity_stats_station_hour (station_id, hour),
+    FOREIGN KEY (station_id) REFERENCES stations(id) ON DELETE CASCADE
+);
+
+-- 充电站×小时汇总表
+CREATE TABLE IF NOT EXISTS rollup_station_hourly (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    station_id INT NOT NULL,
+    bucket DATETIME NOT NULL COMMENT '小时起点',
+    charging_count INT NOT NULL DEFAULT 0 COMMENT '充电记录数',
+    charging_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电量合计(kWh)',
+    charging_amount_min FLOAT COMMENT '最小充电量(kWh)',
+    charging_amount_max FLOAT COMMENT '最大充电量(kWh)',
+    charging_duration_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电时长合计(h)',
+    revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '收入合计(元)',
+    actual_count INT NOT NULL DEFAULT 0 COMMENT '实际回流记录数',
+    actual_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际充电量合计(kWh)',
+    actual_amount_min FLOAT COMMENT '最小实际充电量(kWh)',
+    actual_amount_max FLOAT COMMENT '最大实际充电量(kWh)',
+    actual_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际收入合计(元)',
+    predicted_count INT NOT NULL DEFAULT 0 COMMENT '预测时段数',
+    predicted_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测充电量合计(kWh)',
+    predicted_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测收益合计(元)',
+    matched_count INT NOT NULL DEFAULT 0 COMMENT '可评估预测准确度的时段数',
+    abs_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对误差合计(kWh)',
+    squared_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '误差平方合计',
+    ape_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对百分比误差合计',
+    ape_count INT NOT NULL DEFAULT 0 COMMENT '实际充电量大于0的时段数',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_rollup_station_hourly_station_bucket (station_id, bucket),
+    FOREIGN KEY (station_id) REFERENCES stations(id) ON DELETE CASCADE
+);
+
+-- 充电站×天汇总表
+CREATE TABLE IF NOT EXISTS rollup_station_daily (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    station_id INT NOT NULL,
+    bucket DATETIME NOT NULL COMMENT '日期零点',
+    charging_count INT NOT NULL DEFAULT 0 COMMENT '充电记录数',
+    charging_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电量合计(kWh)',
+    charging_amount_min FLOAT COMMENT '最小充电量(kWh)',
+    charging_amount_max FLOAT COMMENT '最大充电量(kWh)',
+    charging_duration_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电时长合计(h)',
+    revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '收入合计(元)',
+    actual_count INT NOT NULL DEFAULT 0 COMMENT '实际回流记录数',
+    actual_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际充电量合计(kWh)',
+    actual_amount_min FLOAT COMMENT '最小实际充电量(kWh)',
+    actual_amount_max FLOAT COMMENT '最大实际充电量(kWh)',
+    actual_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际收入合计(元)',
+    predicted_count INT NOT NULL DEFAULT 0 COMMENT '预测时段数',
+    predicted_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测充电量合计(kWh)',
+    predicted_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测收益合计(元)',
+    matched_count INT NOT NULL DEFAULT 0 COMMENT '可评估预测准确度的时段数',
+    abs_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对误差合计(kWh)',
+    squared_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '误差平方合计',
+    ape_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对百分比误差合计',
+    ape_count INT NOT NULL DEFAULT 0 COMMENT '实际充电量大于0的时段数',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_rollup_station_daily_station_bucket (station_id, bucket),
+    FOREIGN KEY (station_id) REFERENCES stations(id) ON DELETE CASCADE
+);
+
+-- 全网×天汇总表
+CREATE TABLE IF NOT EXISTS rollup_network_daily (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    bucket DATETIME NOT NULL COMMENT '日期零点',
+    charging_count INT NOT NULL DEFAULT 0 COMMENT '充电记录数',
+    charging_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电量合计(kWh)',
+    charging_amount_min FLOAT COMMENT '最小充电量(kWh)',
+    charging_amount_max FLOAT COMMENT '最大充电量(kWh)',
+    charging_duration_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '充电时长合计(h)',
+    revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '收入合计(元)',
+    actual_count INT NOT NULL DEFAULT 0 COMMENT '实际回流记录数',
+    actual_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际充电量合计(kWh)',
+    actual_amount_min FLOAT COMMENT '最小实际充电量(kWh)',
+    actual_amount_max FLOAT COMMENT '最大实际充电量(kWh)',
+    actual_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '实际收入合计(元)',
+    predicted_count INT NOT NULL DEFAULT 0 COMMENT '预测时段数',
+    predicted_amount_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测充电量合计(kWh)',
+    predicted_revenue_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '预测收益合计(元)',
+    matched_count INT NOT NULL DEFAULT 0 COMMENT '可评估预测准确度的时段数',
+    abs_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对误差合计(kWh)',
+    squared_error_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '误差平方合计',
+    ape_sum DOUBLE NOT NULL DEFAULT 0 COMMENT '绝对百分比误差合计',
+    ape_count INT NOT NULL DEFAULT 0 COMMENT '实际充电量大于0的时段数',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_rollup_network_daily_bucket (bucket)
+);
+
 -- 索引优化
 CREATE INDEX idx_historical_data_station_time ON historical_data(station_id, time_slot);
 CREATE INDEX idx_variable_data_station_time ON variable_data(station_id, time_slot);
@@ -0,0 +1,22 @@
+# 测试公共配置
+# 运行方式（在 backend 目录下）：python -m pytest
+import os
+
+# 测试不连接配置的 MySQL：在导入应用模块之前把默认引擎换成内存 SQLite，各测试使用自己的临时数据库
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ.setdefault('MONGODB_URL', 'mongodb://localhost:27017/charging_station_forecast')
+
+import pytest
+from sqlalchemy import create_engine
+
+import app.models.mysql  # noqa: F401  注册全部表
+from app.core.database import Base
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """建好全部表的临时 SQLite 数据库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
@@ -0,0 +1,68 @@
+# 数据批量导入测试
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+
+from app.models.mysql import HistoricalData, VariableData
+from app.services.elasticity_store import STAT_COLUMNS, ElasticityStatsStore
+from app.services.ingestion import DataIngestionService
+
+
+def historical_csv(path, start_hour: int, hours: int, seed: int) -> str:
+    """生成一个充电站 [start_hour, start_hour + hours) 的历史数据文件"""
+    rng = np.random.default_rng(seed)
+    price = rng.uniform(0.8, 1.6, hours)
+    pd.DataFrame({
+        'station_id': 1,
+        'time_slot': pd.date_range('2024-01-01', periods=start_hour + hours, freq='h')[start_hour:],
+        'charging_amount': 100 * price ** -0.6 * rng.uniform(0.9, 1.1, hours),
+        'electricity_price': price,
+        'charging_duration': rng.uniform(0.5, 3, hours)
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def row_count(engine, model) -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+def test_reingest_overlapping_file_is_idempotent(engine, tmp_path):
+    service = DataIngestionService(engine, chunksize=20)
+    store = ElasticityStatsStore(engine)
+
+    first = historical_csv(tmp_path / 'first.csv', 0, 48, seed=1)
+    # 与第一个文件重叠24小时，重叠部分的值不同
+    overlapping = historical_csv(tmp_path / 'overlapping.csv', 24, 48, seed=2)
+    assert service.ingest_file(first)['rows_written'] == 48
+    assert service.ingest_file(overlapping)['rows_written'] == 48
+    assert row_count(engine, HistoricalData) == 72
+
+    incremental = store.load(1)
+    service.ingest_file(overlapping)
+    assert row_count(engine, HistoricalData) == 72
+    pd.testing.assert_frame_equal(store.load(1), incremental)
+
+    # 增量维护的统计量与从 historical_data 重算的结果一致
+    store.rebuild([1])
+    rebuilt = store.load(1)
+    assert rebuilt[STAT_COLUMNS].to_numpy() == pytest.approx(incremental[STAT_COLUMNS].to_numpy(), rel=1e-9, abs=1e-9)
+    assert store.get_elasticity(1) is not None
+
+
+def test_partial_variable_file_keeps_other_columns(engine, tmp_path):
+    service = DataIngestionService(engine)
+    time_slot = pd.date_range('2024-01-01', periods=3, freq='h')
+    full = tmp_path / 'full.csv'
+    pd.DataFrame({'station_id': 1, 'time_slot': time_slot, 'temperature': [10.0, 11.0, 12.0], 'humidity': [50.0, 51.0, 52.0]}).to_csv(full, index=False)
+    partial = tmp_path / 'partial.csv'
+    pd.DataFrame({'station_id': 1, 'time_slot': time_slot, 'temperature': [20.0, 21.0, 22.0]}).to_csv(partial, index=False)
+
+    service.ingest_file(str(full), table='variable_data')
+    service.ingest_file(str(partial), table='variable_data')
+
+    assert row_count(engine, VariableData) == 3
+    with engine.connect() as connection:
+        rows = connection.execute(select(VariableData.temperature, VariableData.humidity).order_by(VariableData.time_slot)).all()
+    assert [tuple(row) for row in rows] == [(20.0, 50.0), (21.0, 51.0), (22.0, 52.0)]
@@ -0,0 +1,124 @@
+# 后台任务队列测试（线程模式，进程内日志存储）
+import threading
+import time
+
+import pytest
+
+from app.services.job_queue import JobCancelled, JobQueue
+from app.services.model_log_store import InMemoryModelLogStore
+
+
+def train_handler(station_id: int, config: dict, context) -> dict:
+    context.report(epoch=1, loss=0.5)
+    return {'metrics': {'mae': 1.5}}
+
+
+def failing_handler(station_id: int, config: dict, context) -> dict:
+    raise RuntimeError('no data')
+
+
+def blocking_handler(station_id: int, config: dict, context) -> dict:
+    # 模拟逐轮训练，每轮检查取消标记
+    for epoch in range(500):
+        context.report(epoch=epoch + 1)
+        context.check_cancelled()
+        time.sleep(0.01)
+    return {'metrics': {}}
+
+
+class FailingLogStore(InMemoryModelLogStore):
+    """创建日志时失败的存储，模拟 MongoDB 不可用"""
+
+    def insert(self, log):
+        raise ConnectionError('log store unavailable')
+
+
+@pytest.fixture
+def log_store():
+    return InMemoryModelLogStore()
+
+
+@pytest.fixture
+def job_queue(log_store):
+    handlers = {'train': train_handler, 'fail': failing_handler, 'block': blocking_handler}
+    job_queue = JobQueue(max_workers=2, log_store=log_store, use_processes=False, handlers=handlers, result_writer=None)
+    yield job_queue
+    job_queue.shutdown(wait=False)
+
+
+def wait_finished(job_queue: JobQueue, job_id: str, timeout: float = 5) -> dict:
+    """等待完成回调更新任务状态"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = job_queue.status(job_id)
+        if status['finished_at'] is not None:
+            return status
+        time.sleep(0.01)
+    raise TimeoutError(job_id)
+
+
+def test_successful_job_updates_model_log(job_queue, log_store):
+    job_id = job_queue.submit('train', 1, {'future_periods': 24})
+    assert log_store.get(job_queue.status(job_id)['log_id']).status in ('training', 'success')
+
+    assert job_queue.result(job_id, timeout=5) == {'metrics': {'mae': 1.5}}
+    status = wait_finished(job_queue, job_id)
+    assert status['status'] == 'success'
+    log = log_store.get(status['log_id'])
+    assert log.status == 'success'
+    assert log.metrics['mae'] == 1.5
+    assert log.parameters['job_id'] == job_id
+
+
+def test_failed_job_records_error(job_queue, log_store):
+    job_id = job_queue.submit('fail', 1)
+    with pytest.raises(RuntimeError):
+        job_queue.result(job_id, timeout=5)
+    status = wait_finished(job_queue, job_id)
+    assert status['status'] == 'failed'
+    log = log_store.get(status['log_id'])
+    assert log.status == 'failed'
+    assert 'no data' in log.error_message
+
+
+def test_cancel_running_job(job_queue, log_store):
+    job_id = job_queue.submit('block', 1)
+    deadline = time.monotonic() + 5
+    while job_queue.status(job_id)['status'] != 'running':
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    assert job_queue.cancel(job_id) is True
+    with pytest.raises(JobCancelled):
+        job_queue.result(job_id, timeout=5)
+    status = wait_finished(job_queue, job_id)
+    assert status['status'] == 'cancelled'
+    assert log_store.get(status['log_id']).status == 'failed'
+    assert job_queue.cancel(job_id) is False
+
+
+def test_queue_rejects_jobs_beyond_max_pending(log_store):
+    release = threading.Event()
+    handlers = {'block': lambda station_id, config, context: release.wait(5) and {}}
+    job_queue = JobQueue(max_workers=1, max_pending=1, log_store=log_store, use_processes=False, handlers=handlers, result_writer=None)
+    try:
+        job_queue.submit('block', 1)
+        with pytest.raises(RuntimeError):
+            job_queue.submit('block', 2)
+        with pytest.raises(ValueError):
+            job_queue.submit('unknown', 1)
+    finally:
+        release.set()
+        job_queue.shutdown()
+
+
+def test_log_store_failure_does_not_block_submission():
+    job_queue = JobQueue(log_store=FailingLogStore(), use_processes=False, handlers={'train': train_handler}, result_writer=None)
+    try:
+        job_id = job_queue.submit('train', 1)
+        assert job_queue.result(job_id, timeout=5) == {'metrics': {'mae': 1.5}}
+        status = wait_finished(job_queue, job_id)
+        assert status['status'] == 'success'
+        assert status['log_id'] is None
+    finally:
+        job_queue.shutdown()
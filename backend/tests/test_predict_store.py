@@ -0,0 +1,74 @@
+# 预测结果存储测试
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models.mysql import PredictResult, PredictRun
+from app.services.predict_store import PREDICT_VALUE_COLUMNS, PredictResultWriter, pack_runs, read_predictions
+
+
+def predict_rows(station_id: int, hours: int, offset: float = 0.0, start: datetime = datetime(2024, 1, 1)) -> list:
+    return [
+        {
+            'station_id': station_id,
+            'time_slot': start + timedelta(hours=h),
+            **{column: 10.0 * j + h + offset + 0.25 for j, column in enumerate(PREDICT_VALUE_COLUMNS)},
+            'model_config_id': 1
+        }
+        for h in range(hours)
+    ]
+
+
+def row_count(engine, model) -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+def test_repeated_forecast_overwrites_rows(engine):
+    writer = PredictResultWriter(engine, batch_size=5, compact=False)
+    assert writer.write(predict_rows(1, 12)) == 12
+    assert writer.write(predict_rows(1, 12, offset=100)) == 12
+    # 同一批中重复的时段只保留最后一条
+    writer.write(predict_rows(1, 1, offset=200) + predict_rows(1, 1, offset=300))
+
+    assert row_count(engine, PredictResult) == 12
+    with engine.connect() as connection:
+        means = connection.execute(select(PredictResult.predicted_amount_mean).order_by(PredictResult.time_slot)).scalars().all()
+    assert means == pytest.approx([300.25] + [h + 100.25 for h in range(1, 12)])
+
+
+def test_compact_round_trip(engine):
+    writer = PredictResultWriter(engine, compact=True)
+    rows = predict_rows(1, 24) + predict_rows(2, 24)
+    assert writer.write(rows) == 48
+    writer.write(predict_rows(1, 24))
+    assert row_count(engine, PredictRun) == 2
+    assert row_count(engine, PredictResult) == 0
+
+    records = read_predictions(1, bind=engine)
+    assert [r['time_slot'] for r in records] == [row['time_slot'] for row in rows[:24]]
+    for record, row in zip(records, rows[:24]):
+        for column in PREDICT_VALUE_COLUMNS:
+            assert record[column] == pytest.approx(row[column], rel=1e-6)
+
+    window = read_predictions(1, start=datetime(2024, 1, 1, 6), end=datetime(2024, 1, 1, 9), bind=engine)
+    assert [r['time_slot'].hour for r in window] == [6, 7, 8]
+
+
+def test_compact_read_prefers_latest_run(engine):
+    writer = PredictResultWriter(engine, compact=True)
+    writer.write(predict_rows(1, 6))
+    writer.write(predict_rows(1, 6, offset=100, start=datetime(2024, 1, 1, 3)))
+
+    records = read_predictions(1, bind=engine)
+    assert len(records) == 9
+    assert [r['predicted_amount_mean'] for r in records[:3]] == pytest.approx([0.25, 1.25, 2.25])
+    assert [r['predicted_amount_mean'] for r in records[3:]] == pytest.approx([h + 100.25 for h in range(6)])
+
+
+def test_pack_runs_rejects_uneven_slots():
+    rows = predict_rows(1, 3)
+    rows[2]['time_slot'] += timedelta(minutes=30)
+    with pytest.raises(ValueError):
+        pack_runs(rows)